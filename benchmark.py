@@ -0,0 +1,159 @@
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import uml2sqlalchemy
+from generate_xmi import generate_xmi
+
+
+default_sizes = [100, 1000, 10000, 50000]
+default_parsers = ['dict', 'stream', 'sax']
+
+# A phase that got this much slower than in the baseline is reported as a regression
+regression_threshold = 1.10
+
+
+def run_generator(xmi_file, parser, work_dir):
+    """Run uml2sqlalchemy.py on xmi_file in a separate process, so that every run starts from a fresh
+    interpreter and has its own peak memory. The output is compiled, a run that writes code that doesn't
+    compile raises a SyntaxError. Returns the total wall time and the --profile report."""
+    profile_file = os.path.join(work_dir, 'profile.json')
+    outfile = os.path.join(work_dir, 'model.py')
+
+    # The generator doesn't write output that is unchanged, start without it so every run writes it
+    if os.path.exists(outfile):
+        os.remove(outfile)
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uml2sqlalchemy.py')
+
+    started = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, script, '--parser', parser, '--profile', profile_file,
+                               xmi_file, outfile], stdout=devnull)
+    total_time = time.time() - started
+
+    # Don't time the generation of broken code
+    with open(outfile) as fd:
+        compile(fd.read(), outfile, 'exec')
+
+    with open(profile_file) as fd:
+        report = json.load(fd, object_pairs_hook=OrderedDict)
+
+    return total_time, report
+
+
+def benchmark(sizes, parsers, attributes, repeat, work_dir):
+    """Time every phase of the generator for models of each size with each parser. Of the repeated runs
+    the fastest one is kept. Returns a list of result records."""
+    results = []
+
+    for size in sizes:
+        xmi_file = os.path.join(work_dir, 'model_%d.xmi' % size)
+        generate_xmi(xmi_file, classes=size, attributes=attributes)
+
+        for parser in parsers:
+            best = None
+            for _ in range(repeat):
+                total_time, report = run_generator(xmi_file, parser, work_dir)
+                if best is None or total_time < best[0]:
+                    best = (total_time, report)
+
+            total_time, report = best
+            results.append(OrderedDict([
+                ('version', uml2sqlalchemy.__version__),
+                ('python', platform.python_version()),
+                ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                ('classes', size),
+                ('attributes', attributes),
+                ('parser', parser),
+                ('xmi_bytes', os.path.getsize(xmi_file)),
+                ('total_time', total_time),
+                ('phases', OrderedDict((phase['name'], phase) for phase in report['phases'])),
+                ('counters', report['counters']),
+            ]))
+
+            print("%7d classes  %-6s  %8.2fs  %s" % (size, parser, total_time, ", ".join(
+                "%s %.2fs" % (phase['name'], phase['wall_time']) for phase in report['phases'])))
+
+    return results
+
+
+def load_results(filename):
+    """Load a results file, keeping the most recent result for every size and parser"""
+    results = dict()
+
+    with open(filename) as fd:
+        for line in fd:
+            if line.strip():
+                result = json.loads(line, object_pairs_hook=OrderedDict)
+                results[(result['classes'], result['attributes'], result['parser'])] = result
+
+    return results
+
+
+def compare(results, baseline):
+    """Print how much faster or slower each run and phase is than in the baseline. Returns the number
+    of regressions."""
+    regressions = 0
+
+    for result in results:
+        old = baseline.get((result['classes'], result['attributes'], result['parser']))
+        if old is None:
+            continue
+
+        timings = [('total', result['total_time'], old['total_time'])]
+        for name, phase in result['phases'].items():
+            if name in old['phases']:
+                timings.append((name, phase['wall_time'], old['phases'][name]['wall_time']))
+
+        for name, new_time, old_time in timings:
+            ratio = new_time / old_time if old_time else 1.0
+            marker = ""
+            if ratio > regression_threshold and new_time - old_time > 0.01:
+                marker = "  REGRESSION"
+                regressions += 1
+
+            print("%7d classes  %-6s  %-32s %8.3fs -> %8.3fs  (%.2fx)%s" %
+                  (result['classes'], result['parser'], name, old_time, new_time, ratio, marker))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every phase of uml2sqlalchemy.py on synthetic models")
+    parser.add_argument("--sizes", type=int, nargs='+', default=default_sizes,
+                        help="Numbers of classes to benchmark (default %s)" % " ".join(map(str, default_sizes)))
+    parser.add_argument("--parsers", nargs='+', choices=default_parsers, default=default_parsers,
+                        help="Parsers to benchmark (default all)")
+    parser.add_argument("--attributes", type=int, default=10, help="Number of attributes per class (default 10)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run every benchmark this many times, keep the fastest")
+    parser.add_argument("--results", default="benchmark_results.jsonl",
+                        help="File to append the results to, one JSON record per line "
+                             "(default benchmark_results.jsonl)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Results file to compare with. Exits with status 1 when a phase got slower")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='uml2sqlalchemy_benchmark_')
+    try:
+        results = benchmark(args.sizes, args.parsers, args.attributes, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+    # Load the baseline before appending, it may be the same file
+    baseline = load_results(args.compare) if args.compare else None
+
+    with open(args.results, 'a') as fw:
+        for result in results:
+            fw.write(json.dumps(result) + "\n")
+
+    if baseline is not None and compare(results, baseline):
+        sys.exit(1)
@@ -0,0 +1,166 @@
+
+import argparse
+import random
+
+
+# Primitive data types every generated model has, as used by the generated attributes
+primitive_types = ['String', 'Integer', 'Real', 'Boolean', 'TimeAndDate', 'Identifier45']
+
+
+class XmiGenerator:
+    """Writes a synthetic UML model in the shape uml2sqlalchemy.py expects: a TypeDefinitions package with
+    enumerations and data types, an ObjectClasses package with classes, generalizations and attributes with
+    upperValue='*' multiplicities, and an Associations package.
+
+    The model is written element by element, so models of any size can be generated. The same settings
+    and seed always give the same model on the same Python version.
+    """
+
+    def __init__(self, classes=100, attributes=10, enums=None, literals=5, data_types=None,
+                 many_ratio=0.1, generalization_ratio=0.2, associations=None, seed=0):
+        self.classes = classes
+        self.attributes = attributes
+        self.enums = enums if enums is not None else max(1, classes // 10)
+        self.literals = literals
+        self.data_types = data_types if data_types is not None else max(1, classes // 20)
+        self.many_ratio = many_ratio
+        self.generalization_ratio = generalization_ratio
+        self.associations = associations if associations is not None else classes // 10
+        self.random = random.Random(seed)
+
+    def write(self, fw):
+        fw.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        fw.write('<xmi:XMI xmi:version="20131001" xmlns:xmi="http://www.omg.org/spec/XMI/20131001" '
+                 'xmlns:uml="http://www.eclipse.org/uml2/5.0.0/UML">\n')
+        fw.write('<uml:Package xmi:id="_model" name="SyntheticModel">\n')
+
+        self._write_type_definitions(fw)
+        self._write_object_classes(fw)
+        self._write_associations(fw)
+
+        fw.write('</uml:Package>\n')
+        fw.write('</xmi:XMI>\n')
+
+    def _write_type_definitions(self, fw):
+        fw.write('  <packagedElement xmi:type="uml:Package" xmi:id="_TypeDefinitions" name="TypeDefinitions">\n')
+
+        for name in primitive_types:
+            fw.write('    <packagedElement xmi:type="uml:DataType" xmi:id="_%s" name="%s"/>\n' % (name, name))
+
+        for enum in range(self.enums):
+            fw.write('    <packagedElement xmi:type="uml:Enumeration" xmi:id="_Enum%d" name="Kind%d">\n' %
+                     (enum, enum))
+            self._write_comment(fw, '      ', '_Enum%d_comment' % enum, 'Kinds of things, number %d' % enum)
+            for literal in range(self.literals):
+                fw.write('      <ownedLiteral xmi:type="uml:EnumerationLiteral" xmi:id="_Enum%d_%d" name="kind%d"/>\n' %
+                         (enum, literal, literal))
+            fw.write('    </packagedElement>\n')
+
+        for data_type in range(self.data_types):
+            fw.write('    <packagedElement xmi:type="uml:DataType" xmi:id="_DataType%d" name="Value%d">\n' %
+                     (data_type, data_type))
+            self._write_attribute(fw, '_DataType%d_amount' % data_type, 'amount', '_Real')
+            self._write_attribute(fw, '_DataType%d_unit' % data_type, 'unit', '_String')
+            fw.write('    </packagedElement>\n')
+
+        fw.write('  </packagedElement>\n')
+
+    def _write_object_classes(self, fw):
+        fw.write('  <packagedElement xmi:type="uml:Package" xmi:id="_ObjectClasses" name="ObjectClasses">\n')
+
+        for class_ in range(self.classes):
+            is_abstract = ' isAbstract="true"' if class_ % 50 == 0 else ''
+            fw.write('    <packagedElement xmi:type="uml:Class" xmi:id="_Class%d" name="Class%d"%s>\n' %
+                     (class_, class_, is_abstract))
+            self._write_comment(fw, '      ', '_Class%d_comment' % class_, 'Synthetic class number %d' % class_)
+
+            # Only generalize to classes that came before, so there are no cycles
+            if class_ > 0 and self.random.random() < self.generalization_ratio:
+                fw.write('      <generalization xmi:type="uml:Generalization" xmi:id="_Class%d_general" '
+                         'general="_Class%d"/>\n' % (class_, self.random.randrange(class_)))
+
+            for attribute in range(self.attributes):
+                self._write_attribute(fw, '_Class%d_%d' % (class_, attribute), 'attribute%d' % attribute,
+                                      self._attribute_type())
+
+            fw.write('    </packagedElement>\n')
+
+        fw.write('  </packagedElement>\n')
+
+    def _write_associations(self, fw):
+        fw.write('  <packagedElement xmi:type="uml:Package" xmi:id="_Associations" name="Associations">\n')
+
+        for association in range(self.associations):
+            id_ = '_Association%d' % association
+            upper = self.random.choice(['1', '*'])
+            fw.write('    <packagedElement xmi:type="uml:Association" xmi:id="%s" name="Association%d" '
+                     'memberEnd="%s_0 %s_1">\n' % (id_, association, id_, id_))
+            for end, end_upper in enumerate([upper, '*']):
+                fw.write('      <ownedEnd xmi:type="uml:Property" xmi:id="%s_%d" name="end%d_%d" type="_Class%d" '
+                         'association="%s">\n' % (id_, end, association, end,
+                                                  self.random.randrange(self.classes), id_))
+                fw.write('        <upperValue xmi:type="uml:LiteralUnlimitedNatural" xmi:id="%s_%d_upper" '
+                         'value="%s"/>\n' % (id_, end, end_upper))
+                fw.write('      </ownedEnd>\n')
+            fw.write('    </packagedElement>\n')
+
+        fw.write('  </packagedElement>\n')
+
+    def _attribute_type(self):
+        choice = self.random.random()
+
+        if choice < 0.6:
+            return '_' + self.random.choice(primitive_types)
+        elif choice < 0.75 and self.enums:
+            return '_Enum%d' % self.random.randrange(self.enums)
+        elif choice < 0.85 and self.data_types:
+            return '_DataType%d' % self.random.randrange(self.data_types)
+        else:
+            return '_Class%d' % self.random.randrange(self.classes)
+
+    def _write_attribute(self, fw, id_, name, type_id):
+        fw.write('      <ownedAttribute xmi:type="uml:Property" xmi:id="%s" name="%s" type="%s">\n' %
+                 (id_, name, type_id))
+
+        if type_id == '_Integer' and self.random.random() < 0.2:
+            fw.write('        <defaultValue xmi:type="uml:LiteralInteger" xmi:id="%s_default" value="%d"/>\n' %
+                     (id_, self.random.randrange(100)))
+
+        if self.random.random() < self.many_ratio:
+            fw.write('        <lowerValue xmi:type="uml:LiteralInteger" xmi:id="%s_lower"/>\n' % id_)
+            fw.write('        <upperValue xmi:type="uml:LiteralUnlimitedNatural" xmi:id="%s_upper" value="*"/>\n' %
+                     id_)
+
+        fw.write('      </ownedAttribute>\n')
+
+    @staticmethod
+    def _write_comment(fw, indent, id_, body):
+        fw.write('%s<ownedComment xmi:type="uml:Comment" xmi:id="%s"><body>%s</body></ownedComment>\n' %
+                 (indent, id_, body))
+
+
+def generate_xmi(filename, **settings):
+    """Write a synthetic UML model to filename. See XmiGenerator for the settings"""
+    with open(filename, 'w') as fw:
+        XmiGenerator(**settings).write(fw)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic UML XML file for benchmarking")
+    parser.add_argument("outfile", help="Name of the UML XML file to write")
+    parser.add_argument("--classes", type=int, default=100, help="Number of classes (default 100)")
+    parser.add_argument("--attributes", type=int, default=10, help="Number of attributes per class (default 10)")
+    parser.add_argument("--enums", type=int, help="Number of enumerations (default one per 10 classes)")
+    parser.add_argument("--literals", type=int, default=5, help="Number of literals per enumeration (default 5)")
+    parser.add_argument("--data-types", type=int, help="Number of data types (default one per 20 classes)")
+    parser.add_argument("--many-ratio", type=float, default=0.1,
+                        help="Fraction of attributes with upperValue='*' (default 0.1)")
+    parser.add_argument("--generalization-ratio", type=float, default=0.2,
+                        help="Fraction of classes with a generalization (default 0.2)")
+    parser.add_argument("--associations", type=int, help="Number of associations (default one per 10 classes)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random choices (default 0)")
+    args = parser.parse_args()
+
+    generate_xmi(args.outfile, classes=args.classes, attributes=args.attributes, enums=args.enums,
+                 literals=args.literals, data_types=args.data_types, many_ratio=args.many_ratio,
+                 generalization_ratio=args.generalization_ratio, associations=args.associations, seed=args.seed)
@@ -0,0 +1,157 @@
+"""Tests for uml2sqlalchemy.py against the fixtures model.xmi and model_v2.xmi, the next version of model.xmi
+with renamed, changed, added and dropped classes and attributes. Needs SQLAlchemy, and enum34 on Python 2
+for the native enums. Run them from the repository root with
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import configure_mappers, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uml2sqlalchemy import Options, generate, inheritance_modes, enum_strategies, primary_key_strategies
+
+fixtures_dir = os.path.dirname(os.path.abspath(__file__))
+model_file = os.path.join(fixtures_dir, 'model.xmi')
+model_v2_file = os.path.join(fixtures_dir, 'model_v2.xmi')
+
+
+def sqlite_schema(connection):
+    """Return the tables of the SQLite database connection with their columns, foreign keys and indexes"""
+    schema = {}
+    for (table_name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        columns = [row[1:] for row in connection.execute("PRAGMA table_info('%s')" % table_name)]
+        foreign_keys = sorted(row[2:5] for row in connection.execute("PRAGMA foreign_key_list('%s')" % table_name))
+        indexes = sorted(row[1:3] for row in connection.execute("PRAGMA index_list('%s')" % table_name)
+                         if not row[1].startswith('sqlite_autoindex'))
+        schema[table_name] = (sorted(columns), foreign_keys, indexes)
+    return schema
+
+
+class GeneratorTest(unittest.TestCase):
+    """Runs generate() in a temporary directory and loads what it wrote"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+        shutil.rmtree(self.work_dir)
+
+    def generate(self, infile=model_file, outname='model.py', **kwargs):
+        """Generate infile into outname in the work directory and return the generated code"""
+        outfile = os.path.join(self.work_dir, outname)
+        generate(infile, outfile, **kwargs)
+        with open(outfile) as fd:
+            return fd.read()
+
+    def load(self, code):
+        """Execute the generated ORM code as a module of its own and configure its mappers"""
+        module = types.ModuleType('model')
+        exec(compile(code, 'model.py', 'exec'), module.__dict__)
+        configure_mappers()
+        return module
+
+    def executescript(self, script, connection=None):
+        """Run the generated SQL script on connection, or on a new in-memory SQLite database"""
+        if connection is None:
+            connection = sqlite3.connect(':memory:', isolation_level=None)
+        connection.executescript(script)
+        return connection
+
+
+class ParserTest(GeneratorTest):
+
+    def test_parsers_generate_the_same_model(self):
+        for backend in ['orm', 'core', 'ddl']:
+            expected = self.generate(parser='dict', backend=backend, outname='dict')
+            for parser in ['stream', 'sax']:
+                self.assertEqual(expected, self.generate(parser=parser, backend=backend, outname=parser),
+                                 "%s parser, %s backend" % (parser, backend))
+
+
+class OrmTest(GeneratorTest):
+
+    def create_all(self, options):
+        """Generate the ORM with options and create its tables in an in-memory SQLite database"""
+        module = self.load(self.generate(options=options))
+        engine = create_engine('sqlite://')
+        module.Base.metadata.create_all(engine)
+        return module, engine
+
+    def test_inheritance_modes(self):
+        for mode in inheritance_modes:
+            module, engine = self.create_all(Options(inheritance=mode))
+            session = sessionmaker(bind=engine)()
+            session.add(module.Garage(city='Delft', vehicles=[module.Vehicle(plate='AB-12')]))
+            session.add(module.Car(seats=4, wheels=4))
+            session.add(module.Person(age=30, tags=[module.Tag(label='friend')]))
+            session.commit()
+            self.assertEqual('Delft', session.query(module.Vehicle).filter_by(plate='AB-12').one().garage.city, mode)
+            self.assertEqual(1, session.query(module.Car).filter_by(seats=4).count(), mode)
+            person = session.query(module.Person).one()
+            self.assertEqual(('John', 30, ['friend']), (person.first_name, person.age,
+                                                       [tag.label for tag in person.tags]), mode)
+            session.close()
+
+    def test_concrete_subclass_has_the_relationships_of_its_general_class(self):
+        module, engine = self.create_all(Options(inheritance='concrete'))
+        session = sessionmaker(bind=engine)()
+        session.add(module.Car(seats=2, garage=module.Garage(city='Delft')))
+        session.commit()
+        self.assertEqual('Delft', session.query(module.Car).one().garage.city)
+        session.close()
+
+    def test_enum_strategies(self):
+        for strategy in enum_strategies:
+            module, engine = self.create_all(Options(enums=strategy))
+            self.assertIn('person', inspect(engine).get_table_names(), strategy)
+
+    def test_primary_key_strategies(self):
+        for strategy in primary_key_strategies:
+            module, engine = self.create_all(Options(primary_key=strategy))
+            session = sessionmaker(bind=engine)()
+            session.add(module.Tag(label='friend'))
+            session.commit()
+            self.assertIsNotNone(session.query(module.Tag).one().id, strategy)
+            session.close()
+
+
+class DdlTest(GeneratorTest):
+
+    def test_ddl_creates_the_orm_tables(self):
+        for mode in inheritance_modes:
+            options = Options(inheritance=mode, dialect='sqlite')
+            connection = self.executescript(self.generate(backend='ddl', options=options, outname='model.sql'))
+            module = self.load(self.generate(options=options))
+            self.assertEqual(sorted(module.Base.metadata.tables), sorted(sqlite_schema(connection)), mode)
+            connection.close()
+
+    def test_migration_gives_the_schema_of_the_new_version(self):
+        options = Options(dialect='sqlite')
+        connection = self.executescript(self.generate(backend='ddl', options=options, outname='v1.sql'))
+        connection.execute("INSERT INTO person (id, first_name, age) VALUES (1, 'Ann', 30)")
+        previous = os.path.join(self.work_dir, 'v1.xmi')
+        shutil.copy(model_file, previous)
+        self.executescript(self.generate(model_v2_file, 'migration.sql', backend='ddl', options=options,
+                                         previous=previous), connection)
+        expected = self.executescript(self.generate(model_v2_file, 'v2.sql', backend='ddl', options=options))
+        self.assertEqual(sqlite_schema(expected), sqlite_schema(connection))
+        self.assertEqual([('Ann', 30)], list(connection.execute("SELECT given_name, age FROM human")))
+        connection.close()
+        expected.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
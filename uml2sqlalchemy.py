@@ -1,109 +1,1527 @@
 
 import xmltodict
 import json
+import os
+import hashlib
+import tempfile
+import zlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+from collections import OrderedDict
+from io import BytesIO
 from urlparse import urlparse
 import re
 import textwrap
 import argparse
+import binascii
+import errno
+import keyword
+import time
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, no memory figures in the profile there
+    resource = None
+from xml.parsers import expat
+
+# Version of the generator. Bump this whenever the parsed or resolved model changes, it invalidates
+# the cached models
+__version__ = '0.21'
+
+# SQLAlchemy column types a UML type can be mapped to
+column_types = ['Integer', 'SmallInteger', 'BigInteger', 'Float', 'Numeric', 'String', 'CHAR', 'Text', 'Boolean',
+                'Date', 'Time', 'DateTime', 'LargeBinary']
+
+# SQL types of the column types in the DDL backend, and the ones that are called differently by a database
+ddl_types = {'Integer': 'INTEGER', 'SmallInteger': 'SMALLINT', 'BigInteger': 'BIGINT', 'Float': 'FLOAT',
+             'Numeric': 'NUMERIC', 'String': 'VARCHAR', 'CHAR': 'CHAR', 'Text': 'TEXT', 'Boolean': 'BOOLEAN',
+             'Date': 'DATE', 'Time': 'TIME', 'DateTime': 'DATETIME', 'LargeBinary': 'BLOB'}
+dialect_ddl_types = {'postgresql': {'DateTime': 'TIMESTAMP WITHOUT TIME ZONE', 'LargeBinary': 'BYTEA'}}
+
+# Column type of the UML types that are stored in a column instead of a table of their own, by name. A
+# data type with one of these names is an alias for its column type. Length is for String and CHAR,
+# precision and scale for Numeric, and check a CheckConstraint where {column} is the column name.
+default_type_mapping = OrderedDict([
+    ('Integer', {'type': 'Integer'}),
+    ('PositiveInteger', {'type': 'Integer', 'check': '{column} > 0'}),
+    ('NaturalNumber', {'type': 'Integer', 'check': '{column} >= 0'}),
+    ('DateTime', {'type': 'DateTime'}),
+    ('TimeAndDate', {'type': 'DateTime'}),
+    ('Float', {'type': 'Float'}),
+    ('Real', {'type': 'Float'}),
+    ('Percentage', {'type': 'Float'}),
+    ('String', {'type': 'String', 'length': 100}),
+    ('Identifier45', {'type': 'String', 'length': 45}),
+    ('Identifier90', {'type': 'String', 'length': 90}),
+    ('Boolean', {'type': 'Boolean'}),
+])
+
+header = """from sqlalchemy.ext.declarative import declarative_base, declared_attr, ConcreteBase
+Base = declarative_base()
 
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Boolean, ForeignKey, Index, Table
+from sqlalchemy import SmallInteger, BigInteger, Numeric, CHAR, Text, Date, Time, LargeBinary, CheckConstraint
+from sqlalchemy.orm import relationship
+    
+        """
 
-basic_types = ['Integer', 'DateTime', 'Float', 'String', 'Boolean']
+# Header of the core backend, which declares Tables on one MetaData instead of classes on a declarative base
+core_header = """from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, Enum, Boolean, ForeignKey, Index
+from sqlalchemy import SmallInteger, BigInteger, Numeric, CHAR, Text, Date, Time, LargeBinary, CheckConstraint
 
-class_ids = dict()
-type_ids = dict()
-my_classes = []
-my_types = []
+metadata = MetaData()
+"""
 
-last_added_list_type_id = 0
+# How a generalization is mapped: a foreign key to the general class ('fk'), SQLAlchemy's joined, single
+# table or concrete table inheritance, or 'abstract' where the abstract classes at the top of a hierarchy
+# become mixins without a table and the other classes have a foreign key to their general class
+inheritance_modes = ['fk', 'joined', 'single', 'concrete', 'abstract']
 
-def find_id_for_type_name(new_type_name):
-    result = None
-    for id, class_name in class_ids.iteritems():
-        if class_name== new_type_name:
-            result = id
-            break
+# Loader strategies for the generated relationships, see the lazy argument of SQLAlchemy's relationship()
+loader_strategies = ['select', 'selectin', 'joined', 'subquery', 'raise', 'dynamic']
 
-    if not result:
-        for id, type_name in type_ids.iteritems():
-            if type_name == new_type_name:
-                result = id
-                break
+# How enumerations are stored: the label in an Enum column ('tuple'), the same as a named database enum
+# type ('native'), a SmallInteger code of a Python IntEnum ('int'), or that code as a foreign key to a
+# lookup table with the labels ('lookup')
+enum_strategies = ['tuple', 'native', 'int', 'lookup']
+
+# Primary keys of the generated tables: an Integer or a BigInteger the database increments, a BigInteger
+# from a Sequence that can hand out blocks of ids, or an ID generated by the client, a UUID or a ULID. A
+# natural key is declared with a PrimaryKey stereotype on an attribute instead.
+primary_key_strategies = ['integer', 'bigint', 'sequence', 'uuid', 'ulid']
+
+# Databases the generated code can be tuned for
+dialects = ['sqlite', 'postgresql', 'mysql']
+
+# What is generated: SQLAlchemy ORM classes, SQLAlchemy Core Tables without classes, see Model.render_core(), or
+# the SQL script that creates the tables, see render_ddl()
+backends = ['orm', 'core', 'ddl']
+
+# How render_package() splits the generated code into modules: one per class, type and table, or one per
+# UML package (TypeDefinitions, ObjectClasses and Associations)
+shard_layouts = ['class', 'package']
+
+# Written after the header when a table has a ULID primary key
+ulid_function = """
+def new_ulid():
+    \"\"\"Return a ULID: 48 bits of milliseconds since 1970 and 80 random bits, in Crockford's base32. ULIDs
+    are ordered by time, so new rows are added at the end of the primary key index.\"\"\"
+    value = int(time.time() * 1000) << 80 | int(binascii.hexlify(os.urandom(10)), 16)
+    return "".join("0123456789ABCDEFGHJKMNPQRSTVWXYZ"[(value >> shift) & 31] for shift in range(125, -5, -5))
+
+"""
+
+# __init__ of the package written by render_package(), with the module of every name and the modules every
+# module refers to
+package_init = """\"\"\"SQLAlchemy model generated by uml2sqlalchemy.py. Every class, type and table is imported from its
+module the first time it is used, so an application only declares the mappers it needs. Use the names of
+this package rather than importing its modules, and call load_all() before creating all tables at once.\"\"\"
+import importlib
+
+from ._base import Base
+
+# Module of every class, type and table, by name
+_modules = {
+%s}
+
+# Modules every module refers to, by name in foreign keys and relationships or as a general class. SQLAlchemy
+# finds the classes and tables in them in the registry of Base.
+_references = {
+%s}
+
+_loaded = set()
+
+__all__ = ['Base', 'load_all'] + sorted(_modules)
+
+
+def _load(module):
+    \"\"\"Import module and the modules it refers to, directly or indirectly\"\"\"
+    pending = [module]
+    while pending:
+        module = pending.pop()
+        if module not in _loaded:
+            _loaded.add(module)
+            importlib.import_module('.' + module, __name__)
+            pending.extend(_references.get(module, ()))
+
+
+def __getattr__(name):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError("module %%r has no attribute %%r" %% (__name__, name))
+
+    _load(module)
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
+
+
+def load_all():
+    \"\"\"Import the modules of all classes, types and tables\"\"\"
+    for module in sorted(set(_modules.values())):
+        _load(module)
+"""
+
+
+def normalize_name(name):
+    """Normalize a type name for lookups, so that ColorKind, color_kind and colorkind are the same name"""
+    return name.replace('_', '').lower()
+
+
+class SymbolTable:
+    """Index of all classes and types in the model. Maps unique IDs to names and objects, and names back
+    to unique IDs, so that resolving types doesn't need to scan the lists of classes and types
+    """
+
+    def __init__(self):
+        self.class_ids = dict()
+        self.type_ids = dict()
+        self.classes = dict()
+        self.types = dict()
+
+        self.class_names = dict()
+        self.type_names = dict()
+        self.normalized_class_names = dict()
+        self.normalized_type_names = dict()
+
+        # Number of lookups, for the profile
+        self.lookups = 0
+
+    def add_class(self, class_):
+        """Add a class (parsed or synthesized) to the index"""
+        self.class_ids[class_.class_id] = class_.class_name
+        self.classes[class_.class_id] = class_
+
+        # When a name is used twice, the first one wins
+        self.class_names.setdefault(class_.class_name, class_.class_id)
+        self.normalized_class_names.setdefault(normalize_name(class_.class_name), class_.class_id)
+
+    def add_type(self, type_):
+        """Add an enumeration or data type to the index"""
+        self.type_ids[type_.type_id] = type_.name
+        self.types[type_.type_id] = type_
+
+        self.type_names.setdefault(type_.name, type_.type_id)
+        self.normalized_type_names.setdefault(normalize_name(type_.name), type_.type_id)
+
+    def find_id_for_name(self, name):
+        """Find the unique ID for a class or type name. Classes take precedence over types and exact
+        names take precedence over normalized names"""
+        self.lookups += 1
+        result = self.class_names.get(name)
+
+        if not result:
+            result = self.type_names.get(name)
+
+        if not result:
+            normalized_name = normalize_name(name)
+            result = self.normalized_class_names.get(normalized_name)
+
+            if not result:
+                result = self.normalized_type_names.get(normalized_name)
+
+        return result
+
+    def find_name(self, id_):
+        """Find the name of the class or type with unique ID id_"""
+        self.lookups += 1
+        if id_ in self.class_ids:
+            return self.class_ids[id_]
+
+        return self.type_ids.get(id_)
+
+    def find_class(self, class_id):
+        self.lookups += 1
+        return self.classes.get(class_id)
+
+    def find_type(self, type_id):
+        self.lookups += 1
+        return self.types.get(type_id)
+
+    def find_class_or_type(self, id_):
+        self.lookups += 1
+        result = self.classes.get(id_)
+
+        if not result:
+            result = self.types.get(id_)
+
+        return result
+
+
+def to_ascii(code):
+    """Generated code is plain ASCII, drop anything else"""
+    if isinstance(code, unicode):
+        return code.encode('ascii', 'ignore')
+
+    return code
+
+
+# Comments are wrapped to fit in 79 columns. The wrappers are shared, creating one per comment is slow.
+comment_wrapper = textwrap.TextWrapper(width=79, initial_indent='# ', subsequent_indent='# ')
+attribute_comment_wrapper = textwrap.TextWrapper(width=79, initial_indent='    # ', subsequent_indent='    # ')
+
+
+class CodeWriter:
+    """Collects the fragments of generated code written by the render() methods, and writes them to the
+    file object fw in large blocks. Fragments are encoded once per block, instead of being concatenated
+    and encoded per class."""
+
+    def __init__(self, fw, buffer_fragments=4096):
+        self.fw = fw
+        self.buffer_fragments = buffer_fragments
+        self.fragments = []
+
+    def write(self, fragment):
+        self.fragments.append(fragment)
+
+        if len(self.fragments) >= self.buffer_fragments:
+            self.flush()
+
+    def flush(self):
+        if self.fragments:
+            self.fw.write(to_ascii(u''.join(self.fragments)))
+            self.fragments = []
+
+
+def render_to_string(object_):
+    """Return the code that object_.render() writes"""
+    fw = BytesIO()
+    out = CodeWriter(fw)
+    object_.render(out)
+    out.flush()
+
+    return fw.getvalue()
+
+
+def fingerprint(state):
+    """Return a stable hash of a JSON serializable state"""
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def strongly_connected_components(nodes, successors):
+    """Tarjan's algorithm, without recursion so long chains of dependencies don't hit the recursion
+    limit. Returns the strongly connected components as lists of nodes. Every component comes after
+    all the components it has edges to.
+    """
+    index = dict()
+    lowlink = dict()
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+
+        while work:
+            node, children = work[-1]
+
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                # All children of node have been visited
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullProfiler:
+    """Profiler that doesn't measure anything, used when profiling is disabled"""
+
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def add_counters(self, model):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def peak_memory():
+    """Peak memory use of this process so far in kB, or None when that isn't known"""
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class _ProfilePhase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = cpu_time()
+        self.memory = peak_memory()
+        return self
+
+    def __exit__(self, *exc_info):
+        memory = peak_memory()
+
+        self.profiler.phases.append(OrderedDict([
+            ('name', self.name),
+            ('wall_time', time.time() - self.wall),
+            ('cpu_time', cpu_time() - self.cpu),
+            ('peak_memory_delta_kb', memory - self.memory if memory is not None else None),
+        ]))
+        return False
+
+
+class Profiler:
+    """Measures wall time, CPU time and the growth of the peak memory use of every phase of a run, and
+    collects counters about the model. Use as `with profiler.phase('name'): ...`"""
+
+    def __init__(self):
+        self.phases = []
+        self.counters = OrderedDict()
+
+    def phase(self, name):
+        return _ProfilePhase(self, name)
+
+    def add_counters(self, model):
+        """Count what is in the model"""
+        attributes = [attribute_ for object_ in model.classes + model.types
+                      for attribute_ in getattr(object_, 'attributes', [])]
+
+        self.counters['elements'] = model.elements
+        self.counters['classes'] = len(model.classes)
+        self.counters['types'] = len(model.types)
+        self.counters['attributes'] = len(attributes)
+        self.counters['constraints'] = sum(len(attribute_.constraints) for attribute_ in attributes)
+        self.counters['lookups'] = model.symbols.lookups
+        self.counters['synthesized_list_types'] = len([class_ for class_ in model.classes if class_.synthesized])
+        self.counters['association_tables'] = len(model.tables)
+        self.counters['associations'] = len(model.associations)
+
+    def report(self):
+        return OrderedDict([('phases', self.phases), ('counters', self.counters)])
+
+    def write(self, filename):
+        with open(filename, 'w') as fw:
+            json.dump(self.report(), fw, indent=4)
+
+
+class MyColumnType:
+    """SQLAlchemy column type a UML type is mapped to"""
+
+    def __init__(self, type_, length=None, precision=None, scale=None, check=None):
+        self.type = type_
+        self.length = length
+        self.precision = precision
+        self.scale = scale
+        self.check = check
+
+    def render(self, out):
+        out.write(self.type)
+
+        if self.length is not None:
+            out.write("(" + str(self.length) + ")")
+        elif self.precision is not None:
+            out.write("(" + str(self.precision))
+            if self.scale is not None:
+                out.write(", " + str(self.scale))
+            out.write(")")
+
+    def render_check(self, out, column_name):
+        """Write the CheckConstraint argument of a column of this type"""
+        if self.check:
+            out.write(", CheckConstraint(\"" + self.check.format(column=column_name) + "\")")
+
+    def __repr__(self):
+        return render_to_string(self)
+
+    def ddl_type(self, dialect):
+        """SQL type of a column of this type"""
+        type_ = dialect_ddl_types.get(dialect, {}).get(self.type) or ddl_types[self.type]
+
+        if self.length is not None:
+            return type_ + "(" + str(self.length) + ")"
+        elif self.precision is not None:
+            if self.scale is not None:
+                return type_ + "(" + str(self.precision) + ", " + str(self.scale) + ")"
+            return type_ + "(" + str(self.precision) + ")"
+        elif self.type == 'String' and dialect == 'mysql':
+            # MySQL has no VARCHAR without a length
+            return type_ + "(255)"
+
+        return type_
+
+    def ddl_check(self, column_name):
+        """SQL of the check constraint of a column of this type, None when it has none"""
+        if self.check:
+            return self.check.format(column=column_name)
+
+        return None
+
+    def fingerprint_state(self):
+        return [self.type, self.length, self.precision, self.scale, self.check]
+
+
+def parse_type_mapping(mapping):
+    """Turn a type mapping, as in default_type_mapping, into MyColumnType objects. The column type can
+    also be just the name of the SQLAlchemy type. Raises ValueError for unknown column types."""
+    result = dict()
+
+    for name, column_type in mapping.items():
+        if isinstance(column_type, basestring):
+            column_type = {'type': column_type}
+
+        if column_type.get('type') not in column_types:
+            raise ValueError("Unknown column type %s for %s, expected one of %s" %
+                             (column_type.get('type'), name, ", ".join(column_types)))
+
+        result[name] = MyColumnType(column_type['type'], column_type.get('length'), column_type.get('precision'),
+                                    column_type.get('scale'), column_type.get('check'))
 
     return result
 
 
-def find_class_or_type(type_id) :
-    result = None
+def load_type_mapping(filename):
+    """Load a type mapping from a JSON file, like {"Amount": {"type": "Numeric", "precision": 12, "scale": 2}}.
+    The file adds to or changes default_type_mapping."""
+    with open(filename) as fd:
+        mapping = json.load(fd, object_pairs_hook=OrderedDict)
 
-    for class_ in my_classes:
-        if class_.class_id == type_id:
-            result = class_
+    result = OrderedDict(default_type_mapping)
+    result.update(mapping)
 
-    if not result:
-        for type_ in my_types:
-            if type_.type_id == type_id:
-                result = type_
+    # Fail early on unknown types
+    parse_type_mapping(result)
 
     return result
 
+
+class Options:
+    """How a UML model is turned into code. The options change the resolved model, so they are part of
+    the key of cached models."""
+
+    def __init__(self, collections='list', lazy='selectin', inheritance='fk', type_mapping=None, enums='tuple',
+                 server_defaults=False, primary_key='integer', sequence_increment=None, sequence_cache=None,
+                 embed=False, dialect=None, fingerprints=False):
+        # How attributes with a '*' multiplicity are stored: 'list' creates a ListOfXs table with a
+        # ListOfXsItems table for the items, 'association' one association table per attribute
+        self.collections = collections
+
+        # Loader strategy of the relationships generated for associations, unless a stereotype on the
+        # association says otherwise. selectin loads the collections of many objects in one query.
+        self.lazy = lazy
+
+        # How generalizations are mapped, unless a stereotype on the top class of a hierarchy says otherwise
+        self.inheritance = inheritance
+
+        # Column types of UML types by name, see default_type_mapping
+        self.type_mapping = type_mapping if type_mapping is not None else default_type_mapping
+
+        # How enumerations are stored, see enum_strategies
+        self.enums = enums
+
+        # Whether default values are filled in by the database instead of by SQLAlchemy, so that bulk
+        # inserts don't need to evaluate them in Python
+        self.server_defaults = server_defaults
+
+        # Primary key of the tables, unless a stereotype on a class says otherwise. See primary_key_strategies.
+        # The sequence strategy takes increment and cache from the sequence options.
+        self.primary_key = primary_key
+        self.sequence_increment = sequence_increment
+        self.sequence_cache = sequence_cache
+
+        # Whether data types and classes with one attribute are stored as columns in the tables of the
+        # classes that use them, instead of in tables of their own
+        self.embed = embed
+
+        # The database the code is for, see dialects. None for code that works the same on all of them. On
+        # a database, attributes of a basic type with a '*' multiplicity are stored in an ARRAY or JSON column
+        # instead of in list or association tables.
+        self.dialect = dialect
+
+        # Whether the classes, types and tables are fingerprinted while they are resolved, so that
+        # render_incremental() can render only the ones that changed. Other runs don't need them.
+        self.fingerprints = fingerprints
+
+    def key(self):
+        """Return a string that is different for every combination of options"""
+        return json.dumps(self.__dict__, sort_keys=True)
+
+
+class Model:
+    """Everything that is known about one UML model: the symbol table, the parsed classes and types and
+    the synthesized list types. Nothing is shared between models, so several models can be parsed,
+    resolved and rendered at the same time in one process.
+    """
+
+    def __init__(self, profiler=NULL_PROFILER, options=None):
+        self.options = options if options is not None else Options()
+        self.column_types = parse_type_mapping(self.options.type_mapping)
+
+        # Primary key of the tables that don't have one of their own, like the synthesized list types
+        self.primary_key = MyPrimaryKey(self.options.primary_key, increment=self.options.sequence_increment,
+                                        cache=self.options.sequence_cache)
+        self.symbols = SymbolTable()
+        self.classes = []
+        self.types = []
+        self.last_added_list_type_id = 0
+
+        # Association tables for attributes with a many constraint, in the association collections mode,
+        # and for n:m associations
+        self.tables = []
+
+        # Names of the tables of the classes, types and tables, in lower case, so that the tables of n:m
+        # associations get a name of their own. The names of all classes and enumerations are taken, whether
+        # or not they get a table of their own.
+        self.table_names = set()
+
+        # The associations, and the associations every class is at one of the ends of
+        self.associations = []
+        self.class_associations = dict()
+
+        # Stereotypes applied to elements of the model, by the unique ID of the element. Every stereotype
+        # is a tuple of its name and a dictionary of its tagged values
+        self.stereotypes = dict()
+
+        # Number of packaged elements parsed, for the profile
+        self.elements = 0
+
+        self.profiler = profiler
+
+    def __getstate__(self):
+        # The profiler belongs to a run, not to the model
+        state = self.__dict__.copy()
+        del state['profiler']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.profiler = NULL_PROFILER
+
+    def next_list_type_id(self):
+        """Return a new unique ID for a synthesized list type"""
+        self.last_added_list_type_id += 1
+        return self.last_added_list_type_id
+
+    def add_class(self, class_):
+        self.symbols.add_class(class_)
+        self.classes.append(class_)
+        self.table_names.add(class_.class_name.lower())
+
+    def add_type(self, type_):
+        self.symbols.add_type(type_)
+        self.types.append(type_)
+
+        # Aliases of column types have no table
+        if isinstance(type_, MyEnumerationType) or type_.output:
+            self.table_names.add(type_.name.lower())
+
+    def add_table(self, table):
+        self.tables.append(table)
+        self.table_names.update(name.lower() for name in table.output_names())
+
+    def add_association(self, association):
+        self.associations.append(association)
+
+    def index_associations(self):
+        """Find the ends of every association, and the associations every class is at one of the ends of"""
+        # Ends can be attributes of the classes instead of owned by the association
+        attributes = dict()
+        if self.associations:
+            for class_ in self.classes:
+                for attribute_ in class_.attributes:
+                    attributes[attribute_.id] = (class_, attribute_)
+
+        self.class_associations = dict()
+        for association in self.associations:
+            association.find_member_ends(attributes)
+
+            for type_id in set(end.type_id for end in association.ends):
+                self.class_associations.setdefault(type_id, []).append(association)
+
+    def find_associations(self, class_id):
+        """Return the associations the class with unique ID class_id is at one of the ends of"""
+        return self.class_associations.get(class_id, [])
+
+    def find_id_for_type_name(self, new_type_name):
+        return self.symbols.find_id_for_name(new_type_name)
+
+    def find_column_type(self, type_name):
+        """Return the MyColumnType the UML type type_name is stored as, or None when it has a table"""
+        return self.column_types.get(type_name)
+
+    def add_stereotype(self, tag, attributes):
+        """Add a stereotype application, like <Profile:Index base_Property="_id" name="ix_name"/>. The
+        attributes that start with base_ are the elements it applies to, the others its tagged values"""
+        name = tag.split(':')[-1]
+        tagged_values = dict((key, value) for key, value in attributes.items()
+                             if not key.startswith('base_') and not key.startswith('xmi:'))
+
+        for key, value in attributes.items():
+            if key.startswith('base_'):
+                self.stereotypes.setdefault(value, []).append((name, tagged_values))
+
+    def find_stereotypes(self, id_):
+        """Return the stereotypes applied to the element with unique ID id_"""
+        return self.stereotypes.get(id_, [])
+
+    def find_class_or_type(self, type_id):
+        return self.symbols.find_class_or_type(type_id)
+
+    def resolve(self):
+        """Resolve all unique IDs into types, and replace attributes with a many constraint by lists"""
+        with self.profiler.phase('index_associations'):
+            self.index_associations()
+
+        # Fingerprint the classes and types as they were parsed, resolving changes them
+        if self.options.fingerprints:
+            with self.profiler.phase('fingerprint'):
+                for object_ in self.classes + self.types:
+                    object_.fingerprint = object_.compute_fingerprint()
+
+        with self.profiler.phase('resolve_inheritance'):
+            self.resolve_inheritance()
+
+        # Before the associations, which refer to the key columns
+        with self.profiler.phase('resolve_primary_keys'):
+            self.resolve_primary_keys()
+
+        # Before the attributes are resolved, associations add foreign keys and remove the ends that are
+        # attributes
+        with self.profiler.phase('resolve_associations'):
+            for association in self.associations:
+                association.resolve()
+
+        with self.profiler.phase('resolve_type_ids'):
+            for class_ in self.classes:
+                class_.resolve_type_ids()
+
+            for type_ in self.types:
+                type_.resolve_type_ids()
+
+        # print "Resolving x to many constraints"
+
+        with self.profiler.phase('resolve_many_constraints'):
+            for class_ in self.classes:
+                class_.resolve_many_constraints()
+
+            for type_ in self.types:
+                type_.resolve_many_constraints()
+
+        # print "Done resolving x to many constraints"
+
+        with self.profiler.phase('resolve_type_ids (second pass)'):
+            for class_ in self.classes:
+                class_.resolve_type_ids()
+
+            for type_ in self.types:
+                type_.resolve_type_ids()
+
+        # The synthesized list types and the association tables only exist now
+        if self.options.fingerprints:
+            with self.profiler.phase('fingerprint (second pass)'):
+                for class_ in self.classes:
+                    if class_.fingerprint is None:
+                        class_.fingerprint = class_.compute_fingerprint()
+
+                for table in self.tables:
+                    table.fingerprint = table.compute_fingerprint()
+
+        if self.options.embed:
+            with self.profiler.phase('resolve_embedded'):
+                self.resolve_embedded()
+
+        with self.profiler.phase('resolve_indexes'):
+            for object_ in self.classes + self.types:
+                if not isinstance(object_, MyEnumerationType):
+                    object_.indexes = resolve_indexes(self, object_.attributes)
+
+                    if self.array_type() == 'ARRAY':
+                        object_.indexes += resolve_array_indexes(object_.table_name(), object_.attributes)
+
+    def inheritance_mode(self, class_, mode):
+        """Return how the hierarchy with class_ at the top is mapped. An inheritance tagged value on a
+        stereotype of class_ overrides mode."""
+        for name, tagged_values in self.find_stereotypes(class_.class_id):
+            if tagged_values.get('inheritance') in inheritance_modes:
+                mode = tagged_values['inheritance']
+
+        return mode
+
+    def resolve_inheritance(self):
+        """Decide for every class how its generalization is mapped, and put the classes in an order where
+        every class comes after its general class, as Python needs for subclasses. Classes in a cycle of
+        generalizations, and the classes below them, keep a foreign key to their general class."""
+        classes = dict((class_.class_id, class_) for class_ in self.classes)
+
+        def general_class_ids(class_id):
+            general_class_id = classes[class_id].general_class_id
+            return [general_class_id] if general_class_id in classes else []
+
+        order = []
+        in_cycle = set()
+        for component in strongly_connected_components([class_.class_id for class_ in self.classes],
+                                                       general_class_ids):
+            if len(component) > 1 or general_class_ids(component[0]) == component:
+                print("Generalization cycle between %s, using foreign keys for these classes" %
+                      (", ".join(sorted(classes[class_id].class_name for class_id in component))))
+                in_cycle.update(component)
+            order.extend(classes[class_id] for class_id in component)
+
+        # General classes come first, so they have been resolved already
+        for class_ in order:
+            general_class = classes.get(class_.general_class_id)
+
+            if class_.class_id in in_cycle or (general_class is not None and general_class.in_cycle):
+                class_.in_cycle = True
+                class_.inheritance = 'fk'
+            elif general_class is None or general_class.mixin:
+                # Top of a hierarchy, or below the mixins at the top
+                if general_class is None:
+                    class_.inheritance = self.inheritance_mode(class_, self.options.inheritance)
+                else:
+                    class_.inheritance = self.inheritance_mode(class_, general_class.inheritance)
+
+                class_.mixin = class_.is_abstract and class_.inheritance == 'abstract'
+                class_.mixin_class = general_class
+
+                # Every class using the mixin needs foreign key columns of its own
+                for attribute_ in class_.attributes:
+                    attribute_.declared_attr = class_.mixin
+            else:
+                class_.inheritance = general_class.inheritance
+                if class_.inheritance in ('joined', 'single', 'concrete'):
+                    class_.mapped_class = general_class
+                    class_.root = general_class.root
+                    class_.root.polymorphic = True
+
+                if class_.inheritance == 'single':
+                    class_.root.single_table_classes.append(class_)
+                    for attribute_ in class_.attributes:
+                        self.add_single_table_column(class_, attribute_)
+                elif class_.inheritance == 'joined':
+                    for attribute_ in class_.attributes:
+                        self.add_joined_table_column(class_, attribute_)
+
+        mixins = set(class_.class_id for class_ in self.classes if class_.mixin)
+        if mixins:
+            for class_ in self.classes:
+                for attribute_ in class_.attributes:
+                    if attribute_.type_id in mixins:
+                        print("Attribute %s of %s refers to abstract class %s, which has no table" %
+                              (attribute_.name, class_.class_name, self.symbols.class_ids[attribute_.type_id]))
+
+        if any(class_.inheritance != 'fk' for class_ in self.classes):
+            self.classes = order
+
+        # The fingerprints of the classes include how they are mapped
+        if self.options.fingerprints:
+            for class_ in self.classes:
+                class_.fingerprint = fingerprint([class_.fingerprint, class_.inheritance_state()])
+
+    def resolve_primary_keys(self):
+        """Decide the primary key of every class and data type. The classes in a joined, single or concrete
+        table hierarchy share the key of the top class."""
+        for class_ in self.classes:
+            if class_.mapped_class is None:
+                class_.primary_key = resolve_primary_key(self, class_, class_.class_name, class_.class_id,
+                                                         class_.attributes, self.options.primary_key)
+
+        for class_ in self.classes:
+            if class_.mapped_class is not None:
+                class_.primary_key = class_.root.primary_key
+
+                for attribute_ in class_.attributes:
+                    if is_natural_key(self, attribute_):
+                        print("Attribute %s of %s can't be a primary key, %s has the key of %s" %
+                              (attribute_.name, class_.class_name, class_.class_name, class_.root.class_name))
+
+            if self.options.fingerprints:
+                class_.fingerprint = fingerprint([class_.fingerprint, class_.primary_key.fingerprint_state()])
+
+        for type_ in self.types:
+            if isinstance(type_, MyDataType):
+                type_.primary_key = resolve_primary_key(self, type_, type_.name, type_.type_id, type_.attributes,
+                                                        self.options.primary_key)
+                if self.options.fingerprints:
+                    type_.fingerprint = fingerprint([type_.fingerprint, type_.primary_key.fingerprint_state()])
+
+    def resolve_embedded(self):
+        """Decide which data types and classes with one attribute are embedded in the tables of the classes
+        that use them, and let the attributes of their type embed them. Types that are the items of an
+        association table, and classes in a generalization or association, keep their table."""
+        attributes = [attribute_ for object_ in self.classes + self.types
+                      if not isinstance(object_, MyEnumerationType) for attribute_ in object_.attributes]
+
+        excluded = set(attribute_.type_id for attribute_ in attributes if attribute_.association_table)
+        excluded.update(class_.general_class_id for class_ in self.classes if class_.general_class_id)
+
+        # A composite() can't be combined with a column of the same name in a subclass, or the other way round
+        for class_ in self.classes:
+            general_class = class_.mapped_class
+            while general_class is not None:
+                names = set(attribute_.name for attribute_ in general_class.attributes)
+                for attribute_ in class_.attributes:
+                    if attribute_.name in names:
+                        excluded.add(attribute_.type_id)
+                        excluded.update(general_attribute.type_id for general_attribute in general_class.attributes
+                                        if general_attribute.name == attribute_.name)
+                general_class = general_class.mapped_class
+
+        embedded = dict()
+        for class_ in self.classes:
+            if (class_.class_id not in excluded and class_.output and not class_.synthesized and
+                    not class_.general_class_id and not class_.is_abstract and len(class_.attributes) == 1 and
+                    not class_.relationships and not self.find_associations(class_.class_id) and
+                    all(attribute_.is_column() for attribute_ in class_.attributes)):
+                embedded[class_.class_id] = class_
+
+        for type_ in self.types:
+            if (isinstance(type_, MyDataType) and type_.type_id not in excluded and type_.output and
+                    type_.attributes and all(attribute_.is_column() for attribute_ in type_.attributes)):
+                embedded[type_.type_id] = type_
+
+        for object_ in embedded.values():
+            object_.embedded = True
+            if self.options.fingerprints:
+                object_.fingerprint = fingerprint([object_.fingerprint, 'embedded'])
+
+        for attribute_ in attributes:
+            if attribute_.type_id in embedded and not attribute_.association_table:
+                attribute_.embedded = embedded[attribute_.type_id]
+
+        # The classes for the values of composite() attributes have to come before the classes using them
+        self.classes = ([class_ for class_ in self.classes if class_.embedded] +
+                        [class_ for class_ in self.classes if not class_.embedded])
+
+    def add_single_table_column(self, class_, attribute_):
+        """Add the column for attribute_ of class_ to the table of the top class of its single table
+        hierarchy. Columns with a name that is already used get the name of the class in front."""
+        root = class_.root
+        if root.single_table_columns is None:
+            root.single_table_columns = set(attribute_.name for attribute_ in root.attributes)
+
+        # The other classes in the table leave the column empty
+        attribute_.always_nullable = True
+
+        if attribute_.name in root.single_table_columns:
+            attribute_.column_prefix = class_.class_name.lower() + "_"
+        root.single_table_columns.add(attribute_.column_prefix + attribute_.name)
+
+    def add_joined_table_column(self, class_, attribute_):
+        """Add the column for attribute_ of class_ to its table in a joined table hierarchy. When a general
+        class has an attribute with the same name, SQLAlchemy would map both columns to one attribute and
+        write its value to both, so the column and the attribute get the name of the class in front."""
+        general_class = class_.mapped_class
+        while general_class is not None:
+            if any(general_attribute.column_prefix + general_attribute.name == attribute_.name
+                   for general_attribute in general_class.attributes):
+                attribute_.column_prefix = class_.class_name.lower() + "_"
+                return
+
+            general_class = general_class.mapped_class
+
+    def dependency_fingerprints(self):
+        """Combine the fingerprint of every class and type with the fingerprints of all classes and types
+        it depends on, directly or indirectly. Returns a dictionary of output key to fingerprint. The model
+        has to be resolved with the fingerprints option.
+        """
+        if not self.options.fingerprints:
+            raise ValueError("The model was resolved without fingerprints, see Options.fingerprints")
+
+        objects = dict((object_.output_key(), object_) for object_ in self.types + self.classes + self.tables)
+
+        dependencies = dict()
+        for key, object_ in objects.items():
+            keys = set()
+            for id_ in object_.dependencies():
+                dependency = self.find_class_or_type(id_)
+                if dependency is not None and dependency.output_key() in objects:
+                    keys.add(dependency.output_key())
+            dependencies[key] = sorted(keys)
+
+        combined = dict()
+
+        # Every component comes after the components it depends on, so those have been combined already.
+        # Classes that depend on each other share the fingerprint of their component.
+        for component in strongly_connected_components(sorted(objects), dependencies.get):
+            members = set(component)
+            own = sorted(objects[key].fingerprint for key in component)
+            others = sorted(set(combined[dependency] for key in component for dependency in dependencies[key]
+                                if dependency not in members))
+
+            component_fingerprint = fingerprint([own, others])
+            for key in component:
+                combined[key] = component_fingerprint
+
+        return combined
+
+    def array_type(self):
+        """Return the type of the columns for attributes of a basic type with a '*' multiplicity, None when
+        they are stored in tables of their own"""
+        if self.options.dialect == 'postgresql':
+            return 'ARRAY'
+        elif self.options.dialect in ('sqlite', 'mysql'):
+            return 'JSON'
+
+        return None
+
+    def header(self, core=False):
+        """Return the imports and declarations the generated code starts with, or with core those of the code
+        of the core backend"""
+        imports = ""
+
+        if self.options.enums in ('int', 'lookup'):
+            imports += "import enum\n"
+        if self.options.enums == 'lookup':
+            imports += "from sqlalchemy import event\n"
+        if self.options.server_defaults:
+            imports += "from sqlalchemy import text, true, false\n"
+        if not core and any(object_.embedded for object_ in self.classes + self.types
+                            if not isinstance(object_, MyEnumerationType)):
+            imports += "from sqlalchemy.orm import composite\n"
+        if self.array_type() == 'ARRAY':
+            imports += "from sqlalchemy.dialects.postgresql import ARRAY\n"
+        elif self.array_type() == 'JSON':
+            imports += "from sqlalchemy import JSON\n"
+
+        strategies = set(object_.key().strategy for object_ in self.classes + self.types
+                         if not isinstance(object_, MyEnumerationType))
+        if 'sequence' in strategies:
+            imports += "from sqlalchemy import Sequence\n"
+        if 'uuid' in strategies:
+            imports += "import uuid\n"
+        if 'ulid' in strategies:
+            imports += "import binascii, os, time\n"
+            return imports + (core_header if core else header) + ulid_function
+
+        return imports + (core_header if core else header)
+
+    def render_chunks(self):
+        """Return the generated code as a list of (output key, code) tuples, in output order. Code that
+        doesn't belong to a class or type has None as its output key. The code for a class or type is
+        rendered only when it is asked for, so that unchanged code can be taken from a previous run.
+        """
+        chunks = [(None, self.header)]
+
+        chunks.append((None, lambda: "\n"))
+
+        for type_ in self.types:
+            if isinstance(type_, MyEnumerationType) :
+                chunks.append((type_.output_key(), lambda type_=type_: repr(type_) + "\n"))
+
+        chunks.append((None, lambda: "\n"))
+
+        for type_ in self.types:
+            if not isinstance(type_, MyEnumerationType) :
+                chunks.append((type_.output_key(), lambda type_=type_: repr(type_)))
+
+        for class_ in self.classes:
+            # class_.resolve_type_ids()
+
+            #if not class_.is_abstract:
+            chunks.append((class_.output_key(), lambda class_=class_: repr(class_)))
+
+        for table in self.tables:
+            chunks.append((table.output_key(), lambda table=table: repr(table)))
+
+        return chunks
+
+    def render(self, fw):
+        """Write the SQLAlchemy model to the file object fw"""
+        out = CodeWriter(fw)
+
+        out.write(self.header())
+
+        out.write("\n")
+
+        for type_ in self.types:
+            if isinstance(type_, MyEnumerationType) :
+                type_.render(out)
+                out.write("\n")
+
+        out.write("\n")
+
+        for type_ in self.types:
+            if not isinstance(type_, MyEnumerationType) :
+                type_.render(out)
+
+        for class_ in self.classes:
+            class_.render(out)
+
+        for table in self.tables:
+            table.render(out)
+
+        out.flush()
+
+    def render_core(self, fw):
+        """Write the SQLAlchemy Core Tables of the model to the file object fw, on one MetaData, for loading
+        and querying the tables without mapped classes. The tables and columns are the same as those of the
+        classes render() writes, the Table of a table is in the variable core_table_variable() names."""
+        out = CodeWriter(fw)
+
+        out.write(self.header(core=True))
+
+        out.write("\n")
+
+        for type_ in self.types:
+            if isinstance(type_, MyEnumerationType):
+                type_.render(out, core=True)
+                out.write("\n")
+
+        out.write("\n")
+
+        for type_ in self.types:
+            if not isinstance(type_, MyEnumerationType):
+                type_.render_core(out)
+
+        for class_ in self.classes:
+            class_.render_core(out)
+
+        for table in self.tables:
+            table.render(out, core=True)
+
+        out.flush()
+
+
 def convert_camel_case(name):
     """Convert camel case identifiers to python style with underscores"""
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
+class MyIndex:
+    """Index over one or more attributes of a class, declared with stereotypes"""
+
+    def __init__(self, name, unique=False, using=None):
+        self.name = name
+        self.unique = unique
+        self.attributes = []
+
+        # The kind of index on PostgreSQL, like gin
+        self.using = using
+
+    def render(self, out):
+        out.write("Index('" + self.name + "'")
+
+        for attribute_ in self.attributes:
+            out.write(", '" + attribute_.column_name() + "'")
+
+        if self.unique:
+            out.write(", unique = True")
+
+        if self.using:
+            out.write(", postgresql_using = '" + self.using + "'")
+
+        out.write(")")
+
+
+def render_table_args(out, indexes):
+    """Write the __table_args__ of a class with composite indexes"""
+    if not indexes:
+        return
+
+    out.write("    __table_args__ = (\n")
+    for index in indexes:
+        out.write("        ")
+        index.render(out)
+        out.write(",\n")
+    out.write("    )\n")
+
+
+def render_core_indexes(out, indexes):
+    """Write the composite indexes of a class as arguments of its Table in the core backend"""
+    for index in indexes:
+        out.write("    ")
+        index.render(out)
+        out.write(",\n")
+
+
+def core_table_variable(table_name):
+    """Name of the variable of the Table of table_name in the code of the core backend. The suffix keeps it
+    apart from the enumerations, whose lookup tables have their name."""
+    return table_name + "_table"
+
+
+def resolve_array_indexes(table_name, attributes):
+    """Return a GIN index for every ARRAY column, so that queries for rows with a value in the array
+    (contains, overlap) don't have to read every row, like the index on the items of a list table"""
+    indexes = []
+
+    for attribute_ in attributes:
+        if attribute_.array_type == 'ARRAY' and not attribute_.embedded:
+            index = MyIndex("ix_" + table_name + "_" + attribute_.column_name(), using='gin')
+            index.attributes.append(attribute_)
+            indexes.append(index)
+
+    return indexes
+
+
+def is_true(value):
+    return value is not None and value.lower() in ('true', '1', 'yes')
+
+
+def resolve_indexes(model, attributes):
+    """Find the indexes declared on attributes with stereotypes. An Index or Unique stereotype, or one with
+    an index or unique tagged value of true, indexes just that attribute. When the stereotype has a name,
+    or the tagged value is a name, all attributes with that name make up one composite index.
+
+    Single attribute indexes are set on the attributes themselves, the composite indexes are returned."""
+    indexes = OrderedDict()
+
+    for attribute_ in attributes:
+        for name, tagged_values in model.find_stereotypes(attribute_.id):
+            kinds = []
+            if name.lower() in ('index', 'unique'):
+                kinds.append((name.lower(), tagged_values.get('name')))
+            for kind in ('index', 'unique'):
+                value = tagged_values.get(kind)
+                if value is not None and (is_true(value) or value.lower() not in ('false', '0', 'no')):
+                    kinds.append((kind, None if is_true(value) else value))
+
+            for kind, index_name in kinds:
+                if index_name:
+                    if index_name not in indexes:
+                        indexes[index_name] = MyIndex(index_name, unique=(kind == 'unique'))
+                    if attribute_ not in indexes[index_name].attributes:
+                        indexes[index_name].attributes.append(attribute_)
+                elif kind == 'unique':
+                    attribute_.unique = True
+                else:
+                    attribute_.index = True
+
+    # A composite index with just one attribute is an index on that attribute
+    result = []
+    for index in indexes.values():
+        if len(index.attributes) == 1:
+            if index.unique:
+                index.attributes[0].unique = True
+            else:
+                index.attributes[0].index = True
+        else:
+            result.append(index)
+
+    return result
+
+
+class MyPrimaryKey:
+    """Primary key of the table of a class or data type, see primary_key_strategies. With a strategy of
+    'natural' the column of attribute is the key."""
+
+    def __init__(self, strategy, attribute=None, increment=None, cache=None):
+        self.strategy = strategy
+        self.attribute = attribute
+        self.increment = increment
+        self.cache = cache
+
+    def column_name(self):
+        if self.strategy == 'natural':
+            return self.attribute.name.lower()
+
+        return "id"
+
+    def column_type(self):
+        """SQLAlchemy type of the key column, None for natural keys that have the type of their attribute"""
+        if self.strategy in ('bigint', 'sequence'):
+            # SQLite only increments INTEGER PRIMARY KEY columns
+            return "BigInteger().with_variant(Integer, 'sqlite')"
+        elif self.strategy == 'uuid':
+            return "CHAR(32)"
+        elif self.strategy == 'ulid':
+            return "CHAR(26)"
+        elif self.strategy == 'natural':
+            return None
+
+        return "Integer"
+
+    def render(self, out, table_name, newline=True, core=False):
+        """Write the key column of table table_name, or with core the Column of it in a Table. A natural key is
+        written by its attribute."""
+        if self.strategy == 'natural':
+            return
+
+        if core:
+            out.write("    Column('" + self.column_name() + "', " + self.column_type())
+        else:
+            out.write("    id = Column(" + self.column_type())
+
+        if self.strategy == 'sequence':
+            out.write(", Sequence('" + table_name + "_id_seq'")
+            if self.increment:
+                out.write(", increment=" + str(self.increment))
+            if self.cache:
+                out.write(", cache=" + str(self.cache))
+            out.write(")")
+
+        out.write(", primary_key=True")
+
+        if self.strategy == 'uuid':
+            out.write(", default=lambda: uuid.uuid4().hex")
+        elif self.strategy == 'ulid':
+            out.write(", default=new_ulid")
+
+        out.write(")")
+
+        if core:
+            out.write(",\n")
+        elif newline:
+            out.write("\n")
+
+    def render_foreign_key(self, out, table_name, core=False):
+        """Write the key column of a joined table inheritance subclass, which refers to the key of table_name,
+        or with core the Column of it in a Table"""
+        if core:
+            out.write("    Column('" + self.column_name() + "', ")
+        else:
+            out.write("    " + self.column_name() + " = Column(")
+        if self.column_type():
+            out.write(self.column_type() + ", ")
+        out.write("ForeignKey('" + table_name + "." + self.column_name() + "'), primary_key=True)")
+        out.write(",\n" if core else "\n")
+
+    def ddl_type(self, dialect, reference=False):
+        """SQL type of the key column, or with reference of a foreign key column referring to it"""
+        if self.strategy == 'natural':
+            return self.attribute.ddl_type(dialect)
+        elif self.strategy == 'uuid':
+            return "CHAR(32)"
+        elif self.strategy == 'ulid':
+            return "CHAR(26)"
+
+        # SQLite only increments INTEGER PRIMARY KEY columns
+        type_ = "INTEGER" if self.strategy == 'integer' or dialect == 'sqlite' else "BIGINT"
+
+        if dialect == 'postgresql' and not reference and self.strategy != 'sequence':
+            return {'INTEGER': 'SERIAL', 'BIGINT': 'BIGSERIAL'}[type_]
+
+        return type_
+
+    def ddl_columns(self, table_name, dialect):
+        """Columns of the key of table table_name. A natural key is the column of its attribute."""
+        if self.strategy == 'natural':
+            return []
+
+        column = MyColumn("id", self.ddl_type(dialect), nullable=False, primary_key=True)
+
+        if self.strategy == 'sequence' and dialect == 'postgresql':
+            column.default = "nextval('" + table_name + "_id_seq')"
+        elif dialect == 'mysql' and self.strategy in ('integer', 'bigint', 'sequence'):
+            column.autoincrement = True
+
+        return [column]
+
+    def ddl_sequence(self, table_name, dialect):
+        """SQL that creates the sequence of the key of table table_name, None when it has none"""
+        if self.strategy != 'sequence' or dialect != 'postgresql':
+            return None
+
+        sql = "CREATE SEQUENCE " + quote_name(table_name + "_id_seq", dialect)
+        if self.increment:
+            sql += " INCREMENT BY " + str(self.increment)
+        if self.cache:
+            sql += " CACHE " + str(self.cache)
+
+        return sql + ";\n"
+
+    def fingerprint_state(self):
+        return [self.strategy, self.attribute.id if self.attribute else None, self.increment, self.cache]
+
+
+def is_natural_key(model, attribute_):
+    """Whether a stereotype of attribute_ makes it the primary key of its table: a PrimaryKey stereotype,
+    or one with a primaryKey tagged value of true"""
+    for name, tagged_values in model.find_stereotypes(attribute_.id):
+        if name.lower() == 'primarykey' or is_true(tagged_values.get('primaryKey')):
+            return True
+
+    return False
+
+
+def resolve_primary_key(model, owner, name, id_, attributes, strategy):
+    """Return the primary key of a class or data type with unique ID id_. A primaryKey tagged value on a
+    stereotype of it overrides strategy, increment and cache tagged values the sequence options. A natural
+    key attribute overrides them all."""
+    increment = model.options.sequence_increment
+    cache = model.options.sequence_cache
+
+    for stereotype_name, tagged_values in model.find_stereotypes(id_):
+        if tagged_values.get('primaryKey') in primary_key_strategies:
+            strategy = tagged_values['primaryKey']
+        if tagged_values.get('increment', '').isdigit():
+            increment = int(tagged_values['increment'])
+        if tagged_values.get('cache', '').isdigit():
+            cache = int(tagged_values['cache'])
+
+    key_attributes = []
+    for attribute_ in attributes:
+        if is_natural_key(model, attribute_):
+            type_ = model.find_class_or_type(attribute_.type_id)
+            many = any(constraint_.is_many_constraint() for constraint_ in attribute_.constraints)
+            column = type_ is None or isinstance(type_, MyEnumerationType) or (
+                isinstance(type_, MyDataType) and (type_.column_type or model.find_column_type(type_.name)))
+            if many or not column:
+                print("Attribute %s of %s is not stored in one column, it can't be the primary key" %
+                      (attribute_.name, name))
+            else:
+                key_attributes.append(attribute_)
+
+    if key_attributes:
+        if len(key_attributes) > 1:
+            print("%s has more than one primary key attribute, using %s" % (name, key_attributes[0].name))
+        key_attributes[0].primary_key = True
+        return MyPrimaryKey('natural', key_attributes[0])
+
+    return MyPrimaryKey(strategy, increment=increment, cache=cache)
+
+
 class MyConstraint:
     """Class that contains a constraint for an attribute"""
 
-    def __init__(self, name, constraint_type, value=None):
+    def __init__(self, model, name, constraint_type, value=None, instance=None):
+        self.model = model
         self.name = name
         self.type_id = constraint_type
         self.type_name = None
         self.value = value
 
-    def __repr__(self):
+        # Unique ID of the instance of a uml:InstanceValue, like an enumeration literal
+        self.instance = instance
+
+    def render(self, out):
         if self.type_name:
-            result = "    # " + self.name + "(" + self.type_name + ")"
+            out.write("    # " + self.name + "(" + self.type_name + ")")
         else:
-            result = "    # " + self.name + "(" + self.type_id + ")"
+            out.write("    # " + self.name + "(" + self.type_id + ")")
 
         if self.value:
-            result += " = " + self.value
+            out.write(" = " + self.value)
 
-        return result.encode('ascii', 'ignore')
-
-    def decorate_value(self, value):
-        """returns a string containign the decorated value based upon the type of the constraint
-        So String(1234) becomes '1234' and Integer(1234) becomes 1234
-        """
-        if self.type_name == 'uml:LiteralString':
-            value = "'" + value + "'"
-        else:
-            # if all else fails, assume string
-            value = "'" + value + "'"
+    def __repr__(self):
+        return render_to_string(self)
 
-        return value
+    def literal_value(self):
+        """Return the value of a literal with the type of this constraint, or None. A uml:LiteralBoolean,
+        LiteralInteger or LiteralReal without a value has the default value of its type."""
+        if self.value:
+            return self.value
+        elif self.type_id == 'uml:LiteralBoolean':
+            return 'false'
+        elif self.type_id == 'uml:LiteralInteger':
+            return '0'
+        elif self.type_id == 'uml:LiteralReal':
+            return '0.0'
 
+        return None
 
-    def get_default(self):
+    def decorate_value(self, value, server=False):
+        """returns a string containign the decorated value based upon the type of the constraint
+        So String(1234) becomes '1234' and Integer(1234) becomes 1234. With server, the value is a
+        server_default instead, a string or text() with the SQL literal.
+        """
+        try:
+            if self.type_id in ('uml:LiteralInteger', 'uml:LiteralUnlimitedNatural'):
+                value = str(int(value))
+                return "text('" + value + "')" if server else value
+            elif self.type_id == 'uml:LiteralReal':
+                value = repr(float(value))
+                return "text('" + value + "')" if server else value
+        except ValueError:
+            print("Default value %s is not a %s, using it as a string" % (value, self.type_id))
+
+        if self.type_id == 'uml:LiteralBoolean':
+            if value.lower() == 'true':
+                return "true()" if server else "True"
+
+            return "false()" if server else "False"
+
+        # if all else fails, assume string
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+    def get_default(self, server=False):
         default = None
 
         if self.name == 'defaultValue':
-            if self.value:
-                default = self.decorate_value(self.value)
+            value = self.literal_value()
+            if value:
+                default = self.decorate_value(value, server)
 
         return default
 
+    def get_ddl_default(self, dialect):
+        """Return the SQL literal of the default value of this constraint, or None"""
+        value = self.literal_value() if self.name == 'defaultValue' else None
+        if not value:
+            return None
+
+        try:
+            if self.type_id in ('uml:LiteralInteger', 'uml:LiteralUnlimitedNatural'):
+                return str(int(value))
+            elif self.type_id == 'uml:LiteralReal':
+                return repr(float(value))
+        except ValueError:
+            pass
+
+        if self.type_id == 'uml:LiteralBoolean':
+            if dialect == 'postgresql':
+                return "TRUE" if value.lower() == 'true' else "FALSE"
+
+            return "1" if value.lower() == 'true' else "0"
+
+        return sql_string(value)
+
     def resolve_type_ids(self):
         # Only resolve those that *don't* start with an _
         if self.type_id.startswith('_'):
-            if self.type_id in class_ids:
-                self.type_name = class_ids[self.type_id]
+            if self.type_id in self.model.symbols.class_ids:
+                self.type_name = self.model.symbols.class_ids[self.type_id]
             else:
-                if self.type_id in type_ids:
-                    self.type_name = type_ids[self.type_id]
+                if self.type_id in self.model.symbols.type_ids:
+                    self.type_name = self.model.symbols.type_ids[self.type_id]
 
-                self.type_ = self.find_type(self.type_id)
+                self.type_ = self.model.symbols.find_type(self.type_id)
 
             # if self.type_name:
             #     print "Resolved %s into %s" % (self.type_id, self.type_name)
@@ -113,12 +1531,34 @@ class MyConstraint:
     def is_many_constraint(self):
         return self.value == '*'
 
+    def fingerprint_state(self):
+        return [self.name, self.type_id, self.value, self.instance]
+
 
 class MyAttribute:
     """Class for a property inside a class, including type etc"""
 
-    def __init__(self):
-        # pass
+    def __init__(self, model):
+        self.model = model
+        self.index = False
+        self.unique = False
+        self.association_table = None
+        self.primary_key = False
+
+        # The data type or class this attribute embeds, see Model.resolve_embedded()
+        self.embedded = None
+
+        # ARRAY or JSON, for an attribute of a basic type with a '*' multiplicity that is stored in one column
+        self.array_type = None
+
+        # Columns of subclasses in single table inheritance must be nullable, columns with a foreign key
+        # in mixins must be declared_attr
+        self.always_nullable = False
+        self.declared_attr = False
+
+        # In front of the column name, when the name is already used in the table
+        self.column_prefix = ""
+
         self.constraints = []
         self.name = None
         self.id = None
@@ -126,22 +1566,21 @@ class MyAttribute:
         self.type_name = None
         self.comment = None
 
-    def find_type(self, type_id):
-        """Find the class object that has class_id as its unique ID"""
-        for type_ in my_types:
-            if type_.type_id == type_id:
-                return type_
+        # The column type, when the type of this attribute is stored in a column
+        self.sql_type = None
 
-        return None
+    def find_type(self, type_id):
+        """Find the type object that has type_id as its unique ID"""
+        return self.model.symbols.find_type(type_id)
 
     def resolve_type_ids(self):
-        if self.type_id in class_ids:
-            self.type_name = class_ids[self.type_id]
+        if self.type_id in self.model.symbols.class_ids:
+            self.type_name = self.model.symbols.class_ids[self.type_id]
             #print "~Found %s for %s for attribute %s" % (self.type_name, self.type_id, self.name)
             self.base_type_name = self.type_name
         else:
-            if self.type_id in type_ids:
-                self.type_name = type_ids[self.type_id]
+            if self.type_id in self.model.symbols.type_ids:
+                self.type_name = self.model.symbols.type_ids[self.type_id]
 
             #print "Found %s for %s for attribute %s" % (self.type_name, self.type_id, self.name)
 
@@ -149,18 +1588,14 @@ class MyAttribute:
 
             # If the type of this attribute is an ENUM, set the type to the
             # SQLAlchemy type 'Enum'
-            # Do the same for the other base types
-            if self.type_:
-                if isinstance(self.type_, MyEnumerationType) :
-                    self.base_type_name = 'Enum'
-                else :
-                    if self.type_name == 'Real' :
-                        self.base_type_name = 'Float'
-                    else :
-                        self.base_type_name = self.type_name
+            # Do the same for the other base types, a data type that is an alias knows its column type
+            if self.type_ and isinstance(self.type_, MyEnumerationType) :
+                self.base_type_name = 'Enum'
             else :
-                if self.type_name == 'Real':
-                    self.base_type_name = 'Float'
+                self.sql_type = getattr(self.type_, 'column_type', None) or self.model.find_column_type(self.type_name)
+
+                if self.sql_type:
+                    self.base_type_name = self.sql_type.type
                 else:
                     self.base_type_name = self.type_name
 
@@ -199,91 +1634,366 @@ class MyAttribute:
     def get_type(self):
         return self.type_
 
-    def get_default(self):
-        default = None
+    def fingerprint_state(self):
+        return [self.id, self.name, self.type_id, self.type_name, self.comment,
+                [constraint_.fingerprint_state() for constraint_ in self.constraints],
+                self.model.find_stereotypes(self.id)]
 
-        for constraint_ in self.constraints:
-            default = constraint_.get_default()
+    def is_column(self):
+        """Whether this attribute is stored in one column of a basic or enumeration type"""
+        return self.association_table is None and (self.sql_type is not None or self.base_type_name == 'Enum')
 
-            if default:
-                break
+    def is_foreign_key(self):
+        return self.base_type_name != 'Enum' and self.sql_type is None
 
-        return default
+    def attribute_name(self):
+        """Name of the attribute of the mapped class for this attribute. Its column prefix is part of it, as the
+        attribute of a general class with the same name would be mapped to the column otherwise."""
+        return self.column_prefix + self.name.lower()
 
-    def __repr__(self):
-        result = ""
+    def column_name(self):
+        """Name of the column for this attribute"""
+        if self.is_foreign_key():
+            return self.attribute_name() + "_id"
 
-        result += "    \n    # "
+        return self.attribute_name()
 
-        if self.name:
-            result += self.name + "\n"
+    def column_type(self):
+        """SQLAlchemy type of the column for an attribute of an enumeration or basic type"""
+        if self.base_type_name == 'Enum':
+            column_type = self.type_.column_type()
+        else:
+            column_type = repr(self.sql_type)
 
-        if self.comment:
-            width = 79
-            comment = textwrap.fill(self.comment, width=width,
-                                    initial_indent='    # ',
-                                    subsequent_indent='    # ')
-            result += comment
-            result += "\n    # "
+        if self.array_type == 'ARRAY':
+            return "ARRAY(" + column_type + ")"
+        elif self.array_type == 'JSON':
+            return "JSON"
 
-        for constraint_ in self.constraints:
-            result += "\n" + repr(constraint_)
+        return column_type
 
-        result += "\n"
+    def foreign_table(self):
+        """Name of the table the foreign key for this attribute refers to"""
+        class_ = self.model.symbols.find_class(self.type_id)
+        if class_ is not None:
+            return class_.table_name()
 
-        default_value = self.get_default()
+        return self.base_type_name.lower()
 
-        if self.base_type_name == 'Enum' :
-            result += "    " + self.name.lower() + " = "
-            result += "Column('" + self.name.lower() + "', "
-            result += self.base_type_name + "(*" + self.type_name + ")"
+    def foreign_key(self):
+        """Table and column the foreign key for this attribute refers to, as table.column"""
+        target = self.model.find_class_or_type(self.dependency())
+        if target is not None and not isinstance(target, MyEnumerationType):
+            return self.foreign_table() + "." + target.key().column_name()
 
-            # Requires SQLAlchemy 1.2 which hasn't been released yet
-            # if self.comment:
-            #     result += ", comment=\"" + self.comment.strip() + "\""
+        return self.foreign_table() + ".id"
 
-            # If default value, than use that and set nullable to False
-            # Other wise set nullable to True (yes, that is lazy
-            # Yes, the constraints shoudld tell us more
+    def render_nullable(self, out, default_value):
+        if self.primary_key:
             if default_value:
-                result += ", default = " + default_value
-                result += ", nullable = False"
+                out.write(", default = " + default_value)
+            out.write(", primary_key = True")
+            return
+
+        # If default value, than use that and set nullable to False
+        if default_value:
+            if self.model.options.server_defaults:
+                out.write(", server_default = " + self.get_default(server=True))
             else:
-                result += ", nullable = True"
-            result += ")"
-        elif self.base_type_name in basic_types:
-            result += "    " + self.name.lower() + " = "
-            result += "Column('" + self.name.lower()+ "', "
-
-            if self.base_type_name == 'String':
-                result += self.base_type_name + "(100)"
+                out.write(", default = " + default_value)
+            if self.always_nullable:
+                out.write(", nullable = True")
             else:
-                result += self.base_type_name
+                out.write(", nullable = False")
+        else:
+            out.write(", nullable = True")
 
-            # Requires SQLAlchemy 1.2 which hasn't been released yet
-            # if self.comment:
-            #     result += ", comment=\"" + self.comment.strip() + "\""
+    def render_index(self, out):
+        """Write the index and unique arguments of the column for this attribute"""
+        if self.unique:
+            out.write(", unique = True")
 
-            if default_value:
-                result += ", default = " + default_value
-                result += ", nullable = False"
+        # Foreign keys are always indexed, joins on them would be full scans otherwise
+        if self.index or self.is_foreign_key():
+            out.write(", index = True")
+
+    def dependency(self):
+        """Return the unique ID of the class or type of this attribute. Attributes that were
+        rewritten to a synthesized list type are found by the name of that type."""
+        if self.model.find_class_or_type(self.type_id) is None and self.type_name:
+            return self.model.find_id_for_type_name(self.type_name)
+
+        return self.type_id
+
+    def definition_dependency(self):
+        """Return the enumeration or embedded type whose name the code for this attribute uses, None when it
+        only refers to other tables by name"""
+        if self.embedded is not None:
+            return self.embedded
+
+        if self.base_type_name == 'Enum':
+            return self.type_
+
+        return None
+
+    def get_enum_default(self, server=False):
+        """Return the default value of an attribute of an enumeration type, as a literal of that type. The
+        literal is either named or, for a uml:InstanceValue, referred to by its unique ID."""
+        for constraint_ in self.constraints:
+            if constraint_.name == 'defaultValue':
+                literal = constraint_.value
+                if constraint_.instance:
+                    literal = self.type_.literal_ids.get(constraint_.instance)
+
+                if literal:
+                    return self.type_.decorate_literal(literal, server)
+
+        return None
+
+    def get_default(self, server=False):
+        """Return the default value of this attribute as a Python expression, or with server as the
+        server_default expression"""
+        if self.base_type_name == 'Enum':
+            return self.get_enum_default(server)
+
+        default = None
+
+        for constraint_ in self.constraints:
+            default = constraint_.get_default(server)
+
+            if default:
+                break
+
+        return default
+
+    def get_ddl_default(self, dialect):
+        """Return the default value of this attribute as an SQL literal, or None"""
+        if self.base_type_name == 'Enum':
+            for constraint_ in self.constraints:
+                if constraint_.name == 'defaultValue':
+                    literal = constraint_.value
+                    if constraint_.instance:
+                        literal = self.type_.literal_ids.get(constraint_.instance)
+
+                    if literal:
+                        return self.type_.ddl_literal(literal)
+
+            return None
+
+        for constraint_ in self.constraints:
+            default = constraint_.get_ddl_default(dialect)
+            if default:
+                return default
+
+        return None
+
+    def ddl_type(self, dialect):
+        """SQL type of the column for an attribute of an enumeration or basic type"""
+        if self.base_type_name == 'Enum':
+            type_ = self.type_.ddl_type(dialect)
+        else:
+            type_ = self.sql_type.ddl_type(dialect)
+
+        if self.array_type == 'ARRAY':
+            return type_ + "[]"
+        elif self.array_type == 'JSON':
+            return "JSON"
+
+        return type_
+
+    def ddl_check(self, column_name):
+        if self.array_type:
+            return None
+        elif self.base_type_name == 'Enum':
+            return self.type_.ddl_check(column_name)
+
+        return self.sql_type.ddl_check(column_name)
+
+    def ddl_references(self):
+        """Table and column the column for this attribute refers to, None when it refers to none"""
+        if self.base_type_name == 'Enum':
+            if self.type_.strategy() == 'lookup' and not self.array_type:
+                return (self.type_.name, "id")
+            return None
+
+        if self.is_foreign_key():
+            return tuple(self.foreign_key().split("."))
+
+        return None
+
+    def ddl_foreign_key_type(self, dialect):
+        """SQL type of a foreign key to the class or data type of this attribute, the type of its key"""
+        target = self.model.find_class_or_type(self.dependency())
+        if target is not None and not isinstance(target, MyEnumerationType):
+            return target.key().ddl_type(dialect, reference=True)
+
+        return "INTEGER"
+
+    def ddl_columns(self, dialect):
+        """Columns for this attribute in the DDL backend, the same as the render() writes"""
+        if self.association_table:
+            return []
+
+        if self.embedded:
+            columns = []
+            for attribute_ in self.embedded.attributes:
+                name = self.column_prefix + self.name.lower() + "_" + attribute_.name.lower()
+                id_ = self.id + "." + attribute_.id if self.id and attribute_.id else None
+                columns.append(MyColumn(name, attribute_.ddl_type(dialect), check=attribute_.ddl_check(name),
+                                        references=attribute_.ddl_references(), id_=id_))
+            return columns
+
+        name = self.column_name()
+
+        if self.is_foreign_key():
+            return [MyColumn(name, self.ddl_foreign_key_type(dialect), references=self.ddl_references(),
+                             unique=self.unique, index=True, id_=self.id)]
+
+        # The default value is for one value, not for an array of them
+        default = None if self.array_type else self.get_ddl_default(dialect)
+        column = MyColumn(name, self.ddl_type(dialect), default=default, check=self.ddl_check(name),
+                          references=self.ddl_references(), unique=self.unique, index=self.index, id_=self.id)
+
+        if self.primary_key:
+            column.primary_key = True
+            column.nullable = False
+        elif default is not None and not self.always_nullable:
+            column.nullable = False
+
+        return [column]
+
+    def render(self, out):
+        """Write the column for this attribute to out, preceded by its name, comment and constraints"""
+        out.write("    \n    # ")
+
+        if self.name:
+            out.write(self.name + "\n")
+
+        if self.comment:
+            out.write(attribute_comment_wrapper.fill(self.comment))
+            out.write("\n    # ")
+
+        for constraint_ in self.constraints:
+            out.write("\n")
+            constraint_.render(out)
+
+        out.write("\n")
+
+        # The default value is for one value, not for an array of them
+        default_value = None if self.array_type else self.get_default()
+
+        if self.association_table:
+            self.association_table.render_relationship(out)
+        elif self.embedded:
+            self.render_embedded(out)
+        elif self.base_type_name == 'Enum' or self.sql_type:
+            out.write("    " + self.attribute_name() + " = ")
+            self.render_column(out, default_value)
+        else:
+            if self.declared_attr:
+                # Every class using the mixin needs a column of its own
+                out.write("    @declared_attr\n")
+                out.write("    def " + self.attribute_name() + "_id(cls):\n")
+                out.write("        return ")
             else:
-                result += ", nullable = True"
-            result += ")"
-            #if self.name:
-            #    result += "        " + self.name.lower()
-            #
-            #if self.type_name:
-            #    result += " = " + self.type_name + "()"
-            #else:
-            #    if self.type_id:
-            #        result += " = " + self.type_id + "()"
+                out.write("    " + self.attribute_name() + "_id = ")
+            self.render_column(out, default_value)
+
+        out.write("\n")
+
+    def render_column(self, out, default_value):
+        """Write the Column for this attribute of an enumeration or basic type, with default_value as its
+        default, or the foreign key Column for an attribute of another class or type"""
+        out.write("Column('" + self.column_name() + "', ")
+
+        if self.is_foreign_key():
+            out.write("ForeignKey('" + self.foreign_key() + "')")
+            self.render_index(out)
+            out.write(", nullable = True)")
+            return
+
+        out.write(self.column_type())
+        if self.array_type:
+            pass
+        elif self.base_type_name == 'Enum':
+            self.type_.render_check(out, self.column_name())
+        else:
+            self.sql_type.render_check(out, self.column_name())
+
+        # Requires SQLAlchemy 1.2 which hasn't been released yet
+        # if self.comment:
+        #     result += ", comment=\"" + self.comment.strip() + "\""
+
+        # If default value, than use that and set nullable to False
+        # Other wise set nullable to True (yes, that is lazy
+        # Yes, the constraints shoudld tell us more
+        self.render_index(out)
+        self.render_nullable(out, default_value)
+        out.write(")")
+
+    def render_core(self, out):
+        """Write the Columns for this attribute in the Table of its class for the core backend, the same as
+        render() writes. A collection in an association table has none."""
+        if self.association_table:
+            return
+
+        if self.embedded:
+            for attribute_ in self.embedded.attributes:
+                out.write("    ")
+                self.render_embedded_column(out, attribute_)
+                out.write(",\n")
+            return
+
+        # The default value is for one value, not for an array of them
+        out.write("    ")
+        self.render_column(out, None if self.array_type else self.get_default())
+        out.write(",\n")
+
+    def column_names(self):
+        """Names of the columns for this attribute, none for a collection in an association table"""
+        if self.association_table:
+            return []
+        elif self.embedded:
+            return [self.column_prefix + self.name.lower() + "_" + attribute_.name.lower()
+                    for attribute_ in self.embedded.attributes]
+
+        return [self.column_name()]
+
+    def __repr__(self):
+        return render_to_string(self)
+
+    def render_embedded(self, out):
+        """Write a column for every attribute of the embedded data type or class, and the composite() that
+        maps them to a value of it. The columns are named after this attribute and the embedded one."""
+        names = []
+
+        for attribute_ in self.embedded.attributes:
+            name = self.attribute_name() + "_" + attribute_.name.lower()
+            names.append(name)
+
+            out.write("    " + name + " = ")
+            self.render_embedded_column(out, attribute_)
+            out.write("\n")
+
+        if isinstance(self.embedded, MyClass):
+            value_class = self.embedded.class_name
         else:
-            result += "    " + self.name.lower() + "_id = "
-            result += "Column('" + self.name.lower() + "_id', "
-            result += "ForeignKey('" + self.base_type_name.lower() + ".id'), nullable = True)"
+            value_class = self.embedded.name
+
+        out.write("    " + self.attribute_name() + " = composite(" + value_class + ", " + ", ".join(names) + ")")
+
+    def render_embedded_column(self, out, attribute_):
+        """Write the Column for attribute_ of the embedded data type or class"""
+        name = self.column_prefix + self.name.lower() + "_" + attribute_.name.lower()
 
-        return result.encode('ascii', 'ignore') + "\n"
+        out.write("Column('" + name + "', " + attribute_.column_type())
+        if attribute_.array_type:
+            pass
+        elif attribute_.base_type_name == 'Enum':
+            attribute_.type_.render_check(out, name)
+        else:
+            attribute_.sql_type.render_check(out, name)
+        out.write(", nullable = True)")
 
     def has_many_constraint(self):
         result = False
@@ -298,10 +2008,184 @@ class MyAttribute:
 
 
 
+class MyAssociationTable:
+    """Association table for an attribute with a many constraint. Instead of a ListOfXs table and a
+    ListOfXsItems table, every item of the collection is one row with the ID of the owner and the ID of
+    the item, which together are the primary key. Collections of enumerations and basic types store the
+    value itself instead of the ID of an item."""
+
+    def __init__(self, model, owner, attribute_):
+        self.model = model
+        self.owner = owner
+        self.attribute = attribute_
+        self.fingerprint = None
+
+        owner_table = owner.class_name.lower() if isinstance(owner, MyClass) else owner.name.lower()
+        self.name = owner_table + "_" + attribute_.name.lower()
+        self.owner_column = owner_table + "_id"
+
+        if attribute_.is_foreign_key():
+            self.item_column = attribute_.base_type_name.lower() + "_id"
+            if self.item_column == self.owner_column:
+                # A collection of the owner's own class
+                self.item_column = attribute_.name.lower() + "_id"
+        else:
+            self.item_column = "value"
+
+    def output_key(self):
+        return "association:" + self.name
+
+    def compute_fingerprint(self):
+        return fingerprint([self.name, self.owner_column, self.item_column, self.attribute.base_type_name,
+                            self.attribute.type_name, self.owner.key().fingerprint_state()])
+
+    def dependencies(self):
+        return [self.owner_id(), self.attribute.dependency()]
+
+    def output_names(self):
+        return [self.name]
+
+    def definition_dependencies(self):
+        return [type_ for type_ in [self.attribute.definition_dependency()] if type_ is not None]
+
+    def owner_id(self):
+        if isinstance(self.owner, MyClass):
+            return self.owner.class_id
+
+        return self.owner.type_id
+
+    def render(self, out, core=False):
+        """Write the Table for this association to out, with core for the core backend"""
+        if self.attribute.is_foreign_key():
+            item_type = "ForeignKey('" + self.attribute.foreign_key() + "')"
+        else:
+            item_type = self.attribute.column_type()
+
+        owner_key = owner_table_name(self.owner) + "." + self.owner.key().column_name()
+        render_link_table(out, self.name, self.owner_column, "ForeignKey('" + owner_key + "')",
+                          self.item_column, item_type, self.model.options.dialect, core)
+
+    def ddl_table(self, dialect):
+        """Return the MyTable for this association"""
+        owner_key = self.owner.key()
+        owner = MyColumn(self.owner_column, owner_key.ddl_type(dialect, reference=True),
+                         references=(owner_table_name(self.owner), owner_key.column_name()), id_="owner")
+
+        if self.attribute.is_foreign_key():
+            item = MyColumn(self.item_column, self.attribute.ddl_foreign_key_type(dialect),
+                            references=self.attribute.ddl_references(), id_="item")
+        else:
+            item = MyColumn(self.item_column, self.attribute.ddl_type(dialect),
+                            references=self.attribute.ddl_references(), id_="item")
+
+        # Keyed by the attribute, so renaming the owner or the attribute renames the table
+        id_ = "association:" + self.attribute.id if self.attribute.id else self.output_key()
+
+        return ddl_link_table(self.name, owner, item, self.model.options.dialect, id_)
+
+    def render_relationship(self, out):
+        """Write the attribute of the owner that holds the collection"""
+        name = self.attribute.attribute_name()
+
+        if not self.attribute.is_foreign_key():
+            out.write("    # " + name + " are stored in table " + self.name)
+            return
+
+        item_class = self.attribute.base_type_name
+        out.write("    " + name + " = relationship('" + item_class + "', secondary = '" + self.name + "'")
+
+        if item_class.lower() + "_id" == self.owner_column:
+            # Both columns refer to the same table, tell SQLAlchemy which is which
+            key = item_class + "." + self.owner.key().column_name()
+            out.write(", primaryjoin = '" + key + " == " + self.name + ".c." + self.owner_column + "'")
+            out.write(", secondaryjoin = '" + key + " == " + self.name + ".c." + self.item_column + "'")
+
+        out.write(")")
+
+    def __repr__(self):
+        return render_to_string(self)
+
+
+def render_link_table(out, name, owner_column, owner_type, item_column, item_type, dialect=None, core=False):
+    """Write a Table that links owners to items, with the owner and the item column together as its
+    primary key. With core it is on the MetaData of the core backend instead of that of Base."""
+    if core:
+        out.write(core_table_variable(name) + " = Table('" + name + "', metadata,\n")
+    else:
+        out.write(name + " = Table('" + name + "', Base.metadata,\n")
+    out.write("    Column('" + owner_column + "', " + owner_type + ", primary_key = True),\n")
+    out.write("    Column('" + item_column + "', " + item_type + ", primary_key = True),\n")
+
+    # The primary key covers finding the items of an owner, this index finding the owners of an item
+    out.write("    Index('ix_" + name + "_" + item_column + "', '" + item_column + "', '" + owner_column + "'),\n")
+
+    if dialect == 'sqlite':
+        # Stored in the primary key index, instead of in a table with a rowid and an index on the key
+        out.write("    sqlite_with_rowid = False,\n")
+
+    out.write(")\n\n")
+
+
+def ddl_link_table(name, owner, item, dialect=None, id_=None):
+    """Return the MyTable of a table that links owners to items, the same as render_link_table() writes"""
+    table = MyTable(name, id_)
+    table.without_rowid = dialect == 'sqlite'
+
+    for column in (owner, item):
+        column.nullable = False
+        column.primary_key = True
+        table.columns.append(column)
+
+    table.indexes.append(("ix_" + name + "_" + item.name, (item.name, owner.name), False, None))
+
+    return table
+
+
+def owner_table_name(owner):
+    if isinstance(owner, MyClass):
+        return owner.table_name()
+
+    return owner.name.lower()
+
+
+def create_association_table(model, owner, attribute_):
+    """Store the items of attribute_ of owner in a new association table"""
+    table = MyAssociationTable(model, owner, attribute_)
+    attribute_.association_table = table
+    model.add_table(table)
+
+    print("Created association table %s for %s" % (table.name, attribute_.name))
+
+
+def render_value_class(out, name, attributes, comment=None):
+    """Write a plain class for an embedded data type or class, the value of the composite() attributes that
+    embed it"""
+    names = [attribute_.name.lower() for attribute_ in attributes]
+
+    out.write("class " + name + "(object): # embedded in the tables of the classes that use it\n")
+    if comment:
+        out.write(attribute_comment_wrapper.fill(comment) + "\n\n")
+
+    out.write("    def __init__(self, " + ", ".join(name_ + "=None" for name_ in names) + "):\n")
+    for name_ in names:
+        out.write("        self." + name_ + " = " + name_ + "\n")
+
+    out.write("\n    def __composite_values__(self):\n")
+    out.write("        return (" + ", ".join("self." + name_ for name_ in names) + ",)\n")
+
+    out.write("\n    def __eq__(self, other):\n")
+    out.write("        return isinstance(other, " + name + ") and "
+              "self.__composite_values__() == other.__composite_values__()\n")
+
+    out.write("\n    def __ne__(self, other):\n")
+    out.write("        return not self.__eq__(other)\n\n")
+
+
 class MyClass:
     """Converts a class from a parsed UML file (XML) into a structure that can be used in various different ways"""
 
-    def __init__(self, elements = None):
+    def __init__(self, model, elements = None):
+        self.model = model
         self.attributes = []
         self.class_id = ""
         self.class_name = "MyClass"
@@ -310,26 +2194,53 @@ class MyClass:
         self.is_abstract = False
         self.general_class = None
         self.output = True
+        self.synthesized = False
+        self.fingerprint = None
+        self.indexes = []
+        self.relationships = []
+
+        # Unique ID of the table of a synthesized list type. Those are named after the type of their items, so
+        # the ID is that of the type, and a migration renames the table with the type, see MyTableChange.
+        self.list_id = None
+
+        # How the generalization of this class is mapped, see Model.resolve_inheritance(). mapped_class
+        # is the general class in joined, single and concrete table inheritance, root the top class of
+        # that hierarchy and mixin_class the abstract general class that is a mixin.
+        self.inheritance = 'fk'
+        self.in_cycle = False
+        self.mixin = False
+        self.mixin_class = None
+        self.mapped_class = None
+        self.root = self
+        self.polymorphic = False
+        self.single_table_columns = None
+
+        # The subclasses that share the table of this class in single table inheritance, when it is the top
+        # class, in the order of the classes
+        self.single_table_classes = []
+
+        # See Model.resolve_primary_keys()
+        self.primary_key = None
+
+        # Whether the attribute of this class is stored in the tables of the classes that use it, see
+        # Model.resolve_embedded()
+        self.embedded = False
 
         if elements:
             self._parse_class_objects(elements)
 
     def find_general_class(self, class_id):
         """Find the class object that has class_id as its unique ID"""
-        for class_ in my_classes:
-            if class_.class_id == class_id:
-                return class_
-
-        return None
+        return self.model.symbols.find_class(class_id)
 
     def resolve_type_ids(self):
         """Resolve the types for the general class of this class. ALso resolve the types for each attribute"""
         if self.general_class_id:
-            if self.general_class_id in class_ids:
-                self.general_class_name = class_ids[self.general_class_id]
+            if self.general_class_id in self.model.symbols.class_ids:
+                self.general_class_name = self.model.symbols.class_ids[self.general_class_id]
             else:
-                if self.general_class_id in type_ids:
-                    self.general_class_name = type_ids[self.general_class_id]
+                if self.general_class_id in self.model.symbols.type_ids:
+                    self.general_class_name = self.model.symbols.type_ids[self.general_class_id]
 
             self.general_class = self.find_general_class(self.general_class_id)
 
@@ -341,12 +2252,12 @@ class MyClass:
             attribute_.resolve_type_ids()
             self.general_class_name = attribute_.base_type_name + " # one attribute, no need for seperate type, just use base type of the attribute"
 
-    def __repr__(self):
-        """Output a string representation of the class. If the class is an abstract class
+    def render(self, out):
+        """Write the code for this class to out. If the class is an abstract class
         only output the attributes when called"""
 
         if not self.output :
-            return ""
+            return
 
         # if self.is_abstract:
         #     result = "\n    # Properties inherited from " + self.class_name + "\n"
@@ -359,38 +2270,324 @@ class MyClass:
         #     result += "    # End of properties inherited from " + self.class_name + "\n"
         #     return result.encode('ascii', 'ignore')
 
+        if self.embedded:
+            render_value_class(out, self.class_name, self.attributes, getattr(self, 'comment', None))
+            return
+
+        if self.inheritance != 'fk' or self.mixin_class is not None:
+            self.render_inheritance(out)
+            return
+
         # Not an abstract class, so output as a full class
-        result = "class "
-        result += self.class_name
+        out.write("class ")
+        out.write(self.class_name)
 
-        result += "(Base): # class definition\n"
+        out.write("(Base): # class definition\n")
 
-        result += "    __tablename__ = \'" + self.class_name.lower() + "\'\n\n"
-        result += "    id = Column(Integer, primary_key=True)\n"
+        out.write("    __tablename__ = \'" + self.class_name.lower() + "\'\n")
+        render_table_args(out, self.indexes)
+        out.write("\n")
+        self.key().render(out, self.table_name())
 
 
         # If this class has a general class, then add a foreign key to it
         if self.general_class:
             #result += repr(self.general_class)
-            result += "    " + self.general_class_name.lower() + "_id = "
-            result += "Column('" + self.general_class_name.lower() + "_id', "
-            result += "ForeignKey('" + self.general_class_name.lower() + ".id'), nullable = True)"
+            out.write("    " + self.general_class.class_name.lower() + "_id = ")
+            out.write("Column('" + self.general_class.class_name.lower() + "_id', ")
+            out.write("ForeignKey('" + self.general_class.table_name() + "." + self.general_class.key().column_name() +
+                      "'), index = True, nullable = True)")
 
         if len(self.attributes) > 0:
             for attribute_ in self.attributes:
-                result += repr(attribute_)
+                attribute_.render(out)
         # else:
         #     result += "\n        pass"
 
-        result += "\n"
+        for relationship_ in self.relationships:
+            relationship_.render(out)
+
+        out.write("\n")
+
+    def __repr__(self):
+        return render_to_string(self)
+
+    def render_inheritance(self, out):
+        """Write the code for this class when its generalization is mapped with SQLAlchemy's inheritance, or
+        it is a mixin"""
+        if self.mixin_class is not None:
+            bases = [self.mixin_class.class_name]
+        elif self.mapped_class is not None:
+            bases = [self.mapped_class.class_name]
+        else:
+            bases = ['Base']
+
+        if self.inheritance == 'concrete' and self.polymorphic and self.root is self:
+            # Loads the objects of all classes of the hierarchy from a union of their tables
+            bases.insert(0, 'ConcreteBase')
+
+        out.write("class " + self.class_name + "(" + ", ".join(bases) + "): # class definition\n")
+
+        attributes = self.attributes
+        relationships = self.relationships
+
+        if self.mixin:
+            out.write("    __abstract__ = True\n")
+        elif self.inheritance == 'single' and self.mapped_class is not None:
+            # No table of its own, the columns are added to the table of the top class
+            if self.indexes:
+                print("Not creating the indexes of %s, it has no table of its own" % (self.class_name))
+            self.render_mapper_args(out)
+        else:
+            out.write("    __tablename__ = \'" + self.table_name() + "\'\n")
+            render_table_args(out, self.indexes)
+            out.write("\n")
+
+            if self.inheritance == 'joined' and self.mapped_class is not None:
+                self.key().render_foreign_key(out, self.mapped_class.table_name())
+            else:
+                self.key().render(out, self.table_name())
+
+            if self.polymorphic and self.root is self and self.inheritance != 'concrete':
+                out.write("    discriminator = Column('discriminator', String(50), nullable = False)\n")
+
+            self.render_mapper_args(out)
+
+            if self.inheritance == 'concrete' and self.mapped_class is not None:
+                # The columns of the general classes, and of the mixins they use, are not inherited in
+                # concrete table inheritance, nor are their relationships. Those to one object are on the
+                # foreign key columns in the table of this class, collections refer to the tables of the
+                # general classes only.
+                inherited = []
+                inherited_relationships = []
+                general_class = self.mapped_class
+                while general_class is not None:
+                    inherited = general_class.attributes + inherited
+                    inherited_relationships = [relationship_.concrete_relationship(self.table_name())
+                                               for relationship_ in general_class.relationships
+                                               if relationship_.foreign_key is not None] + inherited_relationships
+                    general_class = general_class.mapped_class or general_class.mixin_class
+                attributes = inherited + attributes
+
+                names = set(relationship_.name for relationship_ in relationships)
+                relationships = [relationship_ for relationship_ in inherited_relationships
+                                 if relationship_.name not in names] + relationships
+            elif self.inheritance == 'abstract' and self.general_class and not self.mixin_class:
+                # Mapped with a foreign key like in fk mode
+                out.write("    " + self.general_class.class_name.lower() + "_id = ")
+                out.write("Column('" + self.general_class.class_name.lower() + "_id', ")
+                out.write("ForeignKey('" + self.general_class.table_name() + "." +
+                          self.general_class.key().column_name() + "'), index = True, nullable = True)")
+
+        for attribute_ in attributes:
+            attribute_.render(out)
+
+        for relationship_ in relationships:
+            relationship_.render(out)
+
+        out.write("\n")
+
+    def render_mapper_args(self, out):
+        """Write the __mapper_args__ of a class in a joined, single or concrete table hierarchy"""
+        if self.mapped_class is None and not self.polymorphic:
+            return
+
+        arguments = []
+        if self.root is self and self.inheritance != 'concrete':
+            arguments.append("'polymorphic_on': discriminator")
+        arguments.append("'polymorphic_identity': '" + self.class_name + "'")
+        if self.inheritance == 'joined' and self.mapped_class is not None:
+            # The table can have other foreign keys to the table of the general class
+            key = self.key().column_name()
+            arguments.append("'inherit_condition': " + key + " == " + self.mapped_class.class_name + "." + key)
+        if self.root is self and self.inheritance == 'joined':
+            # Load the columns of all subclasses in the same query, instead of one query per subclass
+            arguments.append("'with_polymorphic': '*'")
+        if self.inheritance == 'concrete':
+            arguments.append("'concrete': True")
+
+        out.write("    __mapper_args__ = {" + ", ".join(arguments) + "}\n")
+
+    def key(self):
+        """Return the primary key of the table of this class"""
+        return self.primary_key or self.model.primary_key
+
+    def ddl_table(self, dialect):
+        """Return the MyTable of this class, with the same columns as render() maps, or None when the
+        class has no table of its own"""
+        if not self.output or self.embedded or self.mixin:
+            return None
+        elif self.inheritance == 'single' and self.mapped_class is not None:
+            # Its columns are in the table of the top class
+            return None
+
+        table = MyTable(self.table_name(), self.list_id or self.output_key())
+        key = self.key()
+
+        if self.inheritance == 'joined' and self.mapped_class is not None:
+            table.columns.append(MyColumn(key.column_name(), key.ddl_type(dialect, reference=True), nullable=False,
+                                          primary_key=True,
+                                          references=(self.mapped_class.table_name(), key.column_name())))
+        else:
+            table.columns.extend(key.ddl_columns(self.table_name(), dialect))
+            table.sequence = key.ddl_sequence(self.table_name(), dialect)
+
+        if self.polymorphic and self.root is self and self.inheritance != 'concrete':
+            table.columns.append(MyColumn("discriminator", "VARCHAR(50)", nullable=False))
+
+        # A foreign key to the general class, as in fk mode
+        if self.general_class and (self.inheritance == 'fk' or
+                                   (self.inheritance == 'abstract' and not self.mixin_class)):
+            general_key = self.general_class.key()
+            table.columns.append(MyColumn(self.general_class.class_name.lower() + "_id",
+                                          general_key.ddl_type(dialect, reference=True),
+                                          references=(self.general_class.table_name(), general_key.column_name()),
+                                          index=True, id_="generalization"))
+
+        # An attribute with the name of an inherited one replaces it, as in the class
+        columns = OrderedDict()
+        for attribute_ in self.table_attributes():
+            for column in attribute_.ddl_columns(dialect):
+                columns.pop(column.name, None)
+                columns[column.name] = column
+        table.columns.extend(columns.values())
+
+        table.add_indexes(self.indexes)
+
+        return table
+
+    def table_attributes(self):
+        """Return the attributes with columns in the table of this class, which has the columns of its
+        mixins, in concrete table inheritance those of its general classes, and in single table inheritance
+        those of the classes sharing its table"""
+        attributes = list(self.attributes)
+        general_class = self.mapped_class if self.inheritance == 'concrete' else None
+        general_class = general_class or self.mixin_class
+        while general_class is not None:
+            attributes = general_class.attributes + attributes
+            if self.inheritance == 'concrete':
+                general_class = general_class.mapped_class or general_class.mixin_class
+            else:
+                general_class = general_class.mixin_class
+
+        for class_ in self.single_table_classes:
+            attributes.extend(class_.attributes)
+
+        return attributes
+
+    def render_core(self, out):
+        """Write the Table of this class for the core backend, with the same columns as the table of the
+        class render() writes. Classes without a table of their own have none."""
+        if not self.output or self.embedded or self.mixin:
+            return
+        elif self.inheritance == 'single' and self.mapped_class is not None:
+            # Its columns are in the table of the top class
+            return
+
+        table_name = self.table_name()
+        out.write(core_table_variable(table_name) + " = Table('" + table_name + "', metadata,\n")
+
+        if self.inheritance == 'joined' and self.mapped_class is not None:
+            self.key().render_foreign_key(out, self.mapped_class.table_name(), core=True)
+        else:
+            self.key().render(out, table_name, core=True)
+
+        if self.polymorphic and self.root is self and self.inheritance != 'concrete':
+            out.write("    Column('discriminator', String(50), nullable = False),\n")
+
+        # A foreign key to the general class, as in fk mode
+        if self.general_class and (self.inheritance == 'fk' or
+                                   (self.inheritance == 'abstract' and not self.mixin_class)):
+            out.write("    Column('" + self.general_class.class_name.lower() + "_id', ")
+            out.write("ForeignKey('" + self.general_class.table_name() + "." +
+                      self.general_class.key().column_name() + "'), index = True, nullable = True),\n")
+
+        # An attribute with the name of an inherited one replaces it, as in the class
+        attributes = OrderedDict()
+        for attribute_ in self.table_attributes():
+            names = tuple(attribute_.column_names())
+            attributes.pop(names, None)
+            if names:
+                attributes[names] = attribute_
+
+        for attribute_ in attributes.values():
+            attribute_.render_core(out)
+
+        render_core_indexes(out, self.indexes)
+        out.write(")\n\n")
 
-        return result.encode('ascii', 'ignore')
+    def table_name(self):
+        """Name of the table the objects of this class are stored in"""
+        if self.inheritance == 'single' and self.mapped_class is not None:
+            return self.root.table_name()
+
+        return self.class_name.lower()
+
+    def inheritance_state(self):
+        return [self.inheritance, self.mixin, self.polymorphic, self.root.class_id,
+                self.mapped_class.class_id if self.mapped_class else None,
+                [attribute_.column_prefix for attribute_ in self.attributes]]
 
     def set_name(self, name):
         """Set the name of this class.
         """
         self.class_name = name
 
+    def output_key(self):
+        """Key of the generated code for this class, that stays the same from one run to the next"""
+        if self.synthesized:
+            # The unique IDs of synthesized classes depend on the order they were created in
+            return "synthesized:" + self.class_name
+
+        return self.class_id
+
+    def compute_fingerprint(self):
+        """Fingerprint of everything this class was parsed from. Synthesized classes only have names."""
+        if self.synthesized:
+            return fingerprint([self.class_name, [[attribute_.name, attribute_.type_name]
+                                                  for attribute_ in self.attributes]])
+
+        return fingerprint([self.class_id, self.class_name, self.is_abstract, self.general_class_id,
+                            getattr(self, 'comment', None),
+                            [attribute_.fingerprint_state() for attribute_ in self.attributes],
+                            self.model.find_stereotypes(self.class_id),
+                            [association.fingerprint_state()
+                             for association in self.model.find_associations(self.class_id)]])
+
+    def dependencies(self):
+        """Unique IDs of the classes and types the generated code of this class depends on"""
+        dependencies = [attribute_.dependency() for attribute_ in self.attributes]
+        dependencies.extend(relationship_.target_id for relationship_ in self.relationships)
+
+        if self.general_class_id:
+            dependencies.append(self.general_class_id)
+
+        return dependencies
+
+    def output_names(self):
+        """Names the generated code for this class defines"""
+        return [self.class_name] if self.output else []
+
+    def definition_dependencies(self):
+        """Classes and types whose names the generated code of this class uses: its mapped general class or
+        mixin, and the enumerations and embedded types of its attributes and of the attributes it inherits"""
+        dependencies = []
+
+        class_ = self
+        while class_ is not None:
+            general_class = class_.mapped_class or class_.mixin_class
+            if general_class is not None:
+                dependencies.append(general_class)
+
+            for attribute_ in class_.attributes:
+                dependency = attribute_.definition_dependency()
+                if dependency is not None:
+                    dependencies.append(dependency)
+
+            class_ = general_class
+
+        return dependencies
+
 
     def _parse_class_objects(self, my_class_):
         # print(json.dumps(my_class_, indent=4))
@@ -410,11 +2607,10 @@ class MyClass:
         if 'ownedAttribute' in my_class_:
             self.attributes = self._parse_attributes(my_class_['ownedAttribute'])
 
-        # Add our name to the main dictionary of class ids
-        class_ids[self.class_id] = self.class_name
+        # Add ourselves to the symbol table
+        self.model.symbols.add_class(self)
 
-    @staticmethod
-    def _parse_attributes(attributes):
+    def _parse_attributes(self, attributes):
         attribute_name = ""
         attribute_id = ""
         # attribute_type_id = ""
@@ -439,7 +2635,7 @@ class MyClass:
                 if attribute_ == '@type':
                     # Trusting the once we reach @type, name and attribute ID have been seen
                     attribute_type = attributes[attribute_]
-                    new_attribute = MyAttribute()
+                    new_attribute = MyAttribute(self.model)
                     new_attribute.set_name(attribute_name)
                     new_attribute.set_id(attribute_id)
                     new_attribute.set_type_id(attribute_type)
@@ -450,17 +2646,17 @@ class MyClass:
 
                 if '@xmi:type' in attributes[attribute_]:
                     if '@value' in attributes[attribute_]:
-                        my_constraint = MyConstraint(attribute_, attributes[attribute_]['@xmi:type'],
+                        my_constraint = MyConstraint(self.model, attribute_, attributes[attribute_]['@xmi:type'],
                                                      attributes[attribute_]['@value'])
                     else:
-                        my_constraint = MyConstraint(attribute_, attributes[attribute_]['@xmi:type'])
+                        my_constraint = MyConstraint(self.model, attribute_, attributes[attribute_]['@xmi:type'])
                     new_attribute.add_constraint(my_constraint)
                 else:
                     pass
             else:
                 # The current attribute contains all the information about an attribute
                 if attribute_['@xmi:type'] == 'uml:Property':
-                    new_attribute = MyAttribute()
+                    new_attribute = MyAttribute(self.model)
 
                     new_attribute.set_name(attribute_['@name'])
                     new_attribute.set_id(attribute_['@xmi:id'])
@@ -483,12 +2679,9 @@ class MyClass:
                                 constraint_contents = attribute_[parameter]
                                 constraint_type = constraint_contents['@xmi:type']
 
-                                if '@value' in constraint_contents:
-                                    my_constraint = MyConstraint(parameter,
-                                                                 constraint_type,
-                                                                 constraint_contents['@value'])
-                                else:
-                                    my_constraint = MyConstraint(parameter, constraint_type)
+                                my_constraint = MyConstraint(self.model, parameter, constraint_type,
+                                                             constraint_contents.get('@value'),
+                                                             constraint_contents.get('@instance'))
 
                                 new_attribute.add_constraint(my_constraint)
 
@@ -507,581 +2700,2691 @@ class MyClass:
 
     def _create_list_item_type(self, list_type_name, list_type_id, list_item_type_name):
         print("Creating items list for list type %s with id %s and for item type %s" % (list_type_name, list_type_id, list_item_type_name))
-        global last_added_list_type_id
-        last_added_list_type_id += 1
+        list_items_type_id = self.model.next_list_type_id()
 
         new_list_items_name = list_type_name + "Items"
         print("New items list name = %s" % (new_list_items_name))
 
         # Create a list_item_class
-        list_class = MyClass()
+        list_class = MyClass(self.model)
+        list_class.synthesized = True
         list_class.set_name(new_list_items_name)
-        list_class.class_id = str(last_added_list_type_id)
+        list_class.class_id = str(list_items_type_id)
 
         # The unique id for this list_items_type will be created automatically,
         # but two other items need to be added per row:
         # unique_id for the list_type and a unique_id towards an instance of the list_item_type
 
-        # Find the ID for the item type
-        list_item_type_id = find_id_for_type_name(list_item_type_name)
+        # Find the ID for the item type. Items of a basic type the model has no data type for are found by
+        # their column type instead.
+        list_item_type_id = self.model.find_id_for_type_name(list_item_type_name)
+        list_item_column_type = self.model.find_column_type(list_item_type_name)
+        if list_item_type_id or list_item_column_type:
+            list_class.list_id = "list items:" + (list_item_type_id or list_item_type_name)
 
         attributes = []
 
         # Create an attribute for both
         if list_type_id:
             print("Creating list type attribute %s for type %s (%s)" % (list_type_name.lower(), list_type_name, list_type_id))
-            new_attribute = MyAttribute()
+            new_attribute = MyAttribute(self.model)
             new_attribute.set_name(list_type_name.lower())
             new_attribute.set_type_id(list_type_id)
+            if list_class.list_id:
+                new_attribute.set_id(list_class.list_id + ":list")
 
             attributes.append(new_attribute)
 
-        if list_item_type_id:
+        if list_item_type_id or list_item_column_type:
             print("Creating list item type attribute %s for type %s (%s)" % (list_item_type_name.lower(), list_item_type_name, list_item_type_id))
-            new_attribute = MyAttribute()
+            new_attribute = MyAttribute(self.model)
             new_attribute.set_name(list_item_type_name.lower())
             new_attribute.set_type_id(list_item_type_id)
+            new_attribute.set_type_name(list_item_type_name)
+            new_attribute.set_id(list_class.list_id + ":item")
 
             attributes.append(new_attribute)
 
         list_class.attributes = attributes
 
         # Add the class to the list
-        class_ids[list_class.class_id] = new_list_items_name
-        my_classes.append(list_class)
+        self.model.add_class(list_class)
 
     def _create_new_list(self, list_item_type_name, list_type_name):
         """Create a new list type, create a list_item type linking a list identifier to a list item type. The list_item type contains a unique id and the id of the list content type"""
-        global last_added_list_type_id
-        last_added_list_type_id += 1
-        new_list_id = last_added_list_type_id
+        new_list_id = self.model.next_list_type_id()
 
         new_list_name = "ListOf" + list_type_name + "s"
 
-        # First create the list itself
-        # Create a Class representing the new list type with the newly increased id
-        # print "Creating new class %s at id %d" % (new_list_name, last_added_list_type_id)
-        list_class = MyClass()
-        list_class.set_name(new_list_name)
-        list_class.class_id = str(new_list_id)
+        # First create the list itself
+        # Create a Class representing the new list type with the newly increased id
+        # print "Creating new class %s at id %d" % (new_list_name, new_list_id)
+        list_class = MyClass(self.model)
+        list_class.synthesized = True
+        list_class.set_name(new_list_name)
+        list_class.class_id = str(new_list_id)
+
+        attributes = []
+        new_attribute = MyAttribute(self.model)
+
+        # Add a name attribute of the String type
+        new_attribute.set_name(new_list_name.lower() + "_name")
+        # new_attribute.set_id(old_attribute_id)
+        list_item_type_id = self.model.find_id_for_type_name(list_item_type_name)
+        if list_item_type_id:
+            list_class.list_id = "list:" + list_item_type_id
+            new_attribute.set_id(list_class.list_id + ":name")
+        # Find the type_id for "String", or its column type when the model has no String data type
+        string_type_id = self.model.find_id_for_type_name('String')
+        if string_type_id or self.model.find_column_type('String'):
+            new_attribute.set_type_id(string_type_id)
+            new_attribute.set_type_name('String')
+            attributes.append(new_attribute)
+            list_class.attributes = attributes
+            # Save the new class
+            self.model.add_class(list_class)
+
+            # Create the list item class
+            self._create_list_item_type(new_list_name, str(new_list_id), list_item_type_name)
+
+            return self.model.last_added_list_type_id
+        else:
+            print("Can't find type ID for STRING, this shouldn't happen")
+
+        return None
+
+    def resolve_many_constraints(self):
+        print("Resolving many constraints on type %s" % (self.class_name))
+        for attribute_ in self.attributes:
+            if attribute_.has_many_constraint() :
+                print "%s has an attribute with a many constraint at %s : %s" % (self.class_name, attribute_.name, attribute_.type_name)
+
+                if attribute_.is_column() and self.model.array_type():
+                    # The database can store all values in one column
+                    attribute_.array_type = self.model.array_type()
+                    continue
+
+                if self.model.options.collections == 'association':
+                    create_association_table(self.model, self, attribute_)
+                    continue
+
+                # So this is a list type
+                # First create a list type name by adding List to the end of the attribute type name
+                new_list_name = "ListOf" + attribute_.type_name + "s"
+
+                # And check whether it already exists, if so point the attribute type to the list instead of list item type
+                list_type_id = self.model.find_id_for_type_name(new_list_name)
+
+                old_attribute_type_id = attribute_.type_id
+                old_attribute_type_name = attribute_.type_name
+                if list_type_id:
+                    print "Rewriting existing base type information to new list type %s (id=%s)" % (new_list_name, list_type_id)
+                    attribute_.set_type_id(list_type_id)
+                    attribute_.set_type_name(new_list_name)
+                else:
+                    print("Creating new list type %s" % (new_list_name))
+
+                    list_type_id = self._create_new_list(old_attribute_type_name, attribute_.type_name)
+
+                    if list_type_id:
+                        print("Saving newly created list type %s (%d) as %s instead of type %s (%s)" % (new_list_name, list_type_id, attribute_.name, old_attribute_type_name, old_attribute_type_id))
+                        attribute_.set_type_id(list_type_id)
+                        attribute_.set_type_name(new_list_name)
+
+                    else :
+                        print "Can't create a new list type? This should NEVER happen!"
+
+
+def parse_class_object(model, element):
+    model.elements += 1
+    model.add_class(MyClass(model, element))
+
+
+def parse_class_objects(model, elements):
+    for element_ in elements:
+        parse_class_object(model, element_)
+
+
+class MyEnumerationType:
+    def __init__(self, model, enum_type=None):
+        self.model = model
+        self.type_id = None
+        self.name = None
+        self.comment = None
+        # Comments of the literals by name, in the order of the UML file. The order is the code of a
+        # literal in the int and lookup strategies.
+        self.literals = OrderedDict()
+        # Names of the literals by unique ID, for default values that refer to a literal
+        self.literal_ids = dict()
+        self.fingerprint = None
+
+        if enum_type:
+            self._parse_enumeration(enum_type)
+
+    def set_name(self, name):
+        self.name = convert_camel_case(name)
+
+    def add_literal(self, literal_name, comment=None, literal_id=None):
+        self.literals[literal_name] = comment
+        if literal_id:
+            self.literal_ids[literal_id] = literal_name
+
+    def output_key(self):
+        return self.type_id
+
+    def compute_fingerprint(self):
+        return fingerprint([self.type_id, self.name, self.comment, list(self.literals.items()),
+                            sorted(self.literal_ids.items())])
+
+    def dependencies(self):
+        return []
+
+    def output_names(self):
+        if self.strategy() == 'lookup':
+            return [self.name, self.lookup_class_name()]
+
+        return [self.name]
+
+    def definition_dependencies(self):
+        return []
+
+    def _parse_enumeration(self, enum_type):
+        self.type_id = enum_type['@xmi:id']
+        self.set_name(enum_type['@name'])
+        self.model.symbols.add_type(self)
+
+        if 'ownedComment' in enum_type:
+            self.comment = enum_type['ownedComment']['body']
+
+        if 'ownedLiteral' in enum_type:
+            for literal in enum_type['ownedLiteral']:
+                comment = None
+                if isinstance(literal, basestring):
+                    my_literal = enum_type['ownedLiteral']
+                    literal_name = my_literal['@name']
+                    literal_id = my_literal.get('@xmi:id')
+                    if 'ownedComment' in my_literal:
+                        comment = my_literal['ownedComment']['body']
+                else:
+                    literal_name = literal['@name']
+                    literal_id = literal.get('@xmi:id')
+                    if 'ownedComment' in literal:
+                        comment = literal['ownedComment']['body']
+
+                self.add_literal(literal_name, comment, literal_id)
+
+    def strategy(self):
+        return self.model.options.enums
+
+    def lookup_class_name(self):
+        return "".join(part.capitalize() for part in self.name.split("_")) + "Lookup"
+
+    def literal_code(self, literal):
+        """Return the code a literal is stored as in the int and lookup strategies, counting from 1"""
+        return list(self.literals).index(literal) + 1
+
+    def column_type(self):
+        """SQLAlchemy type, and foreign key, of the columns for attributes of this enumeration"""
+        if self.strategy() == 'native' or (self.strategy() == 'tuple' and self.model.options.dialect == 'postgresql'):
+            # PostgreSQL creates a named type for every Enum column
+            return "Enum(*" + self.name + ", name = '" + self.name + "', native_enum = True)"
+        elif self.strategy() == 'int':
+            return "SmallInteger"
+        elif self.strategy() == 'lookup':
+            return "SmallInteger, ForeignKey('" + self.name + ".id')"
+
+        return "Enum(*" + self.name + ")"
+
+    def render_check(self, out, column_name):
+        """Write the CheckConstraint argument of a column holding a code of this enumeration"""
+        if self.strategy() == 'int' and self.literals:
+            out.write(", CheckConstraint(\"" + column_name + " BETWEEN 1 AND " + str(len(self.literals)) + "\")")
+
+    def decorate_literal(self, literal, server=False):
+        """Return the Python expression for the default value literal of a column of this enumeration,
+        or with server the server_default expression. None when there is no such literal"""
+        if self.strategy() in ('int', 'lookup'):
+            if literal not in self.literals:
+                print("Default value %s is not a literal of %s, ignoring it" % (literal, self.name))
+                return None
+
+            if server:
+                return "text('" + str(self.literal_code(literal)) + "')"
+
+            return self.name + "['" + literal + "'].value"
+
+        return "'" + literal + "'"
+
+    def ddl_type(self, dialect):
+        """SQL type of the columns for attributes of this enumeration"""
+        if self.strategy() in ('int', 'lookup'):
+            return "SMALLINT"
+        elif dialect == 'postgresql':
+            return quote_name(self.name, dialect)
+        elif dialect == 'mysql':
+            return "ENUM(" + ", ".join(sql_string(literal) for literal in self.literals) + ")"
+
+        return "VARCHAR(" + str(max([len(literal) for literal in self.literals] + [1])) + ")"
+
+    def ddl_check(self, column_name):
+        if self.strategy() == 'int' and self.literals:
+            return column_name + " BETWEEN 1 AND " + str(len(self.literals))
+
+        return None
+
+    def ddl_literal(self, literal):
+        """Return the SQL literal of a literal of this enumeration, None when there is no such literal"""
+        if self.strategy() in ('int', 'lookup'):
+            if literal not in self.literals:
+                print("Default value %s is not a literal of %s, ignoring it" % (literal, self.name))
+                return None
+
+            return str(self.literal_code(literal))
+
+        return sql_string(literal)
+
+    def ddl_create_type(self, dialect):
+        """SQL that creates the enumeration type on PostgreSQL, None when it isn't a type"""
+        if dialect != 'postgresql' or self.strategy() in ('int', 'lookup'):
+            return None
+
+        return ("CREATE TYPE " + quote_name(self.name, dialect) + " AS ENUM (" +
+                ", ".join(sql_string(literal) for literal in self.literals) + ");\n")
+
+    def ddl_table(self, dialect):
+        """Return the MyTable of the lookup table, filled with the labels, None for the other strategies"""
+        if self.strategy() != 'lookup':
+            return None
+
+        label_length = max([len(literal) for literal in self.literals] + [1])
+
+        table = MyTable(self.name, self.output_key())
+        table.columns.append(MyColumn("id", "SMALLINT", nullable=False, primary_key=True))
+        table.columns.append(MyColumn("label", "VARCHAR(" + str(label_length) + ")", nullable=False, unique=True))
+        table.rows = [(str(self.literal_code(literal)), sql_string(literal)) for literal in self.literals]
+
+        return table
+
+    def resolve_type_ids(self):
+        # No need to resolve unique IDs within an ENUM. They don't have attributes that point to other types
+        pass
+
+    def resolve_many_constraints(self):
+        # No need for this for enumerations
+        pass
+
+    def render(self, out, core=False):
+        """Write the literals of this enumeration to out, and its lookup table as a class, or with core as a
+        Table of the core backend"""
+        out.write("# " + self.name + "\n")
+
+        if self.comment:
+            out.write(comment_wrapper.fill(self.comment))
+
+        out.write("# \n")
+
+        for literal in self.literals:
+            if self.literals[literal]:
+                out.write("#    " + literal + " - " + self.literals[literal] + "\n")
+            else:
+                out.write("#    " + literal + "\n")
+
+        if self.strategy() in ('int', 'lookup'):
+            self.render_int_enum(out, core)
+            return
+
+        out.write(self.name + " = (")
+
+        first = True
+        for literal in self.literals:
+            if first:
+                out.write("\"" + literal + "\"")
+                first = False
+            else:
+                out.write(", \"" + literal + "\"")
+
+        out.write(")\n")
+
+    def render_int_enum(self, out, core=False):
+        """Write the IntEnum with the codes of the literals and, for the lookup strategy, the lookup table.
+        The IntEnum is the cache of the lookup table: codes are known without querying it."""
+        out.write(self.name + " = enum.IntEnum('" + self.name + "', [")
+        out.write(", ".join("(\"" + literal + "\", " + str(self.literal_code(literal)) + ")"
+                            for literal in self.literals))
+        out.write("])\n")
+
+        if self.strategy() != 'lookup':
+            return
+
+        label_length = max([len(literal) for literal in self.literals] + [1])
+
+        if core:
+            table = core_table_variable(self.name)
+            out.write("\n" + table + " = Table('" + self.name + "', metadata,\n")
+            out.write("    Column('id', SmallInteger, primary_key=True, autoincrement=False),\n")
+            out.write("    Column('label', String(" + str(label_length) + "), nullable = False, unique = True),\n")
+            out.write(")\n\n")
+        else:
+            class_name = self.lookup_class_name()
+            table = class_name + ".__table__"
+            out.write("\n\nclass " + class_name + "(Base): # enumeration lookup table\n")
+            out.write("    __tablename__ = '" + self.name + "'\n\n")
+            out.write("    id = Column(SmallInteger, primary_key=True, autoincrement=False)\n")
+            out.write("    label = Column(String(" + str(label_length) + "), nullable = False, unique = True)\n\n")
+
+        out.write("# Fill the lookup table when it is created\n")
+        out.write("event.listen(" + table + ", 'after_create', lambda table, connection, **kw: "
+                  "connection.execute(\n")
+        out.write("    table.insert(), [{'id': literal.value, 'label': literal.name} for literal in " + self.name +
+                  "]))\n")
+
+    def __repr__(self):
+        return render_to_string(self)
+
+
+def parse_type_enumeration(model, type_enum):
+    model.add_type(MyEnumerationType(model, type_enum))
+
+
+class MyDataType:
+    def __init__(self, model, data_type=None):
+        self.model = model
+        self.output = True
+        self.name = None
+        self.type_id = None
+        self.comment = None
+        self.attributes = []
+        self.fingerprint = None
+        self.indexes = []
+
+        # For data types that are an alias of a column type
+        self.column_type = None
+
+        # See Model.resolve_primary_keys()
+        self.primary_key = None
+
+        # Whether the attributes of this data type are stored in the tables of the classes that use it, see
+        # Model.resolve_embedded()
+        self.embedded = False
+
+        if data_type:
+            self._parse_data_type(data_type)
+
+    def _parse_data_type(self, data_type):
+        self.set_name(data_type['@name'])
+        self.type_id = data_type['@xmi:id']
+        self.model.symbols.add_type(self)
+
+        if 'ownedComment' in data_type:
+            self.comment = data_type['ownedComment']['body']
+
+        self._parse_attributes(data_type)
+
+        print("Created datatype %s" % (self.name))
+
+    def resolve_type_ids(self):
+        for attribute_ in self.attributes:
+            attribute_.resolve_type_ids()
+
+    def output_key(self):
+        return self.type_id
+
+    def compute_fingerprint(self):
+        return fingerprint([self.type_id, self.name, self.output,
+                            self.column_type.fingerprint_state() if self.column_type else None, self.comment,
+                            [attribute_.fingerprint_state() for attribute_ in self.attributes]])
+
+    def dependencies(self):
+        return [attribute_.dependency() for attribute_ in self.attributes]
+
+    def output_names(self):
+        return [self.name] if self.output else []
+
+    def definition_dependencies(self):
+        return [dependency for dependency in [attribute_.definition_dependency() for attribute_ in self.attributes]
+                if dependency is not None]
+
+    def table_name(self):
+        return self.name.lower()
+
+    def key(self):
+        """Return the primary key of the table of this data type"""
+        return self.primary_key or self.model.primary_key
+
+    def ddl_table(self, dialect):
+        """Return the MyTable of this data type, None when it has no table"""
+        if not self.output or self.embedded:
+            return None
+
+        table = MyTable(self.table_name(), self.output_key())
+        table.columns.extend(self.key().ddl_columns(self.table_name(), dialect))
+        table.sequence = self.key().ddl_sequence(self.table_name(), dialect)
+
+        for attribute_ in self.attributes:
+            table.columns.extend(attribute_.ddl_columns(dialect))
+
+        table.add_indexes(self.indexes)
+
+        return table
+
+    def render_core(self, out):
+        """Write the Table of this data type for the core backend, nothing when it has no table"""
+        if not self.output or self.embedded:
+            return
+
+        table_name = self.table_name()
+        out.write(core_table_variable(table_name) + " = Table('" + table_name + "', metadata,\n")
+        self.key().render(out, table_name, core=True)
+
+        for attribute_ in self.attributes:
+            attribute_.render_core(out)
+
+        render_core_indexes(out, self.indexes)
+        out.write(")\n\n")
+
+    def set_name(self, name):
+        """Set the name of this class. Some classes are really just aliases of base types, as found in the
+        type mapping, including the SQLAlchemy types themselves. Those keep their column type with its length
+        and constraints, and their output is set to False so they are not printed when repr is called. They
+        keep their own name too: under the name of the SQLAlchemy type, the first alias would be found for
+        every attribute of that type, with its length and constraints.
+        """
+        column_type = self.model.find_column_type(name)
+
+        if column_type is not None:
+            self.column_type = column_type
+            self.output = False
+
+        self.name = name
+
+
+    def parse_attribute(self, attribute_):
+        new_attribute = MyAttribute(self.model)
+
+        new_attribute.set_name(attribute_['@name'])
+        new_attribute.set_id(attribute_['@xmi:id'])
+        if '@type' in attribute_:
+            new_attribute.set_type_id(attribute_['@type'])
+
+        for parameter in attribute_:
+            if not parameter.startswith('@'):
+                if parameter == 'ownedComment':
+                    new_attribute.set_comment(attribute_['ownedComment']['body'])
+                elif parameter == 'type':
+                    parameter_type = attribute_['type']
+
+                    if 'PrimitiveType' in parameter_type['@xmi:type']:
+                        primitive_type_url = parameter_type['@href']
+                        url_parts = urlparse(primitive_type_url)
+                        new_attribute.set_type_name(url_parts.fragment)
+
+                else:
+                    constraint_contents = attribute_[parameter]
+                    constraint_type = constraint_contents['@xmi:type']
+
+                    my_constraint = MyConstraint(self.model, parameter, constraint_type,
+                                                 constraint_contents.get('@value'),
+                                                 constraint_contents.get('@instance'))
+
+                    new_attribute.add_constraint(my_constraint)
+
+        self.attributes.append(new_attribute)
+
+    def _parse_attributes(self, attributes):
+        for attribute_, attribute_items in attributes.iteritems():
+            if isinstance(attributes[attribute_], basestring):
+                # The strings found here are those we've used before
+                pass
+            else:
+                # Only interested in ownedAttribute attributes
+                if attribute_ == 'ownedAttribute':
+                    if isinstance(attribute_items, dict):
+                        self.parse_attribute(attribute_items)
+                    else:
+                        for attribute_item in attribute_items:
+                            self.parse_attribute(attribute_item)
+
+    def render(self, out):
+        """Write the code for this data type to out"""
+
+        # Don't output anything when output is set to false
+        if not self.output:
+            return
+
+        if self.embedded:
+            render_value_class(out, self.name, self.attributes, self.comment)
+            return
+
+        out.write("class ")
+        # if self.general_class_id:
+        #     if self.general_class_name:
+        #         result += self.class_name + " (" + self.general_class_name + ")"
+        #     else:
+        #         result += self.class_name + " (" + self.general_class_id + ")"
+        # else:
+        out.write(self.name)
+
+        out.write("(Base): # datatype definition\n")
+
+        out.write("    __tablename__ = \'" + self.name.lower() + "\'\n")
+        render_table_args(out, self.indexes)
+        out.write("\n")
+
+        self.key().render(out, self.name.lower(), newline=False)
+
+        # if self.is_abstract:
+        #     result += "  # Abstract"
+
+        # result += " " + self.class_id
+
+        # The key column is enough for a class body, data types without attributes don't need a pass
+        out.write("\n")
+        for attribute_ in self.attributes:
+            attribute_.render(out)
+            out.write("\n")
+
+    def __repr__(self):
+        return render_to_string(self)
+
+    def _create_list_item_type(self, list_type_name, list_type_id, list_item_type_name):
+        print("Creating items list for list type %s with id %s and for item type %s" % (list_type_name, list_type_id, list_item_type_name))
+        list_items_type_id = self.model.next_list_type_id()
+
+        new_list_items_name = list_type_name + "Items"
+        print("New items list name = %s" % (new_list_items_name))
+
+        # Create a list_item_class
+        list_class = MyClass(self.model)
+        list_class.synthesized = True
+        list_class.set_name(new_list_items_name)
+        list_class.class_id = str(list_items_type_id)
+
+        # The unique id for this list_items_type will be created automatically,
+        # but two other items need to be added per row:
+        # unique_id for the list_type and a unique_id towards an instance of the list_item_type
+
+        # Find the ID for the item type. Items of a basic type the model has no data type for are found by
+        # their column type instead.
+        list_item_type_id = self.model.find_id_for_type_name(list_item_type_name)
+        list_item_column_type = self.model.find_column_type(list_item_type_name)
+        if list_item_type_id or list_item_column_type:
+            list_class.list_id = "list items:" + (list_item_type_id or list_item_type_name)
+
+        attributes = []
+
+        # Create an attribute for both
+        if list_type_id:
+            print("Creating list type attribute %s for type %s (%s)" % (list_type_name.lower(), list_type_name, list_type_id))
+            new_attribute = MyAttribute(self.model)
+            new_attribute.set_name(list_type_name.lower())
+            new_attribute.set_type_id(list_type_id)
+            if list_class.list_id:
+                new_attribute.set_id(list_class.list_id + ":list")
+
+            attributes.append(new_attribute)
+
+        if list_item_type_id or list_item_column_type:
+            print("Creating list item type attribute %s for type %s (%s)" % (list_item_type_name.lower(), list_item_type_name, list_item_type_id))
+            new_attribute = MyAttribute(self.model)
+            new_attribute.set_name(list_item_type_name.lower())
+            new_attribute.set_type_id(list_item_type_id)
+            new_attribute.set_type_name(list_item_type_name)
+            new_attribute.set_id(list_class.list_id + ":item")
+
+            attributes.append(new_attribute)
+
+        list_class.attributes = attributes
+
+        # Add the class to the list
+        self.model.add_class(list_class)
+
+    def _create_new_list(self, list_item_type_name, list_type_name):
+        """Create a new list type, create a list_item type linking a list identifier to a list item type. The list_item type contains a unique id and the id of the list content type"""
+        new_list_id = self.model.next_list_type_id()
+
+        new_list_name = "ListOf" + list_type_name + "s"
+
+        # First create the list itself
+        # Create a Class representing the new list type with the newly increased id
+        # print "Creating new class %s at id %d" % (new_list_name, new_list_id)
+        list_class = MyClass(self.model)
+        list_class.synthesized = True
+        list_class.set_name(new_list_name)
+        list_class.class_id = str(new_list_id)
+
+        attributes = []
+        new_attribute = MyAttribute(self.model)
+
+        # Add a name attribute of the String type
+        new_attribute.set_name(new_list_name.lower() + "_name")
+        # new_attribute.set_id(old_attribute_id)
+        list_item_type_id = self.model.find_id_for_type_name(list_item_type_name)
+        if list_item_type_id:
+            list_class.list_id = "list:" + list_item_type_id
+            new_attribute.set_id(list_class.list_id + ":name")
+        # Find the type_id for "String", or its column type when the model has no String data type
+        string_type_id = self.model.find_id_for_type_name('String')
+        if string_type_id or self.model.find_column_type('String'):
+            new_attribute.set_type_id(string_type_id)
+            new_attribute.set_type_name('String')
+            attributes.append(new_attribute)
+            list_class.attributes = attributes
+            # Save the new class
+            self.model.add_class(list_class)
+
+            # Create the list item class
+            self._create_list_item_type(new_list_name, str(new_list_id), list_item_type_name)
+
+            return self.model.last_added_list_type_id
+        else:
+            print("Can't find type ID for STRING, this shouldn't happen")
+
+        return None
+
+    def resolve_many_constraints(self):
+        print("Resolving many constraints on type %s" % (self.name))
+        for attribute_ in self.attributes:
+            if attribute_.has_many_constraint() :
+                print "%s has an attribute with a many constraint at %s : %s" % (self.name, attribute_.name, attribute_.type_name)
+
+                if attribute_.is_column() and self.model.array_type():
+                    # The database can store all values in one column
+                    attribute_.array_type = self.model.array_type()
+                    continue
+
+                if self.model.options.collections == 'association':
+                    create_association_table(self.model, self, attribute_)
+                    continue
+
+                # So this is a list type
+                # First create a list type name by adding List to the end of the attribute type name
+                new_list_name = "ListOf" + attribute_.type_name + "s"
+
+                # And check whether it already exists, if so point the attribute type to the list instead of list item type
+                list_type_id = self.model.find_id_for_type_name(new_list_name)
+
+                old_attribute_type_id = attribute_.type_id
+                old_attribute_type_name = attribute_.type_name
+                if list_type_id:
+                    print "Rewriting existing base type information to new list type %s (id=%s)" % (new_list_name, list_type_id)
+                    attribute_.set_type_id(list_type_id)
+                    attribute_.set_type_name(new_list_name)
+                else:
+                    print("Creating new list type %s" % (new_list_name))
+
+                    list_type_id = self._create_new_list(old_attribute_type_name, attribute_.type_name)
+
+                    if list_type_id:
+                        print("Saving newly created list type %s (%d) as %s instead of type %s (%s)" % (new_list_name, list_type_id, attribute_.name, old_attribute_type_name, old_attribute_type_id))
+                        attribute_.set_type_id(list_type_id)
+                        attribute_.set_type_name(new_list_name)
+
+                    else :
+                        print "Can't create a new list type? This should NEVER happen!"
+
+
+
+
+def parse_type_data(model, data_type):
+    model.add_type(MyDataType(model, data_type))
+
+
+def parse_type_definition(model, element):
+    """Parse a single element from the TypeDefinitions package. Returns False if the element
+    is of an unknown type"""
+    model.elements += 1
+
+    if element['@xmi:type'] == 'uml:Enumeration':
+        parse_type_enumeration(model, element)
+        success = True
+    elif element['@xmi:type'] == 'uml:DataType':
+        parse_type_data(model, element)
+        success = True
+    else:
+        print(json.dumps(element, indent=4))
+        success = False
+
+    return success
+
+
+def parse_type_definitions(model, elements):
+    # print(json.dumps(elements, indent=4))
+
+    for element in elements:
+        success = parse_type_definition(model, element)
+
+        if not success:
+            break
+
+
+class MyAssociationEnd:
+    """One end of an association: the role the objects of type type_id play in it, and how many of them
+    there can be"""
+
+    def __init__(self):
+        self.id = None
+        self.name = None
+        self.type_id = None
+        self.lower = None
+        self.upper = None
+
+        # When the end is an attribute of a class instead of owned by the association
+        self.owner = None
+        self.attribute = None
+
+    def _parse_end(self, end):
+        self.id = end.get('@xmi:id')
+        self.name = end.get('@name')
+        self.type_id = end.get('@type')
+
+        for parameter in ('lowerValue', 'upperValue'):
+            if isinstance(end.get(parameter), dict):
+                self.set_multiplicity(parameter, end[parameter].get('@value'))
+
+    def set_multiplicity(self, parameter, value):
+        if parameter == 'lowerValue':
+            self.lower = value
+        elif parameter == 'upperValue':
+            self.upper = value
+
+    def set_attribute(self, owner, attribute_):
+        """Make this end the attribute attribute_ of class owner"""
+        self.owner = owner
+        self.attribute = attribute_
+        self.id = attribute_.id
+        self.name = attribute_.name
+        self.type_id = attribute_.type_id
+
+        for constraint_ in attribute_.constraints:
+            self.set_multiplicity(constraint_.name, constraint_.value)
+
+    def is_many(self):
+        return self.upper == '*' or (self.upper is not None and self.upper.isdigit() and int(self.upper) > 1)
+
+    def fingerprint_state(self):
+        return [self.id, self.name, self.type_id, self.lower, self.upper]
+
+
+class MyRelationship:
+    """relationship() on one of the classes of an association, to the class at the other end"""
+
+    def __init__(self, name, target_id, target_name, comment):
+        self.name = name
+        self.target_id = target_id
+        self.target_name = target_name
+        self.comment = comment
+
+        # Keyword arguments of the relationship, as (name, code) tuples
+        self.arguments = []
+
+        # The foreign key attribute of a relationship to one object, see concrete_relationship()
+        self.foreign_key = None
+
+    def add_argument(self, name, value):
+        self.arguments.append((name, "'" + value + "'"))
+
+    def concrete_relationship(self, table_name):
+        """Return this relationship for a concrete table subclass of its class, which has the foreign key
+        column in its own table table_name. The class at the other end refers back to the general class
+        only, so it has no back_populates."""
+        relationship_ = MyRelationship(self.name, self.target_id, self.target_name, self.comment)
+
+        for name, value in self.arguments:
+            if name == 'foreign_keys':
+                relationship_.add_argument(name, table_name + ".c." + self.foreign_key.column_name())
+            elif name != 'back_populates':
+                relationship_.arguments.append((name, value))
+
+        return relationship_
+
+    def render(self, out):
+        out.write("    \n    # " + self.name + "\n")
+        out.write("    # " + self.comment + "\n\n")
+        out.write("    " + self.name + " = relationship('" + self.target_name + "'")
+
+        for name, value in self.arguments:
+            out.write(", " + name + " = " + value)
+
+        out.write(")\n")
+
+
+class MyAssociation:
+    """Association between two classes. A 1:n or 1:1 association becomes a foreign key on the class at
+    the many end, a n:m association a secondary table. Both classes get a relationship() to the other,
+    joined with back_populates."""
+
+    def __init__(self, model, association=None):
+        self.model = model
+        self.id = None
+        self.name = None
+        self.comment = None
+        self.member_ends = []
+        self.ends = []
+        self.fingerprint = None
+
+        # For n:m associations
+        self.table_name = None
+        self.columns = None
+        self.table_types = None
+        self.keys = None
+
+        if association:
+            self._parse_association(association)
+
+    def _parse_association(self, association):
+        self.id = association['@xmi:id']
+        self.name = association.get('@name')
+        self.member_ends = association.get('@memberEnd', '').split()
+
+        if 'ownedComment' in association:
+            self.comment = association['ownedComment']['body']
+
+        owned_ends = association.get('ownedEnd', [])
+        if isinstance(owned_ends, dict):
+            owned_ends = [owned_ends]
+
+        for owned_end in owned_ends:
+            end = MyAssociationEnd()
+            end._parse_end(owned_end)
+            self.ends.append(end)
+
+    def find_member_ends(self, attributes):
+        """Add the member ends that are attributes of classes. attributes is a dictionary of unique ID to
+        (class, attribute) tuples."""
+        owned = set(end.id for end in self.ends)
+
+        for end_id in self.member_ends:
+            if end_id not in owned and end_id in attributes:
+                end = MyAssociationEnd()
+                end.set_attribute(*attributes[end_id])
+                self.ends.append(end)
+
+        # Keep the ends in the order of memberEnd
+        self.ends.sort(key=lambda end: self.member_ends.index(end.id) if end.id in self.member_ends else 0)
+
+    def fingerprint_state(self):
+        return [self.id, self.name, self.member_ends, [end.fingerprint_state() for end in self.ends],
+                self.model.find_stereotypes(self.id)]
+
+    def role_name(self, end):
+        """Name of the relationship to the classes at end"""
+        if end.name:
+            return convert_camel_case(end.name)
+
+        name = convert_camel_case(self.model.symbols.class_ids.get(end.type_id, 'item'))
+        if end.is_many():
+            name += "s"
+
+        return name
+
+    def loader_strategy(self, end):
+        """Loader strategy of the relationship to end. A lazy tagged value on a stereotype of the end, or
+        of the association, overrides the one from the options."""
+        strategy = self.model.options.lazy
+
+        for id_ in (self.id, end.id):
+            for name, tagged_values in self.model.find_stereotypes(id_):
+                if tagged_values.get('lazy') in loader_strategies:
+                    strategy = tagged_values['lazy']
+
+        # Only collections can be dynamic
+        if strategy == 'dynamic' and not end.is_many():
+            strategy = 'select'
+
+        return strategy
+
+    def resolve(self):
+        """Add the foreign key, the secondary table and the relationships for this association"""
+        if len(self.ends) != 2:
+            print("Association %s has %d ends, only associations with two ends are supported" %
+                  (self.name, len(self.ends)))
+            return
+
+        end_a, end_b = self.ends
+        class_a = self.model.symbols.find_class(end_a.type_id)
+        class_b = self.model.symbols.find_class(end_b.type_id)
+
+        if class_a is None or class_b is None:
+            print("Association %s is not between two classes" % (self.name))
+            return
+
+        if class_a.mixin or class_b.mixin:
+            print("Association %s is with an abstract class, which has no table in this inheritance mode" %
+                  (self.name))
+            return
+
+        # Ends that are attributes become relationships instead of columns
+        for end in self.ends:
+            if end.attribute in getattr(end.owner, 'attributes', []):
+                end.owner.attributes.remove(end.attribute)
+
+        # The foreign key goes on the class at the many end
+        if end_a.is_many() and not end_b.is_many():
+            end_a, end_b = end_b, end_a
+            class_a, class_b = class_b, class_a
+
+        name_a = self.role_name(end_a)
+        name_b = self.role_name(end_b)
+        comment = "association " + (self.name or self.id)
+
+        # class_a gets a relationship to the objects of class_b, class_b one to the objects of class_a
+        relationship_a = MyRelationship(name_b, class_b.class_id, class_b.class_name, comment)
+        relationship_b = MyRelationship(name_a, class_a.class_id, class_a.class_name, comment)
+        relationship_a.add_argument('back_populates', name_a)
+        relationship_b.add_argument('back_populates', name_b)
+
+        if end_a.is_many() and end_b.is_many():
+            self._resolve_many_to_many(class_a, class_b, name_a, name_b, relationship_a, relationship_b)
+        else:
+            self._resolve_foreign_key(class_a, class_b, end_a, end_b, name_a, relationship_a, relationship_b)
+
+        relationship_a.add_argument('lazy', self.loader_strategy(end_b))
+        relationship_b.add_argument('lazy', self.loader_strategy(end_a))
+
+        class_a.relationships.append(relationship_a)
+        class_b.relationships.append(relationship_b)
+
+    def _resolve_foreign_key(self, class_a, class_b, end_a, end_b, name_a, relationship_a, relationship_b):
+        """Every object of class_b refers to at most one object of class_a"""
+        foreign_key = MyAttribute(self.model)
+        foreign_key.set_name(name_a)
+        foreign_key.set_id(end_a.id)
+        foreign_key.set_type_id(class_a.class_id)
+
+        # Both ends single, so one to one
+        foreign_key.unique = not end_b.is_many()
+
+        class_b.attributes.append(foreign_key)
+        if class_b.inheritance == 'single' and class_b.mapped_class is not None:
+            self.model.add_single_table_column(class_b, foreign_key)
+        elif class_b.inheritance == 'joined' and class_b.mapped_class is not None:
+            self.model.add_joined_table_column(class_b, foreign_key)
+
+        # There can be several foreign keys between the two classes. The columns are named by their table,
+        # class attributes of concrete table inheritance classes would be those of the union of all tables.
+        foreign_keys = class_b.table_name() + ".c." + foreign_key.column_prefix + foreign_key.name.lower() + "_id"
+        relationship_a.add_argument('foreign_keys', foreign_keys)
+        relationship_b.add_argument('foreign_keys', foreign_keys)
+        relationship_b.foreign_key = foreign_key
+
+        if not end_b.is_many():
+            relationship_a.arguments.append(('uselist', 'False'))
+
+        if class_a is class_b:
+            # The object referred to is on the remote side of the foreign key
+            relationship_b.add_argument('remote_side', class_a.table_name() + ".c." + class_a.key().column_name())
+
+    def _resolve_many_to_many(self, class_a, class_b, name_a, name_b, relationship_a, relationship_b):
+        """Objects of class_a and of class_b refer to any number of each other, through a secondary table"""
+        table_a = class_a.table_name()
+        table_b = class_b.table_name()
+
+        if self.name:
+            self.table_name = convert_camel_case(self.name)
+        else:
+            self.table_name = table_a + "_" + table_b
+
+        # The name of the association can be that of a class, a type or another association
+        if self.table_name in self.model.table_names:
+            table_name = table_a + "_" + table_b
+            suffix = 2
+            while table_name in self.model.table_names:
+                table_name = table_a + "_" + table_b + "_" + str(suffix)
+                suffix += 1
+
+            print("Table %s of association %s is already used, using %s" % (self.table_name, self.name, table_name))
+            self.table_name = table_name
+
+        column_a = class_a.class_name.lower() + "_id"
+        column_b = class_b.class_name.lower() + "_id"
+        if column_a == column_b:
+            # Both ends are the same class, name the columns after the roles
+            column_a = name_a + "_id"
+            column_b = name_b + "_id"
+
+        self.columns = (column_a, column_b)
+        self.table_types = (table_a, table_b)
+        self.keys = (class_a.key().column_name(), class_b.key().column_name())
+        self.model.add_table(self)
+
+        relationship_a.add_argument('secondary', self.table_name)
+        relationship_b.add_argument('secondary', self.table_name)
+
+        if class_a is class_b:
+            # Tell SQLAlchemy which column refers to which side
+            join_a = table_a + ".c." + self.keys[0] + " == " + self.table_name + ".c." + column_a
+            join_b = table_a + ".c." + self.keys[0] + " == " + self.table_name + ".c." + column_b
+            relationship_a.add_argument('primaryjoin', join_a)
+            relationship_a.add_argument('secondaryjoin', join_b)
+            relationship_b.add_argument('primaryjoin', join_b)
+            relationship_b.add_argument('secondaryjoin', join_a)
+
+    def output_key(self):
+        return "association:" + self.id
+
+    def compute_fingerprint(self):
+        return fingerprint([self.table_name, self.columns, self.table_types, self.keys])
+
+    def dependencies(self):
+        return [end.type_id for end in self.ends]
+
+    def output_names(self):
+        return [self.table_name]
+
+    def definition_dependencies(self):
+        return []
+
+    def ddl_table(self, dialect):
+        """Return the MyTable of the secondary table of this n:m association"""
+        columns = []
+        for end, column, table, key in zip(self.ends, self.columns, self.table_types, self.keys):
+            type_ = self.model.symbols.find_class(end.type_id).key().ddl_type(dialect, reference=True)
+            columns.append(MyColumn(column, type_, references=(table, key), id_=end.id))
+
+        return ddl_link_table(self.table_name, columns[0], columns[1], self.model.options.dialect,
+                              self.output_key())
+
+    def render(self, out, core=False):
+        """Write the secondary table of this n:m association to out, with core for the core backend"""
+        render_link_table(out, self.table_name,
+                          self.columns[0], "ForeignKey('" + self.table_types[0] + "." + self.keys[0] + "')",
+                          self.columns[1], "ForeignKey('" + self.table_types[1] + "." + self.keys[1] + "')",
+                          self.model.options.dialect, core)
+
+    def __repr__(self):
+        return render_to_string(self)
+
+
+def parse_association(model, element):
+    model.elements += 1
+
+    if element.get('@xmi:type') == 'uml:Association':
+        model.add_association(MyAssociation(model, element))
+    else:
+        print("Skipping %s in the associations, not an association" % (element.get('@xmi:type')))
+
+
+def parse_associations(model, elements):
+    # print(json.dumps(elements, indent=4))
+    if isinstance(elements, dict):
+        # Just one association
+        elements = [elements]
+
+    for element in elements:
+        parse_association(model, element)
+
+
+def parse_xmi(model, doc):
+    """Parse a complete XMI document, as returned by xmltodict.parse()"""
+    xmi = doc['xmi:XMI']
+    package = xmi['uml:Package']
+
+    # Stereotype applications are next to the package
+    for tag, applications in xmi.items():
+        if tag.startswith('@') or tag == 'uml:Package':
+            continue
+
+        if not isinstance(applications, list):
+            applications = [applications]
+
+        for application in applications:
+            if isinstance(application, dict):
+                model.add_stereotype(tag, dict((key[1:], value) for key, value in application.items()
+                                               if key.startswith('@')))
+
+    # print "\"\"\"Package name = %s" % package['@name']
+
+    package_elements = package['packagedElement']
+
+    for element in package_elements:
+        element_name = element['@name']
+        # print "Now in package element %s" % element_name
+
+        if element_name == 'TypeDefinitions':
+            with model.profiler.phase('parse_type_definitions'):
+                parse_type_definitions(model, element['packagedElement'])
+            #pass
+
+    for element in package_elements:
+        element_name = element['@name']
+        # print "Now in package element %s" % element_name
+
+        if element_name == 'ObjectClasses':
+            with model.profiler.phase('parse_class_objects'):
+                parse_class_objects(model, element['packagedElement'])
+            pass
+
+    for element in package_elements:
+        element_name = element['@name']
+        # print "Now in package element %s" % element_name
+
+        if element_name == 'Associations':
+            with model.profiler.phase('parse_associations'):
+                parse_associations(model, element['packagedElement'])
+
+
+# Depth of the elements inside the top level packages: xmi:XMI / uml:Package / packagedElement / packagedElement
+STREAM_ITEM_DEPTH = 4
+
+
+class XmiStreamHandler:
+    """Item callback for xmltodict's streaming mode. Every packagedElement inside the TypeDefinitions,
+    ObjectClasses and Associations packages is handed over as soon as its closing tag has been
+    parsed. It is turned into a model object right away, after which xmltodict drops the element,
+    so only one element at a time is kept in memory.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+        # Like parse_type_definitions, stop parsing type definitions after the first unknown one
+        self.type_definitions_failed = False
+
+    def __call__(self, path, item):
+        if len(path) != STREAM_ITEM_DEPTH or path[1][0] != 'uml:Package':
+            return True
+
+        element_tag, element_attributes = path[3]
+        _, package_attributes = path[2]
+
+        if element_tag != 'packagedElement' or not package_attributes or not element_attributes:
+            return True
+
+        # At the item depth xmltodict only collects the children of an element, its own
+        # attributes are in the path. Put them back together the way xmltodict.parse() does.
+        element = OrderedDict(('@' + key, value) for key, value in element_attributes.items())
+        if isinstance(item, dict):
+            element.update(item)
+
+        package_name = package_attributes.get('name')
+
+        if package_name == 'TypeDefinitions':
+            if not self.type_definitions_failed:
+                self.type_definitions_failed = not parse_type_definition(self.model, element)
+        elif package_name == 'ObjectClasses':
+            parse_class_object(self.model, element)
+        elif package_name == 'Associations':
+            parse_association(self.model, element)
+
+        # Keep on parsing
+        return True
+
+
+class XmiStreamSAXHandler(xmltodict._DictSAXHandler):
+    """xmltodict's SAX handler, that also hands the stereotype applications next to the uml:Package to the
+    model. Those are not inside the packages, so the item callback never sees them."""
+
+    def __init__(self, model, **kwargs):
+        xmltodict._DictSAXHandler.__init__(self, **kwargs)
+        self.model = model
+
+    def startElement(self, full_name, attrs):
+        xmltodict._DictSAXHandler.startElement(self, full_name, attrs)
+
+        if len(self.path) == 2:
+            tag, attributes = self.path[1]
+            if tag != 'uml:Package' and attributes:
+                self.model.add_stereotype(tag, attributes)
+
+
+def parse_xmi_stream(model, fd):
+    """Parse an XMI file from an open file object without building the complete document in memory"""
+    handler = XmiStreamSAXHandler(model, item_depth=STREAM_ITEM_DEPTH, item_callback=XmiStreamHandler(model))
+
+    # Set up the parser like xmltodict.parse() does
+    parser = xmltodict.expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.StartNamespaceDeclHandler = handler.startNamespaceDecl
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    parser.buffer_text = True
+    parser.DefaultHandler = lambda x: None
+    parser.ExternalEntityRefHandler = lambda *x: 1
+
+    parser.ParseFile(fd)
+
+
+class XmiModelBuilder:
+    """expat handler that builds MyClass, MyAttribute, MyConstraint, MyEnumerationType and MyDataType
+    objects straight from the start and end element events, without building a dictionary for each
+    element first.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.depth = 0
+        self.package_name = None
+        self.type_definitions_failed = False
+
+        # The class, type or association, attribute, association end and enumeration literal currently
+        # being built
+        self.element = None
+        self.attribute = None
+        self.end = None
+        self.literal = None
+        self.literal_id = None
+        self.literal_comment = None
+
+        # Where the text of the current ownedComment body goes
+        self.comment_owner = None
+        self.text = None
+
+    def start_element(self, tag, attributes):
+        self.depth += 1
+
+        if self.depth == 2:
+            if tag != 'uml:Package':
+                self.model.add_stereotype(tag, attributes)
+        elif self.depth == 3:
+            if tag == 'packagedElement':
+                self.package_name = attributes.get('name')
+                self.type_definitions_failed = False
+            else:
+                self.package_name = None
+        elif self.depth == 4:
+            if tag == 'packagedElement':
+                self._start_packaged_element(attributes)
+        elif self.element is None:
+            pass
+        elif tag == 'ownedComment':
+            if self.depth == 5:
+                self.comment_owner = self.element
+            elif self.attribute:
+                self.comment_owner = self.attribute
+            elif self.literal:
+                self.comment_owner = 'literal'
+        elif tag == 'body' and self.comment_owner:
+            self.text = []
+        elif self.depth == 5:
+            self._start_element_child(tag, attributes)
+        elif self.depth == 6 and self.attribute:
+            self._start_attribute_child(tag, attributes)
+        elif self.depth == 6 and self.end:
+            self.end.set_multiplicity(tag, attributes.get('value'))
+
+    def end_element(self, tag):
+        if self.text is not None and tag == 'body':
+            self._set_comment(''.join(self.text).strip() or None)
+            self.text = None
+        elif tag == 'ownedComment':
+            self.comment_owner = None
+        elif self.depth == 5 and self.attribute:
+            self.element.attributes.append(self.attribute)
+            self.attribute = None
+        elif self.depth == 5 and self.end:
+            self.element.ends.append(self.end)
+            self.end = None
+        elif self.depth == 5 and self.literal:
+            self.element.add_literal(self.literal, self.literal_comment, self.literal_id)
+            self.literal = None
+            self.literal_comment = None
+        elif self.depth == 4 and self.element:
+            self._end_packaged_element()
+
+        self.depth -= 1
+
+    def characters(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+    def _start_packaged_element(self, attributes):
+        self.model.elements += 1
+
+        if self.package_name == 'TypeDefinitions':
+            if self.type_definitions_failed:
+                return
+
+            xmi_type = attributes.get('xmi:type')
+            if xmi_type == 'uml:Enumeration':
+                self.element = MyEnumerationType(self.model)
+                self.element.set_name(attributes['name'])
+            elif xmi_type == 'uml:DataType':
+                self.element = MyDataType(self.model)
+                self.element.set_name(attributes['name'])
+            else:
+                print(json.dumps(attributes, indent=4))
+                self.type_definitions_failed = True
+                return
+
+            self.element.type_id = attributes['xmi:id']
+            self.model.symbols.add_type(self.element)
+        elif self.package_name == 'ObjectClasses':
+            self.element = MyClass(self.model)
+            self.element.class_id = attributes['xmi:id']
+            self.element.set_name(attributes['name'])
+            self.element.is_abstract = attributes.get('isAbstract') == 'true'
+        elif self.package_name == 'Associations':
+            if attributes.get('xmi:type') != 'uml:Association':
+                print("Skipping %s in the associations, not an association" % (attributes.get('xmi:type')))
+                return
+
+            self.element = MyAssociation(self.model)
+            self.element.id = attributes['xmi:id']
+            self.element.name = attributes.get('name')
+            self.element.member_ends = attributes.get('memberEnd', '').split()
+
+    def _end_packaged_element(self):
+        if isinstance(self.element, MyClass):
+            self.model.add_class(self.element)
+        elif isinstance(self.element, MyAssociation):
+            self.model.add_association(self.element)
+        else:
+            self.model.add_type(self.element)
+
+            if isinstance(self.element, MyDataType):
+                print("Created datatype %s" % (self.element.name))
+
+        self.element = None
+
+    def _start_element_child(self, tag, attributes):
+        if isinstance(self.element, MyAssociation):
+            if tag == 'ownedEnd':
+                self.end = MyAssociationEnd()
+                self.end.id = attributes.get('xmi:id')
+                self.end.name = attributes.get('name')
+                self.end.type_id = attributes.get('type')
+        elif tag == 'generalization':
+            if isinstance(self.element, MyClass) and not self.element.general_class_id:
+                self.element.general_class_id = attributes.get('general')
+        elif tag == 'ownedLiteral':
+            if isinstance(self.element, MyEnumerationType):
+                self.literal = attributes.get('name')
+                self.literal_id = attributes.get('xmi:id')
+        elif tag == 'ownedAttribute':
+            if isinstance(self.element, MyEnumerationType):
+                return
+
+            if isinstance(self.element, MyClass) and attributes.get('xmi:type') != 'uml:Property':
+                print("-------> Unknown attribute type (not property but %s)" % (attributes.get('xmi:type')))
+                return
+
+            self.attribute = MyAttribute(self.model)
+            self.attribute.set_name(attributes['name'])
+            self.attribute.set_id(attributes['xmi:id'])
+            if 'type' in attributes:
+                self.attribute.set_type_id(attributes['type'])
+
+    def _start_attribute_child(self, tag, attributes):
+        xmi_type = attributes.get('xmi:type')
+
+        if tag == 'type':
+            if xmi_type and 'PrimitiveType' in xmi_type:
+                url_parts = urlparse(attributes['href'])
+                self.attribute.set_type_name(url_parts.fragment)
+        elif xmi_type:
+            self.attribute.add_constraint(MyConstraint(self.model, tag, xmi_type, attributes.get('value'),
+                                                       attributes.get('instance')))
+
+    def _set_comment(self, body):
+        if self.comment_owner == 'literal':
+            self.literal_comment = body
+        elif isinstance(self.comment_owner, MyAttribute):
+            if body:
+                self.comment_owner.set_comment(body)
+        else:
+            self.comment_owner.comment = body
+
+
+def parse_xmi_sax(model, fd):
+    """Parse an XMI file from an open file object straight into model objects"""
+    builder = XmiModelBuilder(model)
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = builder.start_element
+    parser.EndElementHandler = builder.end_element
+    parser.CharacterDataHandler = builder.characters
+    parser.buffer_text = True
+
+    # Don't expand entities, like xmltodict
+    parser.DefaultHandler = lambda x: None
+    parser.ExternalEntityRefHandler = lambda *x: 1
+
+    parser.ParseFile(fd)
+
+
+def parse_model(infile, parser='dict', profiler=NULL_PROFILER, options=None):
+    """Parse the UML XML file infile into a new, resolved Model"""
+    model = Model(profiler, options)
+
+    with open(infile, 'rb') as fd:
+        if parser == 'stream':
+            with profiler.phase('parse (stream)'):
+                parse_xmi_stream(model, fd)
+        elif parser == 'sax':
+            with profiler.phase('parse (sax)'):
+                parse_xmi_sax(model, fd)
+        else:
+            with profiler.phase('xmltodict.parse'):
+                doc = xmltodict.parse(fd.read())
+            # print(json.dumps(doc, indent=4))
+
+            parse_xmi(model, doc)
+
+    model.resolve()
+
+    return model
+
+
+def model_cache_key(infile, options=None):
+    """Return the key of the cached model for infile: a hash of its contents, the generator version and
+    the options"""
+    digest = hashlib.sha1(__version__.encode('ascii'))
+    digest.update((options if options is not None else Options()).key().encode('ascii'))
+
+    with open(infile, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def load_cached_model(cache_dir, key):
+    """Load a resolved model from the cache. Returns None when it isn't cached or can't be read"""
+    cache_file = os.path.join(cache_dir, key + '.model')
+
+    try:
+        with open(cache_file, 'rb') as fd:
+            return pickle.loads(zlib.decompress(fd.read()))
+    except (IOError, OSError, EOFError, zlib.error, pickle.UnpicklingError) as error:
+        if os.path.exists(cache_file):
+            print("Ignoring unreadable cached model %s: %s" % (cache_file, error))
+
+    return None
+
+
+def save_cached_model(cache_dir, key, model):
+    """Save a resolved model in the cache, as a compressed pickle"""
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    data = zlib.compress(pickle.dumps(model, pickle.HIGHEST_PROTOCOL))
+
+    # Write to a temporary file first, so concurrent runs never see a half written model
+    fd, temp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fw:
+        fw.write(data)
+    os.rename(temp_file, os.path.join(cache_dir, key + '.model'))
+
+
+def load_model(infile, parser='dict', cache_dir=None, profiler=NULL_PROFILER, options=None):
+    """Return the resolved Model for infile. If cache_dir is set, the model is taken from the cache
+    when infile hasn't changed, skipping parsing and resolution altogether"""
+    if not cache_dir:
+        return parse_model(infile, parser, profiler, options)
+
+    with profiler.phase('load_cached_model'):
+        key = model_cache_key(infile, options)
+        model = load_cached_model(cache_dir, key)
+
+    if model is None:
+        model = parse_model(infile, parser, profiler, options)
+
+        with profiler.phase('save_cached_model'):
+            save_cached_model(cache_dir, key, model)
+    else:
+        model.profiler = profiler
+        print("Using cached model %s for %s" % (key, infile))
+
+    return model
 
-        attributes = []
-        new_attribute = MyAttribute()
 
-        # Add a name attribute of the String type
-        new_attribute.set_name(new_list_name.lower() + "_name")
-        # new_attribute.set_id(old_attribute_id)
-        # Find the type_id for "String"
-        string_type_id = find_id_for_type_name('String')
-        if string_type_id:
-            new_attribute.set_type_id(string_type_id)
-            attributes.append(new_attribute)
-            list_class.attributes = attributes
-            # Save the new class
-            class_ids[list_class.class_id] = new_list_name
-            my_classes.append(list_class)
+def load_previous_model(previous, parser='dict', cache_dir=None, profiler=NULL_PROFILER, options=None):
+    """Return the resolved Model of the previous version of a UML XML file, to migrate from. previous is that
+    UML XML file, or a model from the cache directory"""
+    if not previous.endswith('.model'):
+        return load_model(previous, parser, cache_dir, profiler, options)
 
-            # Create the list item class
-            self._create_list_item_type(new_list_name, str(new_list_id), list_item_type_name)
+    with profiler.phase('load_cached_model'):
+        model = load_cached_model(os.path.dirname(previous), os.path.basename(previous)[:-len('.model')])
 
-            return last_added_list_type_id
-        else:
-            print("Can't find type ID for STRING, this shouldn't happen")
+    if model is None:
+        raise IOError("Can't load cached model %s" % (previous))
 
-        return None
+    model.profiler = profiler
 
-    def resolve_many_constraints(self):
-        print("Resolving many constraints on type %s" % (self.class_name))
-        for attribute_ in self.attributes:
-            if attribute_.has_many_constraint() :
-                print "%s has an attribute with a many constraint at %s : %s" % (self.class_name, attribute_.name, attribute_.type_name)
+    return model
 
-                # So this is a list type
-                # First create a list type name by adding List to the end of the attribute type name
-                new_list_name = "ListOf" + attribute_.type_name + "s"
 
-                # And check whether it already exists, if so point the attribute type to the list instead of list item type
-                list_type_id = find_id_for_type_name(new_list_name)
+def write_if_changed(filename, data):
+    """Write data to filename, unless the file already holds exactly that data, so an unchanged model
+    doesn't touch the file and trigger reloads and rebuilds of what uses it. The data is written to a
+    temporary file next to filename, which is then renamed to it, so the file is never seen half written.
 
-                old_attribute_type_id = attribute_.type_id
-                old_attribute_type_name = attribute_.type_name
-                if list_type_id:
-                    print "Rewriting existing base type information to new list type %s (id=%s)" % (new_list_name, list_type_id)
-                    attribute_.set_type_id(list_type_id)
-                    attribute_.set_type_name(new_list_name)
-                else:
-                    print("Creating new list type %s" % (new_list_name))
+    Returns whether the file was written."""
+    try:
+        if os.path.getsize(filename) == len(data):
+            with open(filename, 'rb') as fd:
+                if fd.read() == data:
+                    return False
+    except (IOError, OSError):
+        pass
 
-                    list_type_id = self._create_new_list(old_attribute_type_name, attribute_.type_name)
+    # Created with the permissions a new file would get. A random name, as several runs can write at once.
+    while True:
+        temp_file = "%s.%s.tmp" % (filename, binascii.hexlify(os.urandom(4)))
+        try:
+            fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            break
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+    try:
+        with os.fdopen(fd, 'wb') as fw:
+            fw.write(data)
+
+        if os.path.exists(filename):
+            os.chmod(temp_file, os.stat(filename).st_mode & 0o7777)
+
+            if os.name == 'nt':
+                # Renaming over an existing file fails on Windows
+                os.remove(filename)
+
+        os.rename(temp_file, filename)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    return True
+
+
+def load_manifest(outfile, options=None):
+    """Load the manifest written by render_incremental() for outfile. Returns a dictionary of output key
+    to a (fingerprint, code) tuple, which is empty when there is no usable manifest."""
+    try:
+        with open(outfile + '.manifest') as fd:
+            manifest = json.load(fd)
+        with open(outfile, 'rb') as fd:
+            output = fd.read()
+    except (IOError, OSError, ValueError):
+        return dict()
+
+    # Only trust the manifest when it belongs to this version and these options, and the output hasn't been
+    # touched since
+    if manifest.get('version') != __version__ or manifest.get('output') != hashlib.sha1(output).hexdigest():
+        return dict()
+
+    if manifest.get('options') != (options if options is not None else Options()).key():
+        return dict()
+
+    previous = dict()
+    for key, fingerprint_, start, end in manifest['chunks']:
+        previous[key] = (fingerprint_, output[start:end])
+
+    return previous
+
+
+def render_incremental(model, outfile, previous=None):
+    """Write the model to outfile, only rendering the classes and types that changed since the previous
+    run. The code of the others is spliced in from the previous output. previous is what this function
+    returned for the previous run; when it isn't given, it is loaded from the manifest of outfile.
+
+    Returns the number of classes and types that were rendered, and the code of this run."""
+    if previous is None:
+        previous = load_manifest(outfile, model.options)
+    fingerprints = model.dependency_fingerprints()
+
+    output = []
+    chunks = []
+    current = dict()
+    offset = 0
+    rendered = 0
+
+    for key, render_chunk in model.render_chunks():
+        if key is not None and key in previous and previous[key][0] == fingerprints[key]:
+            code = previous[key][1]
+        else:
+            code = render_chunk()
+            if key is not None:
+                rendered += 1
+
+        output.append(code)
+        if key is not None:
+            chunks.append([key, fingerprints[key], offset, offset + len(code)])
+            current[key] = (fingerprints[key], code)
+        offset += len(code)
+
+    output = b''.join(output)
+
+    write_if_changed(outfile, output)
+    write_if_changed(outfile + '.manifest', json.dumps({
+        'version': __version__, 'options': model.options.key(), 'output': hashlib.sha1(output).hexdigest(),
+        'chunks': chunks}, sort_keys=True))
+
+    return rendered, current
+
+
+def shard_module_names(model, layout):
+    """Return the name of the module of every class, type and table, by output key. Module names differ
+    from the names the modules define, as the package would have the module instead of the name once it
+    is imported."""
+    objects = model.types + model.classes + model.tables
+    names = set(name for object_ in objects for name in object_.output_names())
+    taken = set(['_base'])
+    modules = dict()
+
+    for object_ in objects:
+        if layout == 'package':
+            if isinstance(object_, (MyEnumerationType, MyDataType)) or getattr(object_, 'embedded', False):
+                # Embedded classes are plain value classes, like the data types
+                module = 'type_definitions'
+            elif isinstance(object_, MyClass):
+                module = 'object_classes'
+            else:
+                module = 'associations'
+
+            if module in modules.values():
+                modules[object_.output_key()] = module
+                continue
+        elif isinstance(object_, MyEnumerationType):
+            module = object_.name + '_enum'
+        elif isinstance(object_, (MyAssociationTable, MyAssociation)):
+            module = object_.output_names()[0] + '_table'
+        else:
+            module = convert_camel_case(object_.output_names()[0]) if object_.output_names() else None
 
-                    if list_type_id:
-                        print("Saving newly created list type %s (%d) as %s instead of type %s (%s)" % (new_list_name, list_type_id, attribute_.name, old_attribute_type_name, old_attribute_type_id))
-                        attribute_.set_type_id(list_type_id)
-                        attribute_.set_type_name(new_list_name)
+        if module is None:
+            continue
 
-                    else :
-                        print "Can't create a new list type? This should NEVER happen!"
+        while module in names or module in taken or keyword.iskeyword(module):
+            module += '_'
 
+        taken.add(module)
+        modules[object_.output_key()] = module
 
-def parse_class_objects(elements):
-    for element_ in elements:
-        my_class = MyClass(element_)
+    return modules
 
-        my_classes.append(my_class)
 
+def render_package(model, outdir, layout='class'):
+    """Write the model to the package outdir, in a module per class, type and table or a module per UML
+    package, next to a _base module with the imports and the declarative Base. The __init__ of the package
+    imports a module only when one of its names is used.
 
-class MyEnumerationType:
-    def __init__(self, enum_type):
-        self.type_id = enum_type['@xmi:id']
-        self.name = convert_camel_case(enum_type['@name'])
-        type_ids[self.type_id] = self.name
+    Names that are needed to define a class, like its general class and the enumerations of its columns,
+    are imported by its module. The classes and tables that are only referred to by name, in foreign keys
+    and relationships, are imported by the __init__ along with it, one after the other, as modules can
+    refer to each other and chains of references can be longer than the recursion limit. SQLAlchemy finds
+    them in the registry of the Base when the mappers are configured."""
+    modules = shard_module_names(model, layout)
+    objects = [type_ for type_ in model.types if isinstance(type_, MyEnumerationType)]
+    objects += [type_ for type_ in model.types if not isinstance(type_, MyEnumerationType)]
+    objects += model.classes + model.tables
 
-        if 'ownedComment' in enum_type:
-            self.comment = enum_type['ownedComment']['body']
-        else:
-            self.comment = None
+    code = OrderedDict()
+    imports = dict()
+    references = dict()
 
-        self.literals = dict()
+    for object_ in objects:
+        module = modules.get(object_.output_key())
+        if module is None:
+            continue
 
-        if 'ownedLiteral' in enum_type:
-            for literal in enum_type['ownedLiteral']:
-                comment = None
-                if isinstance(literal, basestring):
-                    my_literal = enum_type['ownedLiteral']
-                    literal_name = my_literal['@name']
-                    if 'ownedComment' in my_literal:
-                        comment = my_literal['ownedComment']['body']
-                else:
-                    literal_name = literal['@name']
-                    if 'ownedComment' in literal:
-                        comment = literal['ownedComment']['body']
+        code.setdefault(module, []).append(repr(object_) + ("\n" if isinstance(object_, MyEnumerationType) else ""))
+        imports.setdefault(module, set())
+        references.setdefault(module, set())
 
-                self.literals[literal_name] = comment
+        for dependency in object_.definition_dependencies():
+            if modules.get(dependency.output_key()) not in (None, module):
+                imports[module].add((modules[dependency.output_key()], dependency.output_names()[0]))
 
-    def resolve_type_ids(self):
-        # No need to resolve unique IDs within an ENUM. They don't have attributes that point to other types
-        pass
+        for id_ in object_.dependencies():
+            dependency = model.find_class_or_type(id_)
+            if dependency is None or not dependency.output_names() or dependency.output_key() not in modules:
+                continue
 
-    def resolve_many_constraints(self):
-        # No need for this for enumerations
-        pass
+            references[module].add(modules[dependency.output_key()])
 
-    def __repr__(self):
-        result = "# " + self.name + "\n"
+    for object_ in objects:
+        module = modules.get(object_.output_key())
+        if module is None:
+            continue
 
-        if self.comment:
-            width = 79
-            comment = textwrap.fill(self.comment, width=width,
-                                    initial_indent='# ',
-                                    subsequent_indent='# ')
-            result += comment
+        # Polymorphic queries on a general class need its subclasses
+        if isinstance(object_, MyClass) and object_.mapped_class is not None:
+            references[modules[object_.mapped_class.output_key()]].add(module)
 
-        result += "# \n"
+        # The owners of a collection or the classes of an n:m association refer to its table by name
+        if isinstance(object_, MyAssociationTable):
+            owners = [object_.owner_id()]
+        elif isinstance(object_, MyAssociation):
+            owners = object_.dependencies()
+        else:
+            owners = []
 
-        for literal in self.literals:
-            if self.literals[literal]:
-                result += "#    " + literal + " - " + self.literals[literal] + "\n"
-            else:
-                result += "#    " + literal + "\n"
+        for id_ in owners:
+            owner = model.find_class_or_type(id_)
+            if owner is not None and owner.output_key() in modules:
+                references[modules[owner.output_key()]].add(module)
 
-        result += self.name + " = ("
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
 
-        first = True
-        for literal in self.literals:
-            if first:
-                result += "\"" + literal + "\""
-                first = False
-            else:
-                result += ", \"" + literal + "\""
+    written = write_if_changed(os.path.join(outdir, '_base.py'), to_ascii(model.header()))
 
-        result += ")\n"
+    for module, chunks in code.items():
+        lines = ["from ._base import *\n"]
+        lines.extend("from ." + imported_module + " import " + name + "\n"
+                     for imported_module, name in sorted(imports[module]))
+        lines.append("\n\n")
 
-        return result.encode('ascii', 'ignore')
+        written += write_if_changed(os.path.join(outdir, module + '.py'), to_ascii("".join(lines + chunks)))
 
+        # The modules imported here can refer to others
+        references[module].update(imported_module for imported_module, _ in imports[module])
+        references[module].discard(module)
 
-def parse_type_enumeration(type_enum):
-    my_types.append(MyEnumerationType(type_enum))
+    names = sorted((name, modules[object_.output_key()]) for object_ in objects if object_.output_key() in modules
+                   for name in object_.output_names())
+    init = package_init % ("".join("    '%s': '%s',\n" % name for name in names),
+                           "".join("    '%s': (%s,),\n" % (module, ", ".join("'%s'" % referenced for referenced
+                                                                             in sorted(references[module])))
+                                   for module in sorted(references) if references[module]))
+    written += write_if_changed(os.path.join(outdir, '__init__.py'), to_ascii(init))
 
+    # Counting the _base and __init__ modules
+    return written, len(code) + 2
 
-class MyDataType:
-    def __init__(self, data_type):
-        self.output = True
-        self.set_name(data_type['@name'])
-        self.type_id = data_type['@xmi:id']
-        type_ids[self.type_id] = self.name
 
-        if 'ownedComment' in data_type:
-            self.comment = data_type['ownedComment']['body']
-        else:
-            self.comment = None
+def quote_name(name, dialect):
+    """Quote a table, column, index or type name in DDL, so names like order and group can be used"""
+    if dialect == 'mysql':
+        return "`" + name.replace("`", "``") + "`"
 
-        self.attributes = []
-        self._parse_attributes(data_type)
+    return '"' + name.replace('"', '""') + '"'
 
-        print("Created datatype %s" % (self.name))
 
-    def resolve_type_ids(self):
-        for attribute_ in self.attributes:
-            attribute_.resolve_type_ids()
+def sql_string(value):
+    """Return value as an SQL string literal"""
+    return "'" + value.replace("'", "''") + "'"
 
-    def set_name(self, name):
-        """Set the name of this class. Some classes are really just aliases of base types. Those
-        have their name rewritten to a base SQLAlchemy type. Also their output is set to False so they are not
-        printed when repr is called
-        """
-        if name == 'PositiveInteger' :
-            self.name = 'Integer'
-            self.output = False
-        elif name == 'NaturalNumber' :
-            self.name = 'Integer'
-            self.output = False
-        elif name == 'TimeAndDate' :
-            self.name = 'DateTime'
-            self.output = False
-        elif name == 'Real' :
-            self.name = 'Float'
-            self.output = False
-        elif name == 'Percentage':
-            self.name = 'Float'
-            self.output = False
-        elif name == 'Identifier45':
-            self.name = 'String'
-            self.length = 45
-            self.output = False
-        elif name == 'Identifier90':
-            self.name = 'String'
-            self.length = 90
-            self.output = False
-        else :
-            # print "Not converting %s to base type" % (name)
-            self.name = name
 
+class MyColumn:
+    """Column of a MyTable. references is the (table, column) of its foreign key. id_ is the unique ID of the
+    attribute it is for, so a migration can tell a renamed column from a new one, see MyTableChange."""
 
-    def parse_attribute(self, attribute_):
-        new_attribute = MyAttribute()
+    def __init__(self, name, type_, nullable=True, primary_key=False, default=None, check=None, references=None,
+                 unique=False, index=False, id_=None):
+        self.id = id_ or name
+        self.name = name
+        self.type = type_
+        self.nullable = nullable
+        self.primary_key = primary_key
+        self.default = default
+        self.check = check
+        self.references = references
+        self.unique = unique
+        self.index = index
+        self.autoincrement = False
 
-        new_attribute.set_name(attribute_['@name'])
-        new_attribute.set_id(attribute_['@xmi:id'])
-        if '@type' in attribute_:
-            new_attribute.set_type_id(attribute_['@type'])
+    def ddl(self, dialect, constraints=True):
+        """Return the definition of this column in CREATE TABLE. Without constraints, leave out its UNIQUE and
+        CHECK constraints, as for ALTER TABLE, which adds those separately"""
+        sql = quote_name(self.name, dialect) + " " + self.type
 
-        for parameter in attribute_:
-            if not parameter.startswith('@'):
-                if parameter == 'ownedComment':
-                    new_attribute.set_comment(attribute_['ownedComment']['body'])
-                elif parameter == 'type':
-                    parameter_type = attribute_['type']
+        if self.default is not None:
+            sql += " DEFAULT " + self.default
 
-                    if 'PrimitiveType' in parameter_type['@xmi:type']:
-                        primitive_type_url = parameter_type['@href']
-                        url_parts = urlparse(primitive_type_url)
-                        new_attribute.set_type_name(url_parts.fragment)
+        if not self.nullable:
+            sql += " NOT NULL"
 
-                else:
-                    constraint_contents = attribute_[parameter]
-                    constraint_type = constraint_contents['@xmi:type']
+        if self.autoincrement:
+            sql += " AUTO_INCREMENT"
 
-                    if '@value' in constraint_contents:
-                        my_constraint = MyConstraint(parameter,
-                                                     constraint_type,
-                                                     constraint_contents['@value'])
-                    else:
-                        my_constraint = MyConstraint(parameter, constraint_type)
+        if constraints and self.has_unique_constraint():
+            sql += " UNIQUE"
 
-                    new_attribute.add_constraint(my_constraint)
+        if constraints and self.check:
+            sql += " CHECK (" + self.check + ")"
 
-        self.attributes.append(new_attribute)
+        return sql
 
-    def _parse_attributes(self, attributes):
-        for attribute_, attribute_items in attributes.iteritems():
-            if isinstance(attributes[attribute_], basestring):
-                # The strings found here are those we've used before
-                pass
-            else:
-                # Only interested in ownedAttribute attributes
-                if attribute_ == 'ownedAttribute':
-                    if isinstance(attribute_items, dict):
-                        self.parse_attribute(attribute_items)
-                    else:
-                        for attribute_item in attribute_items:
-                            self.parse_attribute(attribute_item)
+    def has_unique_constraint(self):
+        # A unique index is created for indexed columns instead
+        return self.unique and not self.index
 
-    def __repr__(self):
+    def definition(self):
+        """What this column is, apart from its name and the constraints of MyTable.constraints()"""
+        return (self.type, self.nullable, self.default, self.autoincrement)
 
-        # Don't output anything when output is set to false
-        if not self.output:
-            return ""
+    def is_plain(self):
+        """Whether SQLite can add or drop this column without rebuilding its table"""
+        return (not self.primary_key and not self.has_unique_constraint() and not self.references and
+                not self.check and (self.nullable or self.default is not None))
 
-        result = "class "
-        # if self.general_class_id:
-        #     if self.general_class_name:
-        #         result += self.class_name + " (" + self.general_class_name + ")"
-        #     else:
-        #         result += self.class_name + " (" + self.general_class_id + ")"
-        # else:
-        result += self.name
 
-        result += "(Base): # datatype definition\n"
+class MyTable:
+    """Table of the DDL backend, see render_ddl(). Built from the resolved classes, types and association
+    tables, with the same columns as their SQLAlchemy mapping. id_ is the unique ID of what it is built from,
+    so a migration can tell a renamed table from a new one."""
 
-        result += "    __tablename__ = \'" + self.name.lower() + "\'\n\n"
+    def __init__(self, name, id_=None):
+        self.id = id_ or name
+        self.name = name
+        self.columns = []
+
+        # Composite indexes, as (name, column names, unique, using) tuples
+        self.indexes = []
+
+        # Rows to insert, as tuples of SQL literals, for the lookup tables of enumerations
+        self.rows = []
+
+        self.without_rowid = False
+
+        # SQL that creates the sequence of its key, see MyPrimaryKey.ddl_sequence()
+        self.sequence = None
+
+    def add_indexes(self, indexes):
+        """Add the MyIndex objects of a class or data type"""
+        for index in indexes:
+            self.indexes.append((index.name, tuple(attribute_.column_name() for attribute_ in index.attributes),
+                                 index.unique, index.using))
+
+    def references(self):
+        """Names of the tables the foreign keys of this table refer to"""
+        return [column.references[0] for column in self.columns if column.references]
+
+    def foreign_keys(self):
+        """Foreign keys of this table, as (constraint name, column, table, column) tuples"""
+        return [(self.name + "_" + column.name + "_fkey", column.name) + column.references
+                for column in self.columns if column.references]
+
+    def index_definitions(self):
+        """All indexes of this table, of the indexed columns and the composite ones"""
+        return [("ix_" + self.name + "_" + column.name, (column.name,), column.unique, None)
+                for column in self.columns if column.index] + self.indexes
+
+    def constraints(self, dialect):
+        """Indexes and constraints of this table, as (kind, name, column names, detail) tuples. The names are
+        those the database gives them, None when it can't be known. The detail of a foreign key is the (table,
+        column) it refers to, of a check the SQL of the check, of an index whether it is unique and its method."""
+        constraints = []
+
+        keys = tuple(column.name for column in self.columns if column.primary_key)
+        if keys:
+            constraints.append(('primary key', self.name + "_pkey" if dialect == 'postgresql' else None, keys, None))
+
+        for name, column, table, key in self.foreign_keys():
+            constraints.append(('foreign key', name, (column,), (table, key)))
+
+        for column in self.columns:
+            if column.has_unique_constraint():
+                # MySQL names the index of a unique constraint after its column
+                name = column.name if dialect == 'mysql' else self.name + "_" + column.name + "_key"
+                constraints.append(('unique', name, (column.name,), None))
+
+            if column.check:
+                name = self.name + "_" + column.name + "_check" if dialect == 'postgresql' else None
+                constraints.append(('check', name, (column.name,), column.check))
+
+        for name, columns, unique, using in self.index_definitions():
+            constraints.append(('index', name, columns, (unique, using)))
+
+        return constraints
+
+    def render_create(self, out, dialect, created, name=None):
+        """Write the CREATE TABLE statement of this table, or of table name with its columns. Foreign keys to
+        tables that are not in created yet are left out, except on SQLite, which doesn't check them when
+        creating a table and can't add them later. Returns those foreign keys."""
+        deferred = []
+        lines = ["    " + column.ddl(dialect) for column in self.columns]
+
+        keys = [quote_name(column.name, dialect) for column in self.columns if column.primary_key]
+        if keys:
+            lines.append("    PRIMARY KEY (" + ", ".join(keys) + ")")
+
+        for foreign_key in self.foreign_keys():
+            table = foreign_key[2]
+            if dialect != 'sqlite' and table != self.name and table not in created:
+                deferred.append(foreign_key)
+            else:
+                lines.append("    " + foreign_key_ddl(foreign_key, dialect))
 
-        result += "    id = Column(Integer, primary_key=True)"
+        out.write("CREATE TABLE " + quote_name(name or self.name, dialect) + " (\n")
+        out.write(",\n".join(lines))
+        out.write("\n)")
+        if self.without_rowid:
+            out.write(" WITHOUT ROWID")
+        out.write(";\n")
 
-        # if self.is_abstract:
-        #     result += "  # Abstract"
+        return deferred
 
-        # result += " " + self.class_id
+    def render_rows(self, out, dialect, rows):
+        """Write the INSERT of rows into this table"""
+        out.write("INSERT INTO " + quote_name(self.name, dialect) + " (" +
+                  ", ".join(quote_name(column.name, dialect) for column in self.columns) + ") VALUES\n")
+        out.write(",\n".join("    (" + ", ".join(row) + ")" for row in rows))
+        out.write(";\n")
 
-        if len(self.attributes) > 0:
-            for attribute_ in self.attributes:
-                result += "\n"
-                result += repr(attribute_)
-        else:
-            result += "\n        pass\n"
+    def render(self, out, dialect, created):
+        """Write the CREATE TABLE and CREATE INDEX statements of this table, and the INSERT of its rows.
+        Returns the foreign keys that are left out, see render_create()."""
+        deferred = self.render_create(out, dialect, created)
 
-        result += "\n"
+        for index in self.index_definitions():
+            render_create_index(out, dialect, self.name, index)
 
-        return result.encode('ascii', 'ignore')
+        if self.rows:
+            self.render_rows(out, dialect, self.rows)
 
-    def _create_list_item_type(self, list_type_name, list_type_id, list_item_type_name):
-        print("Creating items list for list type %s with id %s and for item type %s" % (list_type_name, list_type_id, list_item_type_name))
-        global last_added_list_type_id
-        last_added_list_type_id += 1
+        out.write("\n")
 
-        new_list_items_name = list_type_name + "Items"
-        print("New items list name = %s" % (new_list_items_name))
+        return [(self.name, foreign_key) for foreign_key in deferred]
 
-        # Create a list_item_class
-        list_class = MyClass()
-        list_class.set_name(new_list_items_name)
-        list_class.class_id = str(last_added_list_type_id)
 
-        # The unique id for this list_items_type will be created automatically,
-        # but two other items need to be added per row:
-        # unique_id for the list_type and a unique_id towards an instance of the list_item_type
+def foreign_key_ddl(foreign_key, dialect):
+    """Return the FOREIGN KEY constraint for a foreign key of MyTable.foreign_keys()"""
+    name, column, table, key = foreign_key
 
-        # Find the ID for the item type
-        list_item_type_id = find_id_for_type_name(list_item_type_name)
+    return ("CONSTRAINT " + quote_name(name, dialect) + " FOREIGN KEY (" + quote_name(column, dialect) +
+            ") REFERENCES " + quote_name(table, dialect) + " (" + quote_name(key, dialect) + ")")
 
-        attributes = []
 
-        # Create an attribute for both
-        if list_type_id:
-            print("Creating list type attribute %s for type %s (%s)" % (list_type_name.lower(), list_type_name, list_type_id))
-            new_attribute = MyAttribute()
-            new_attribute.set_name(list_type_name.lower())
-            new_attribute.set_type_id(list_type_id)
+def render_create_index(out, dialect, table_name, index):
+    """Write the CREATE INDEX statement for an index of MyTable.index_definitions()"""
+    name, columns, unique, using = index
 
-            attributes.append(new_attribute)
+    out.write("CREATE " + ("UNIQUE " if unique else "") + "INDEX " + quote_name(name, dialect) + " ON " +
+              quote_name(table_name, dialect))
+    if using and dialect == 'postgresql':
+        out.write(" USING " + using)
+    out.write(" (" + ", ".join(quote_name(column, dialect) for column in columns) + ");\n")
 
-        if list_item_type_id:
-            print("Creating list item type attribute %s for type %s (%s)" % (list_item_type_name.lower(), list_item_type_name, list_item_type_id))
-            new_attribute = MyAttribute()
-            new_attribute.set_name(list_item_type_name.lower())
-            new_attribute.set_type_id(list_item_type_id)
 
-            attributes.append(new_attribute)
+def render_add_foreign_key(out, dialect, table_name, foreign_key):
+    out.write("ALTER TABLE " + quote_name(table_name, dialect) + " ADD " + foreign_key_ddl(foreign_key, dialect) +
+              ";\n")
 
-        list_class.attributes = attributes
 
-        # Add the class to the list
-        class_ids[list_class.class_id] = new_list_items_name
-        my_classes.append(list_class)
+def transactional_ddl(dialect):
+    """Whether dialect can roll back DDL statements. MySQL commits every one of them implicitly, so its
+    scripts aren't wrapped in a transaction."""
+    return dialect != 'mysql'
 
-    def _create_new_list(self, list_item_type_name, list_type_name):
-        """Create a new list type, create a list_item type linking a list identifier to a list item type. The list_item type contains a unique id and the id of the list content type"""
-        global last_added_list_type_id
-        last_added_list_type_id += 1
-        new_list_id = last_added_list_type_id
 
-        new_list_name = "ListOf" + list_type_name + "s"
+def ddl_tables(model, dialect):
+    """Return the MyTables of the model by name, in the order of its types, classes and tables"""
+    tables = OrderedDict()
 
-        # First create the list itself
-        # Create a Class representing the new list type with the newly increased id
-        # print "Creating new class %s at id %d" % (new_list_name, last_added_list_type_id)
-        list_class = MyClass()
-        list_class.set_name(new_list_name)
-        list_class.class_id = str(new_list_id)
+    for object_ in model.types + model.classes + model.tables:
+        table = object_.ddl_table(dialect)
+        if table is not None:
+            tables[table.name] = table
 
-        attributes = []
-        new_attribute = MyAttribute()
+    return tables
 
-        # Add a name attribute of the String type
-        new_attribute.set_name(new_list_name.lower() + "_name")
-        # new_attribute.set_id(old_attribute_id)
-        # Find the type_id for "String"
-        string_type_id = find_id_for_type_name('String')
-        if string_type_id:
-            new_attribute.set_type_id(string_type_id)
-            attributes.append(new_attribute)
-            list_class.attributes = attributes
-            # Save the new class
-            class_ids[list_class.class_id] = new_list_name
-            my_classes.append(list_class)
 
-            # Create the list item class
-            self._create_list_item_type(new_list_name, str(new_list_id), list_item_type_name)
+def creation_order(tables):
+    """Return the names of the MyTables of the dictionary tables in the order to create them in: every table
+    after the tables it refers to, except for tables that refer to each other"""
+    components = strongly_connected_components(list(tables), lambda name: [table for table in tables[name].references()
+                                                                           if table in tables])
 
-            return last_added_list_type_id
-        else:
-            print("Can't find type ID for STRING, this shouldn't happen")
+    return [name for component in components for name in component]
 
-        return None
 
-    def resolve_many_constraints(self):
-        print("Resolving many constraints on type %s" % (self.name))
-        for attribute_ in self.attributes:
-            if attribute_.has_many_constraint() :
-                print "%s has an attribute with a many constraint at %s : %s" % (self.name, attribute_.name, attribute_.type_name)
+def ddl_enum_types(model, dialect):
+    """Return the enumerations of the model that are types in the database, by unique ID"""
+    return OrderedDict((type_.type_id, type_) for type_ in model.types
+                       if isinstance(type_, MyEnumerationType) and type_.ddl_create_type(dialect))
 
-                # So this is a list type
-                # First create a list type name by adding List to the end of the attribute type name
-                new_list_name = "ListOf" + attribute_.type_name + "s"
 
-                # And check whether it already exists, if so point the attribute type to the list instead of list item type
-                list_type_id = find_id_for_type_name(new_list_name)
+def render_ddl(model, fw):
+    """Write the SQL script that creates the tables of the model to the file object fw, for the dialect of
+    the options, or SQLite when there is none. On SQLite and PostgreSQL the script is one transaction, see
+    transactional_ddl(). Tables come after the tables they refer to; foreign keys between tables that refer to each other are added with ALTER TABLE at the
+    end, except on SQLite, where they are part of the CREATE TABLE."""
+    dialect = model.options.dialect or 'sqlite'
+    out = CodeWriter(fw)
 
-                old_attribute_type_id = attribute_.type_id
-                old_attribute_type_name = attribute_.type_name
-                if list_type_id:
-                    print "Rewriting existing base type information to new list type %s (id=%s)" % (new_list_name, list_type_id)
-                    attribute_.set_type_id(list_type_id)
-                    attribute_.set_type_name(new_list_name)
-                else:
-                    print("Creating new list type %s" % (new_list_name))
+    tables = ddl_tables(model, dialect)
 
-                    list_type_id = self._create_new_list(old_attribute_type_name, attribute_.type_name)
+    out.write("-- Generated by uml2sqlalchemy.py for " + dialect + "\n")
+    out.write("BEGIN;\n\n" if transactional_ddl(dialect) else "\n")
 
-                    if list_type_id:
-                        print("Saving newly created list type %s (%d) as %s instead of type %s (%s)" % (new_list_name, list_type_id, attribute_.name, old_attribute_type_name, old_attribute_type_id))
-                        attribute_.set_type_id(list_type_id)
-                        attribute_.set_type_name(new_list_name)
+    # The enumeration types and the sequences of the keys come before the tables using them
+    statements = [type_.ddl_create_type(dialect) for type_ in ddl_enum_types(model, dialect).values()]
+    statements += [table.sequence for table in tables.values() if table.sequence]
+    if statements:
+        out.write("".join(statements) + "\n")
 
-                    else :
-                        print "Can't create a new list type? This should NEVER happen!"
+    created = set()
+    deferred = []
+    for name in creation_order(tables):
+        deferred.extend(tables[name].render(out, dialect, created))
+        created.add(name)
 
+    for name, foreign_key in deferred:
+        render_add_foreign_key(out, dialect, name, foreign_key)
 
+    if deferred:
+        out.write("\n")
 
+    if transactional_ddl(dialect):
+        out.write("COMMIT;\n")
+    out.flush()
 
-def parse_type_data(data_type):
-    my_types.append(MyDataType(data_type))
+    return len(tables)
 
 
-def parse_type_definitions(elements):
-    # print(json.dumps(elements, indent=4))
+def constraint_key(constraint, columns=None, tables=None):
+    """Return what identifies a constraint of MyTable.constraints() within its table, apart from its name.
+    For a constraint of the previous version of a table, columns and tables map the previous names of its
+    columns and of all tables to the new ones, or to None for those that were dropped."""
+    columns = columns or {}
+    tables = tables or {}
+    kind, name, names, detail = constraint
 
-    for element in elements:
-        if element['@xmi:type'] == 'uml:Enumeration':
-            parse_type_enumeration(element)
-            success = True
-        elif element['@xmi:type'] == 'uml:DataType':
-            parse_type_data(element)
-            success = True
+    if kind == 'foreign key':
+        detail = (tables.get(detail[0], detail[0]), detail[1])
+    elif kind == 'check' and columns.get(names[0]):
+        detail = detail.replace(names[0], columns[names[0]])
+
+    return (kind, tuple(columns.get(column, column) for column in names), detail)
+
+
+def can_rename(constraint, dialect):
+    """Whether dialect can rename constraint, instead of dropping it and adding it again"""
+    if dialect == 'postgresql':
+        return True
+    elif dialect == 'mysql':
+        return constraint[0] in ('index', 'unique')
+
+    return False
+
+
+def render_drop_constraint(out, dialect, table_name, constraint):
+    """Write the SQL that drops a constraint of MyTable.constraints() from table table_name"""
+    kind, name, columns, detail = constraint
+    table = quote_name(table_name, dialect)
+
+    if kind == 'index' or (kind == 'unique' and dialect == 'mysql'):
+        out.write("DROP INDEX " + quote_name(name, dialect))
+        if dialect == 'mysql':
+            out.write(" ON " + table)
+        out.write(";\n")
+    elif kind == 'primary key' and dialect == 'mysql':
+        out.write("ALTER TABLE " + table + " DROP PRIMARY KEY;\n")
+    elif kind == 'foreign key' and dialect == 'mysql':
+        out.write("ALTER TABLE " + table + " DROP FOREIGN KEY " + quote_name(name, dialect) + ";\n")
+    elif name is None:
+        print("Can't drop the %s of %s of table %s, its name isn't known, drop it by hand" %
+              (kind, ", ".join(columns), table_name))
+    else:
+        out.write("ALTER TABLE " + table + " DROP CONSTRAINT " + quote_name(name, dialect) + ";\n")
+
+
+def render_add_constraint(out, dialect, table_name, constraint):
+    """Write the SQL that adds a constraint of MyTable.constraints() to table table_name"""
+    kind, name, columns, detail = constraint
+    table = quote_name(table_name, dialect)
+    names = ", ".join(quote_name(column, dialect) for column in columns)
+
+    if kind == 'index':
+        render_create_index(out, dialect, table_name, (name, columns) + detail)
+    elif kind == 'foreign key':
+        render_add_foreign_key(out, dialect, table_name, (name, columns[0]) + detail)
+    elif kind == 'primary key':
+        out.write("ALTER TABLE " + table + " ADD PRIMARY KEY (" + names + ");\n")
+    elif kind == 'unique':
+        out.write("ALTER TABLE " + table + " ADD CONSTRAINT " + quote_name(name, dialect) + " UNIQUE (" + names +
+                  ");\n")
+    elif name is None:
+        out.write("ALTER TABLE " + table + " ADD CHECK (" + detail + ");\n")
+    else:
+        out.write("ALTER TABLE " + table + " ADD CONSTRAINT " + quote_name(name, dialect) + " CHECK (" + detail +
+                  ");\n")
+
+
+def render_rename_constraint(out, dialect, table_name, old, new):
+    """Write the SQL that renames constraint old of table table_name to the name of constraint new"""
+    table = quote_name(table_name, dialect)
+
+    if dialect == 'mysql':
+        out.write("ALTER TABLE " + table + " RENAME INDEX " + quote_name(old[1], dialect) + " TO " +
+                  quote_name(new[1], dialect) + ";\n")
+    elif old[0] == 'index':
+        out.write("ALTER INDEX " + quote_name(old[1], dialect) + " RENAME TO " + quote_name(new[1], dialect) + ";\n")
+    else:
+        out.write("ALTER TABLE " + table + " RENAME CONSTRAINT " + quote_name(old[1], dialect) + " TO " +
+                  quote_name(new[1], dialect) + ";\n")
+
+
+class MyTableChange:
+    """How a table changed from the previous model to the new one. Columns are matched by the unique IDs of
+    their attributes, so a renamed attribute renames its column instead of dropping it and adding a new one,
+    and constraints by their columns, see constraint_key(). tables maps the previous names of all tables to
+    the new ones, or to None for those that were dropped, types the previous names of the enumeration types
+    to the new ones.
+
+    On SQLite, which can only rename tables and columns and add and drop plain columns, a table with other
+    changes is rebuilt: the new table is created next to it, the rows are copied, and it replaces the previous
+    one."""
+
+    def __init__(self, old, new, dialect, tables, types):
+        self.old = old
+        self.new = new
+        self.dialect = dialect
+
+        old_columns = OrderedDict((column.id, column) for column in old.columns)
+        new_columns = OrderedDict((column.id, column) for column in new.columns)
+
+        self.added = [column for id_, column in new_columns.items() if id_ not in old_columns]
+        self.dropped = [column for id_, column in old_columns.items() if id_ not in new_columns]
+        kept = [(old_columns[id_], column) for id_, column in new_columns.items() if id_ in old_columns]
+        self.renamed = [(old_column, column) for old_column, column in kept if old_column.name != column.name]
+
+        self.changed = []
+        for old_column, column in kept:
+            definition = old_column.definition()
+            definition = (types.get(definition[0], definition[0]),) + definition[1:]
+            if definition != column.definition():
+                self.changed.append((old_column, column))
+
+        columns = dict((column.name, None) for column in self.dropped)
+        columns.update((old_column.name, column.name) for old_column, column in kept)
+
+        old_constraints = OrderedDict((constraint_key(constraint, columns, tables), constraint)
+                                      for constraint in old.constraints(dialect))
+        new_constraints = OrderedDict((constraint_key(constraint), constraint) for constraint in new.constraints(dialect))
+
+        self.dropped_constraints = [constraint for key, constraint in old_constraints.items()
+                                    if key not in new_constraints]
+        self.added_constraints = [constraint for key, constraint in new_constraints.items()
+                                  if key not in old_constraints]
+        self.renamed_constraints = []
+        for key, constraint in new_constraints.items():
+            old_constraint = old_constraints.get(key)
+            if old_constraint is None or old_constraint[1] == constraint[1]:
+                continue
+            elif dialect == 'sqlite' and constraint[0] != 'index':
+                # Only its indexes have names that are used
+                continue
+            elif can_rename(constraint, dialect):
+                self.renamed_constraints.append((old_constraint, constraint))
+            else:
+                self.dropped_constraints.append(old_constraint)
+                self.added_constraints.append(constraint)
+
+        old_rows = OrderedDict((row[0], row) for row in old.rows)
+        new_rows = OrderedDict((row[0], row) for row in new.rows)
+        self.deleted_rows = [row for key, row in old_rows.items() if key not in new_rows]
+        self.updated_rows = [row for key, row in new_rows.items() if key in old_rows and old_rows[key] != row]
+        self.inserted_rows = [row for key, row in new_rows.items() if key not in old_rows]
+
+        self.rebuild = dialect == 'sqlite' and bool(
+            self.changed or old.without_rowid != new.without_rowid or
+            [column for column in self.added + self.dropped if not column.is_plain()] or
+            [constraint for constraint in self.added_constraints + self.dropped_constraints
+             if constraint[0] != 'index'])
+
+        for column in self.added:
+            if not column.nullable and column.default is None and not column.primary_key:
+                print("Column %s added to table %s is NOT NULL without a default, the table must be empty" %
+                      (column.name, new.name))
+
+    def has_changes(self):
+        return bool(self.old.name != self.new.name or self.added or self.dropped or self.renamed or self.changed or
+                    self.added_constraints or self.dropped_constraints or self.renamed_constraints or
+                    self.deleted_rows or self.updated_rows or self.inserted_rows or
+                    self.old.sequence != self.new.sequence)
+
+    def render_drop_constraints(self, out):
+        """Write the SQL that drops the constraints and indexes that changed or are no longer there, by their
+        previous names"""
+        if self.rebuild:
+            # They go with the table
+            return
+
+        for constraint in self.dropped_constraints:
+            render_drop_constraint(out, self.dialect, self.old.name, constraint)
+
+    def render_rename(self, out):
+        if self.old.name != self.new.name:
+            out.write("ALTER TABLE " + quote_name(self.old.name, self.dialect) + " RENAME TO " +
+                      quote_name(self.new.name, self.dialect) + ";\n")
+
+    def render_changes(self, out):
+        """Write the SQL that changes the columns of the table, after it got its new name"""
+        dialect = self.dialect
+        table = quote_name(self.new.name, dialect)
+
+        if self.rebuild:
+            self.render_rebuild(out)
         else:
-            print(json.dumps(element, indent=4))
-            success = False
-            pass
+            for old_column, column in self.renamed:
+                out.write("ALTER TABLE " + table + " RENAME COLUMN " + quote_name(old_column.name, dialect) + " TO " +
+                          quote_name(column.name, dialect) + ";\n")
 
-        if not success:
-            break
+            for old_constraint, constraint in self.renamed_constraints:
+                render_rename_constraint(out, dialect, self.new.name, old_constraint, constraint)
 
+            for column in self.dropped:
+                out.write("ALTER TABLE " + table + " DROP COLUMN " + quote_name(column.name, dialect) + ";\n")
 
-def parse_associations(elements):
-    # print(json.dumps(elements, indent=4))
-    pass
+            for column in self.added:
+                out.write("ALTER TABLE " + table + " ADD COLUMN " + column.ddl(dialect, constraints=False) + ";\n")
 
+            for old_column, column in self.changed:
+                self.render_alter_column(out, old_column, column)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("infile", help="UML XML file to parse")
-    parser.add_argument("outfile", help="Name of the output Python file")
-    args = parser.parse_args()
+            for constraint in self.added_constraints:
+                if constraint[0] not in ('index', 'foreign key'):
+                    render_add_constraint(out, dialect, self.new.name, constraint)
 
-    infile = args.infile
-    outfile = args.outfile
+        for row in self.deleted_rows:
+            out.write("DELETE FROM " + table + " WHERE " + quote_name(self.new.columns[0].name, dialect) + " = " +
+                      row[0] + ";\n")
 
-    with open(infile) as fd, open(outfile, 'a') as fw:
-        doc = xmltodict.parse(fd.read())
-        # print(json.dumps(doc, indent=4))
+        for row in self.updated_rows:
+            out.write("UPDATE " + table + " SET " +
+                      ", ".join(quote_name(column.name, dialect) + " = " + value
+                                for column, value in zip(self.new.columns[1:], row[1:])) +
+                      " WHERE " + quote_name(self.new.columns[0].name, dialect) + " = " + row[0] + ";\n")
 
-        xmi = doc['xmi:XMI']
-        package = xmi['uml:Package']
+        if self.inserted_rows:
+            self.new.render_rows(out, dialect, self.inserted_rows)
 
-        # print "\"\"\"Package name = %s" % package['@name']
+    def render_alter_column(self, out, old_column, column):
+        """Write the SQL that changes the type, nullability and default of old_column to those of column"""
+        dialect = self.dialect
+        alter = "ALTER TABLE " + quote_name(self.new.name, dialect) + " "
 
-        package_elements = package['packagedElement']
+        if dialect == 'mysql':
+            out.write(alter + "MODIFY COLUMN " + column.ddl(dialect, constraints=False) + ";\n")
+            return
 
-        for element in package_elements:
-            element_name = element['@name']
-            # print "Now in package element %s" % element_name
+        alter += "ALTER COLUMN " + quote_name(column.name, dialect) + " "
 
-            if element_name == 'TypeDefinitions':
-                parse_type_definitions(element['packagedElement'])
-                #pass
+        if old_column.type != column.type:
+            # SERIAL is only a type when creating a column
+            type_ = {'SERIAL': 'INTEGER', 'BIGSERIAL': 'BIGINT'}.get(column.type, column.type)
+            out.write(alter + "TYPE " + type_ + " USING " + quote_name(column.name, dialect) + "::" + type_ + ";\n")
 
-        for element in package_elements:
-            element_name = element['@name']
-            # print "Now in package element %s" % element_name
+        if old_column.nullable != column.nullable:
+            out.write(alter + ("DROP NOT NULL" if column.nullable else "SET NOT NULL") + ";\n")
 
-            if element_name == 'ObjectClasses':
-                parse_class_objects(element['packagedElement'])
-                pass
+        if old_column.default != column.default:
+            if column.default is None:
+                out.write(alter + "DROP DEFAULT;\n")
+            else:
+                out.write(alter + "SET DEFAULT " + column.default + ";\n")
+
+    def render_rebuild(self, out):
+        """Replace the table by a new one with the new columns, keeping its rows"""
+        dialect = self.dialect
+        temporary = self.new.name + "__new"
+        renamed = dict((column.id, column) for column in self.new.columns)
+        kept = [(column, renamed[column.id]) for column in self.old.columns if column.id in renamed]
+
+        self.new.render_create(out, dialect, (), temporary)
+        out.write("INSERT INTO " + quote_name(temporary, dialect) + " (" +
+                  ", ".join(quote_name(column.name, dialect) for old_column, column in kept) + ")\n")
+        out.write("    SELECT " + ", ".join(quote_name(old_column.name, dialect) for old_column, column in kept) +
+                  " FROM " + quote_name(self.new.name, dialect) + ";\n")
+        out.write("DROP TABLE " + quote_name(self.new.name, dialect) + ";\n")
+        out.write("ALTER TABLE " + quote_name(temporary, dialect) + " RENAME TO " +
+                  quote_name(self.new.name, dialect) + ";\n")
+
+    def created_indexes(self):
+        """Indexes to create after the changes"""
+        if self.rebuild:
+            return self.new.index_definitions()
+
+        return [constraint[1:3] + constraint[3] for constraint in self.added_constraints if constraint[0] == 'index']
+
+    def added_foreign_keys(self):
+        """Foreign keys to add after the changes, on the databases that can add them"""
+        if self.dialect == 'sqlite':
+            return []
+
+        return [(constraint[1], constraint[2][0]) + constraint[3] for constraint in self.added_constraints
+                if constraint[0] == 'foreign key']
+
+
+def render_migration(previous, model, fw):
+    """Write the SQL script that changes the tables of the previous model into those of model to the file
+    object fw, for the dialect of the options of model, or SQLite when there is none. Tables, columns and
+    enumeration types are matched by the unique IDs of what they are for, so one that is renamed in the
+    model is renamed in the database, and only what changed is touched, see MyTableChange. On SQLite and
+    PostgreSQL the script is one transaction, see transactional_ddl(). Returns the numbers of created,
+    changed and dropped tables."""
+    dialect = model.options.dialect or 'sqlite'
+
+    # The script has a block of statements per step, those without statements are left out
+    steps = [CodeWriter(BytesIO()) for step in range(4)]
+    prepare, change_tables, create_tables, finish = steps
+
+    old_tables = OrderedDict((table.id, table) for table in ddl_tables(previous, dialect).values())
+    new_tables = OrderedDict((table.id, table) for table in ddl_tables(model, dialect).values())
+    old_types = ddl_enum_types(previous, dialect)
+    new_types = ddl_enum_types(model, dialect)
+
+    tables = dict((table.name, new_tables[id_].name if id_ in new_tables else None)
+                  for id_, table in old_tables.items())
+    types = dict((quote_name(type_.name, dialect), quote_name(new_types[id_].name, dialect))
+                 for id_, type_ in old_types.items() if id_ in new_types)
+
+    changes = [MyTableChange(old_tables[id_], table, dialect, tables, types) for id_, table in new_tables.items()
+               if id_ in old_tables]
+    changes = [change for change in changes if change.has_changes()]
+    created = OrderedDict((table.name, table) for id_, table in new_tables.items() if id_ not in old_tables)
+    dropped = OrderedDict((table.name, table) for id_, table in old_tables.items() if id_ not in new_tables)
+
+    # Constraints go first, so they don't hold up dropping the tables and columns they are on or refer to
+    for change in changes:
+        change.render_drop_constraints(prepare)
+
+    # Tables that refer to each other need their foreign keys dropped first
+    order = creation_order(dropped)
+    referrers = dict((name, []) for name in order)
+    for name in order:
+        for foreign_key in dropped[name].foreign_keys():
+            if foreign_key[2] in referrers and foreign_key[2] != name:
+                referrers[foreign_key[2]].append((name, foreign_key))
+
+    remaining = set(order)
+    for name in reversed(order):
+        remaining.discard(name)
+
+        for referrer, foreign_key in referrers[name]:
+            if referrer in remaining and dialect != 'sqlite':
+                render_drop_constraint(prepare, dialect, referrer, ('foreign key', foreign_key[0], None, None))
+
+        prepare.write("DROP TABLE " + quote_name(name, dialect) + ";\n")
+        if dropped[name].sequence:
+            prepare.write("DROP SEQUENCE " + quote_name(name + "_id_seq", dialect) + ";\n")
+
+    for change in changes:
+        change.render_rename(prepare)
+
+        if change.old.sequence and change.new.sequence and change.old.name != change.new.name:
+            prepare.write("ALTER SEQUENCE " + quote_name(change.old.name + "_id_seq", dialect) + " RENAME TO " +
+                      quote_name(change.new.name + "_id_seq", dialect) + ";\n")
+
+    for id_, type_ in new_types.items():
+        old_type = old_types.get(id_)
+        if old_type is None:
+            prepare.write(type_.ddl_create_type(dialect))
+            continue
+
+        if old_type.name != type_.name:
+            prepare.write("ALTER TYPE " + quote_name(old_type.name, dialect) + " RENAME TO " +
+                      quote_name(type_.name, dialect) + ";\n")
+
+        for literal in type_.literals:
+            if literal not in old_type.literals:
+                prepare.write("ALTER TYPE " + quote_name(type_.name, dialect) + " ADD VALUE " + sql_string(literal) +
+                          ";\n")
+
+        for literal in old_type.literals:
+            if literal not in type_.literals:
+                print("Can't drop literal %s of enumeration type %s, rows may still use it" % (literal, type_.name))
+
+    for table in created.values():
+        if table.sequence:
+            prepare.write(table.sequence)
+
+    for change in changes:
+        if change.new.sequence and change.new.sequence != change.old.sequence:
+            if change.old.sequence:
+                # Its increment or cache changed
+                prepare.write("ALTER" + change.new.sequence[len("CREATE"):])
+            else:
+                prepare.write(change.new.sequence)
 
-        for element in package_elements:
-            element_name = element['@name']
-            # print "Now in package element %s" % element_name
+    # The tables that are kept are changed first, the new tables may refer to their new columns
+    deferred = []
+    for change in changes:
+        change.render_changes(change_tables)
 
-            if element_name == 'Associations':
-                parse_associations(element['packagedElement'])
+        for index in change.created_indexes():
+            render_create_index(change_tables, dialect, change.new.name, index)
 
-        # print "\"\"\"\n\n"
+        deferred.extend((change.new.name, foreign_key) for foreign_key in change.added_foreign_keys())
 
-        fw.write("""from sqlalchemy.ext.declarative import declarative_base
-Base = declarative_base()
+    existing = set(name for name in tables.values() if name)
+    for name in creation_order(created):
+        deferred.extend(created[name].render(create_tables, dialect, existing))
+        existing.add(name)
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Boolean, ForeignKey
-    
-        """)
+    for name, foreign_key in deferred:
+        render_add_foreign_key(finish, dialect, name, foreign_key)
 
+    for change in changes:
+        if change.old.sequence and not change.new.sequence:
+            finish.write("DROP SEQUENCE " + quote_name(change.old.name + "_id_seq", dialect) + ";\n")
 
-        for class_ in my_classes:
-            class_.resolve_type_ids()
+    for id_, type_ in old_types.items():
+        if id_ not in new_types:
+            finish.write("DROP TYPE " + quote_name(type_.name, dialect) + ";\n")
 
-        for type_ in my_types:
-            type_.resolve_type_ids()
+    fw.write("-- Generated by uml2sqlalchemy.py for " + dialect + "\n")
+    fw.write("BEGIN;\n\n" if transactional_ddl(dialect) else "\n")
 
-        # print "Resolving x to many constraints"
+    for step in steps:
+        step.flush()
+        if step.fw.getvalue():
+            fw.write(step.fw.getvalue().rstrip("\n") + "\n\n")
 
-        for class_ in my_classes:
-            class_.resolve_many_constraints()
+    if transactional_ddl(dialect):
+        fw.write("COMMIT;\n")
 
-        for type_ in my_types:
-            type_.resolve_many_constraints()
+    return len(created), len([change for change in changes if change.has_changes()]), len(dropped)
 
-        # print "Done resolving x to many constraints"
 
-        for class_ in my_classes:
-            class_.resolve_type_ids()
+def generate(infile, outfile, parser='dict', cache_dir=None, incremental=False, profiler=NULL_PROFILER,
+             options=None, shard=None, backend='orm', previous=None):
+    """Generate the SQLAlchemy model for the UML XML file infile and write it to outfile. Every call
+    works on its own Model, so generate() can be called from several threads at once. outfile is only
+    written when the generated code differs from what it holds, see write_if_changed().
 
-        for type_ in my_types:
-            type_.resolve_type_ids()
+    If incremental is set, only the classes and types that changed since the previous incremental run are
+    rendered again, which needs Options with fingerprints. If shard is set, outfile is a package with a module
+    per class ('class') or per UML package ('package'), see render_package(). With the 'core' backend outfile
+    has SQLAlchemy Core Tables instead of classes, see Model.render_core(). With the 'ddl' backend outfile is
+    an SQL script instead, see render_ddl(), or with previous set the SQL script that migrates the tables of
+    the previous version of infile, see render_migration(). Pass a Profiler to measure every phase, and Options
+    to change how the model is turned into code."""
+    model = load_model(infile, parser, cache_dir, profiler, options)
 
-        fw.write("\n")
+    if previous:
+        previous_model = load_previous_model(previous, parser, cache_dir, profiler, options)
 
-        for type_ in my_types:
-            if isinstance(type_, MyEnumerationType) :
-                fw.write(repr(type_))
-                fw.write("\n")
+    with profiler.phase('render'):
+        if backend == 'ddl' and previous:
+            fw = BytesIO()
+            tables = render_migration(previous_model, model, fw)
+            if write_if_changed(outfile, fw.getvalue()):
+                print("Wrote the migration of %d created, %d changed and %d dropped tables to %s" %
+                      (tables + (outfile,)))
+            else:
+                print("%s is unchanged" % (outfile))
+        elif backend == 'ddl':
+            fw = BytesIO()
+            tables = render_ddl(model, fw)
+            if write_if_changed(outfile, fw.getvalue()):
+                print("Wrote %d tables to %s" % (tables, outfile))
+            else:
+                print("%s is unchanged" % (outfile))
+        elif backend == 'core':
+            fw = BytesIO()
+            model.render_core(fw)
+            if not write_if_changed(outfile, fw.getvalue()):
+                print("%s is unchanged" % (outfile))
+        elif shard:
+            written, modules = render_package(model, outfile, shard)
+            print("Wrote %d of %d modules to package %s" % (written, modules, outfile))
+        elif incremental:
+            rendered, _ = render_incremental(model, outfile)
+            print("Rendered %d of %d classes, types and tables" %
+                  (rendered, len(model.classes) + len(model.types) + len(model.tables)))
+        else:
+            # Rendered in memory first, to compare it with the current output
+            fw = BytesIO()
+            model.render(fw)
+            if not write_if_changed(outfile, fw.getvalue()):
+                print("%s is unchanged" % (outfile))
+
+    profiler.add_counters(model)
+
+    return model
+
+
+def watch(infile, outfile, parser='sax', cache_dir=None, interval=0.5, options=None):
+    """Regenerate outfile whenever infile changes, until interrupted. The interpreter, the latest model
+    and the code generated for it stay in memory, so only the classes that changed are rendered again.
+    options need fingerprints for that."""
+    options = options if options is not None else Options(fingerprints=True)
+    if not options.fingerprints:
+        raise ValueError("watch() renders incrementally, it needs Options with fingerprints")
+
+    last_stat = None
+    last_key = None
+    model = None
+    previous = None
+
+    print("Watching %s for changes, press Ctrl-C to stop" % (infile))
+
+    while True:
+        try:
+            stat = os.stat(infile)
+            stat = (stat.st_mtime, stat.st_size)
+            key = model_cache_key(infile, options) if stat != last_stat else last_key
+        except (OSError, IOError):
+            # The file is being replaced
+            stat = None
+
+        if stat is not None and stat != last_stat:
+            last_stat = stat
+
+            # Saving without changing anything doesn't need a new model
+            if key != last_key:
+                started = time.time()
+
+                try:
+                    model = load_model(infile, parser, cache_dir, options=options)
+                    rendered, previous = render_incremental(model, outfile, previous)
+                except expat.ExpatError as error:
+                    # Most likely the file is still being written, try again when it changes next
+                    print("Can't parse %s, waiting for the next change: %s" % (infile, error))
+                except Exception as error:
+                    # A model that can't be converted, like an element without a name, shouldn't stop watching
+                    print("Can't convert %s, waiting for the next change: %s: %s" %
+                          (infile, error.__class__.__name__, error))
+                else:
+                    last_key = key
+                    print("Regenerated %s in %.2fs, rendered %d of %d classes, types and tables" %
+                          (outfile, time.time() - started, rendered,
+                           len(model.classes) + len(model.types) + len(model.tables)))
 
-        fw.write("\n")
+        time.sleep(interval)
 
-        for type_ in my_types:
-            if not isinstance(type_, MyEnumerationType) :
-                fw.write(repr(type_))
 
-        for class_ in my_classes:
-            # class_.resolve_type_ids()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("infile", help="UML XML file to parse")
+    parser.add_argument("outfile", help="Name of the output Python file")
+    parser.add_argument("--parser", choices=['dict', 'stream', 'sax'], default='dict',
+                        help="How to parse the UML XML file: into one dictionary (default), element by element "
+                             "into dictionaries, or straight into the model without dictionaries")
+    parser.add_argument("--stream", action="store_const", dest="parser", const='stream',
+                        help="Same as --parser stream")
+    parser.add_argument("--cache-dir",
+                        help="Directory to cache resolved models in. An unchanged UML XML file is not parsed again")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only generate the code for classes that changed since the previous incremental run")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running, and regenerate the output file incrementally whenever the UML XML "
+                             "file changes")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="How often to check for changes in watch mode, in seconds (default 0.5)")
+    parser.add_argument("--collections", choices=['list', 'association'], default='list',
+                        help="How to store attributes with a '*' multiplicity: in a ListOfXs and a ListOfXsItems "
+                             "table (default), or in one association table per attribute")
+    parser.add_argument("--inheritance", choices=inheritance_modes, default='fk',
+                        help="How to map generalizations: a foreign key to the general class (default), joined, "
+                             "single or concrete table inheritance, or abstract classes as mixins. An inheritance "
+                             "tagged value on the top class of a hierarchy overrides it for that hierarchy")
+    parser.add_argument("--type-mapping", metavar="JSON_FILE",
+                        help="JSON file with the column types of UML types, like "
+                             "{\"Amount\": {\"type\": \"Numeric\", \"precision\": 12, \"scale\": 2}}. "
+                             "Adds to or changes the default mapping")
+    parser.add_argument("--enums", choices=enum_strategies, default='tuple',
+                        help="How to store enumerations: the label in an Enum column (default), a named database "
+                             "enum type (native), a SmallInteger code of a generated IntEnum (int), or that code "
+                             "as a foreign key to a lookup table with the labels (lookup)")
+    parser.add_argument("--server-defaults", action="store_true",
+                        help="Let the database fill in default values (server_default) instead of SQLAlchemy, "
+                             "so bulk inserts need no Python-side defaults")
+    parser.add_argument("--primary-key", choices=primary_key_strategies, default='integer',
+                        help="Primary key of the tables: an autoincrement Integer (default) or BigInteger, a "
+                             "BigInteger from a Sequence, or a UUID or ULID generated by the client. A primaryKey "
+                             "tagged value on a class, or a PrimaryKey stereotype on an attribute, overrides it")
+    parser.add_argument("--sequence-increment", type=int,
+                        help="Increment of the sequences of the sequence primary key, to allocate ids in blocks")
+    parser.add_argument("--sequence-cache", type=int,
+                        help="Number of ids of the sequences of the sequence primary key the database caches")
+    parser.add_argument("--embed", action="store_true",
+                        help="Store data types, and classes with one attribute, as columns in the tables of the "
+                             "classes that use them, mapped with composite(), instead of in tables of their own")
+    parser.add_argument("--dialect", choices=dialects,
+                        help="Database to generate the code for. Attributes of a basic type with a '*' "
+                             "multiplicity become an ARRAY column with a GIN index on postgresql and a JSON column "
+                             "on sqlite and mysql, link tables are WITHOUT ROWID on sqlite")
+    parser.add_argument("--backend", choices=backends, default='orm',
+                        help="What to generate: SQLAlchemy ORM classes (default), SQLAlchemy Core Tables on one "
+                             "MetaData without classes, for bulk loading (core), or the SQL script that creates "
+                             "the tables for --dialect, or SQLite without it (ddl)")
+    parser.add_argument("--migrate-from", metavar="PREVIOUS",
+                        help="With --backend ddl, write the SQL script that changes the tables of PREVIOUS, the "
+                             "previous version of the UML XML file or its model in --cache-dir, into those of "
+                             "the UML XML file, instead of the script that creates them")
+    parser.add_argument("--shard", choices=shard_layouts,
+                        help="Write a package to the output directory instead of one file, with a module per "
+                             "class, type and table (class) or per UML package (package). The package imports "
+                             "a module the first time one of its names is used")
+    parser.add_argument("--lazy", choices=loader_strategies, default='selectin',
+                        help="Loader strategy of the relationships generated for associations (default selectin). "
+                             "A stereotype with a lazy tagged value overrides it for one association or end")
+    parser.add_argument("--profile", metavar="JSON_FILE",
+                        help="Write the time and memory used by every phase, and counts of what was parsed, "
+                             "to JSON_FILE")
+    args = parser.parse_args()
 
-            #if not class_.is_abstract:
-            fw.write(repr(class_))
+    if args.shard and (args.incremental or args.watch):
+        parser.error("--shard can't be combined with --incremental or --watch")
+    if args.backend != 'orm' and (args.shard or args.incremental or args.watch):
+        parser.error("--backend %s can't be combined with --shard, --incremental or --watch" % (args.backend))
+    if args.migrate_from and args.backend != 'ddl':
+        parser.error("--migrate-from needs --backend ddl")
+    if args.migrate_from and not os.path.exists(args.migrate_from):
+        parser.error("Can't find %s" % (args.migrate_from))
+
+    type_mapping = None
+    if args.type_mapping:
+        try:
+            type_mapping = load_type_mapping(args.type_mapping)
+        except (IOError, ValueError) as error:
+            parser.error("Can't use type mapping %s: %s" % (args.type_mapping, error))
+
+    options = Options(collections=args.collections, lazy=args.lazy, inheritance=args.inheritance,
+                      type_mapping=type_mapping, enums=args.enums, server_defaults=args.server_defaults,
+                      primary_key=args.primary_key, sequence_increment=args.sequence_increment,
+                      sequence_cache=args.sequence_cache, embed=args.embed, dialect=args.dialect,
+                      fingerprints=args.incremental or args.watch)
+
+    if args.watch:
+        try:
+            watch(args.infile, args.outfile, args.parser, args.cache_dir, args.interval, options)
+        except KeyboardInterrupt:
+            pass
+    else:
+        profiler = Profiler() if args.profile else NULL_PROFILER
+
+        generate(args.infile, args.outfile, args.parser, args.cache_dir, args.incremental, profiler, options,
+                 args.shard, args.backend, args.migrate_from)
 
+        if args.profile:
+            profiler.write(args.profile)